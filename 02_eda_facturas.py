@@ -1,114 +1,196 @@
 # 02_eda_facturas.py
 
-import pandas as pd
+import argparse
+
+
+def crear_parser():
+    parser = argparse.ArgumentParser(description="EDA del dataset maestro de facturas.")
+    parser.add_argument("--reporte", action="store_true",
+                        help="Modo no interactivo: genera un reporte HTML/PNG con agregados cacheados.")
+    parser.add_argument("--forzar", action="store_true", help="Recalcular aunque el dataset no haya cambiado.")
+    parser.add_argument("--chunksize", type=int,
+                        help="Leer el maestro por lotes de este tamaño (estadísticas en streaming, una pasada).")
+    parser.add_argument("--desde", help="Primer periodo a analizar (AAAA o AAAA-MM); lee solo esas particiones.")
+    parser.add_argument("--hasta", help="Último periodo a analizar (AAAA o AAAA-MM).")
+    return parser
+
+
+if __name__ == "__main__":
+    # Los argumentos se leen antes de importar numpy/pandas: --help responde al instante
+    parser = crear_parser()
+    args = parser.parse_args()
+
 import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
-
-# Opcional: Establecer el estilo de gráficos
-sns.set(style="whitegrid")
-
-# Ruta del dataset maestro (ajusta si es necesario)
-ruta_dataset = "datos_enriquecidos/dataset_maestro_facturas.csv"
-
-# Cargar el dataset maestro
-df = pd.read_csv(ruta_dataset, low_memory=False)
-
-# ----------------------------------------------------------
-# 1. Información general sobre el DataFrame
-# ----------------------------------------------------------
-print("Información del DataFrame:")
-print(df.info())
-
-print("\nDescripción de variables numéricas:")
-print(df.select_dtypes(include=[np.number]).describe().T)
-
-print("\nPorcentaje de nulos por columna:")
-print((df.isna().mean() * 100).round(2).sort_values(ascending=False))
-
-# ----------------------------------------------------------
-# 2. Histogramas de las variables numéricas claves
-# ----------------------------------------------------------
-cols_numericas_clave = [
-    "vlr_total_neto_factura",
-    "vlr_total_item_factura",
-    "vlr_total_neto_item_factura",
-    "suma_vlr_presupuesto_ppto",
-    "prom_vlr_presupuesto_ppto",
-    "n_proveedores",
-]
-
-df[cols_numericas_clave].hist(bins=50, figsize=(14, 10))
-plt.tight_layout()
-plt.show()
-
-# ----------------------------------------------------------
-# 3. Análisis de variables categóricas: Barras para género, estado civil, etc.
-# ----------------------------------------------------------
-cat_cols_basicas = ["genero", "estado_civil", "rango_edades", "region_colombia"]
-
-fig, axes = plt.subplots(2, 2, figsize=(14, 10))
-axes = axes.flatten()
-
-for col, ax in zip(cat_cols_basicas, axes):
-    df[col].value_counts(dropna=False).plot(kind="bar", ax=ax)
-    ax.set_title(f"Distribución de {col}")
-    ax.set_xlabel("")
-    ax.set_ylabel("Frecuencia")
-
-plt.tight_layout()
-plt.show()
-
-# ----------------------------------------------------------
-# 4. Nacional vs Internacional (basado en destino_pais)
-# ----------------------------------------------------------
-plt.figure(figsize=(5, 4))
-df["es_internacional"].value_counts().sort_index().plot(kind="bar", rot=0)
-plt.xticks([0, 1], ["Nacional (0)", "Internacional (1)"])
-plt.title("Distribución de viajes nacionales vs internacionales")
-plt.ylabel("Número de facturas")
-plt.show()
-
-# Ver porcentaje de viajes internacionales
-print("\nProporción de viajes internacionales:")
-print(df["es_internacional"].mean())
-
-# ----------------------------------------------------------
-# 5. Top destinos más frecuentes
-# ----------------------------------------------------------
-top_destinos = df["destino_ciudad"].value_counts().head(10)
-print("\nTop 10 destinos más frecuentes:")
-print(top_destinos)
-
-# ----------------------------------------------------------
-# 6. Top 10 proveedores más frecuentes
-# ----------------------------------------------------------
-top_proveedores = df["proveedor_principal"].value_counts().head(10)
-print("\nTop 10 proveedores más frecuentes:")
-print(top_proveedores)
-
-# ----------------------------------------------------------
-# 7. Análisis de valores por continente de destino
-# ----------------------------------------------------------
-plt.figure(figsize=(10, 6))
-sns.boxplot(data=df, x="destino_continente", y="vlr_total_neto_factura")
-plt.title("Distribución de valores por continente de destino")
-plt.show()
-
-# ----------------------------------------------------------
-# 8. Análisis de valores por rango de edad
-# ----------------------------------------------------------
-plt.figure(figsize=(10, 6))
-sns.boxplot(data=df, x="rango_edades", y="vlr_total_neto_factura")
-plt.title("Distribución de valores por rango de edad")
-plt.xticks(rotation=45)
-plt.show()
-
-# ----------------------------------------------------------
-# 9. Correlaciones entre las variables numéricas
-# ----------------------------------------------------------
-correlation_matrix = df[cols_numericas_clave].corr()
-plt.figure(figsize=(10, 6))
-sns.heatmap(correlation_matrix, annot=True, cmap="coolwarm", vmin=-1, vmax=1)
-plt.title("Matriz de correlación")
-plt.show()
+
+from reporte_eda import generar_reporte, tops_sketches
+from estadisticas_streaming import resumir_csv
+from resumen_cajas import resumen_cajas, dibujar_cajas
+from particiones import archivos_tabla
+from memoria_maestro import leer_compacto
+from instrumentacion import etapa
+
+# Carpeta y tabla del dataset maestro (ajusta si es necesario)
+carpeta_dataset = "datos_enriquecidos"
+tabla_dataset = "dataset_maestro_facturas"
+
+
+def eda_interactiva(rutas_dataset):
+    # matplotlib/seaborn solo hacen falta para los gráficos (el reporte y el
+    # modo streaming no los cargan)
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    # Opcional: Establecer el estilo de gráficos
+    sns.set(style="whitegrid")
+
+    # Cargar el dataset maestro compacto (CSV plano o las particiones del rango pedido)
+    df = leer_compacto(rutas_dataset)
+
+    # ----------------------------------------------------------
+    # 1. Información general sobre el DataFrame
+    # ----------------------------------------------------------
+    print("Información del DataFrame:")
+    print(df.info())
+
+    print("\nDescripción de variables numéricas:")
+    print(df.select_dtypes(include=[np.number]).describe().T)
+
+    print("\nPorcentaje de nulos por columna:")
+    print((df.isna().mean() * 100).round(2).sort_values(ascending=False))
+
+    # ----------------------------------------------------------
+    # 2. Histogramas de las variables numéricas claves
+    # ----------------------------------------------------------
+    cols_numericas_clave = [
+        "vlr_total_neto_factura",
+        "vlr_total_item_factura",
+        "vlr_total_neto_item_factura",
+        "suma_vlr_presupuesto_ppto",
+        "prom_vlr_presupuesto_ppto",
+        "n_proveedores",
+    ]
+
+    df[cols_numericas_clave].hist(bins=50, figsize=(14, 10))
+    plt.tight_layout()
+    plt.show()
+
+    # ----------------------------------------------------------
+    # 3. Análisis de variables categóricas: Barras para género, estado civil, etc.
+    # ----------------------------------------------------------
+    cat_cols_basicas = ["genero", "estado_civil", "rango_edades", "region_colombia"]
+
+    fig, axes = plt.subplots(2, 2, figsize=(14, 10))
+    axes = axes.flatten()
+
+    for col, ax in zip(cat_cols_basicas, axes):
+        df[col].value_counts(dropna=False).plot(kind="bar", ax=ax)
+        ax.set_title(f"Distribución de {col}")
+        ax.set_xlabel("")
+        ax.set_ylabel("Frecuencia")
+
+    plt.tight_layout()
+    plt.show()
+
+    # ----------------------------------------------------------
+    # 4. Nacional vs Internacional (basado en destino_pais)
+    # ----------------------------------------------------------
+    plt.figure(figsize=(5, 4))
+    df["es_internacional"].value_counts().sort_index().plot(kind="bar", rot=0)
+    plt.xticks([0, 1], ["Nacional (0)", "Internacional (1)"])
+    plt.title("Distribución de viajes nacionales vs internacionales")
+    plt.ylabel("Número de facturas")
+    plt.show()
+
+    # Ver porcentaje de viajes internacionales
+    print("\nProporción de viajes internacionales:")
+    print(df["es_internacional"].mean())
+
+    # ----------------------------------------------------------
+    # 5. Top destinos más frecuentes
+    # ----------------------------------------------------------
+    # Con los sketches top-k del maestro no hace falta recorrer las columnas
+    tops = tops_sketches(rutas_dataset)
+    top_destinos = tops["top_destinos"] if tops else df["destino_ciudad"].value_counts().head(10)
+    print("\nTop 10 destinos más frecuentes:")
+    print(top_destinos)
+
+    # ----------------------------------------------------------
+    # 6. Top 10 proveedores más frecuentes
+    # ----------------------------------------------------------
+    top_proveedores = tops["top_proveedores"] if tops else df["proveedor_principal"].value_counts().head(10)
+    print("\nTop 10 proveedores más frecuentes:")
+    print(top_proveedores)
+
+    # ----------------------------------------------------------
+    # 7. Análisis de valores por continente de destino
+    # ----------------------------------------------------------
+    # Las cajas se dibujan desde estadísticas precalculadas (un groupby), no fila a fila
+    fig, ax = plt.subplots(figsize=(10, 6))
+    dibujar_cajas(ax, resumen_cajas(df, "destino_continente", "vlr_total_neto_factura"))
+    ax.set_title("Distribución de valores por continente de destino")
+    plt.show()
+
+    # ----------------------------------------------------------
+    # 8. Análisis de valores por rango de edad
+    # ----------------------------------------------------------
+    fig, ax = plt.subplots(figsize=(10, 6))
+    dibujar_cajas(ax, resumen_cajas(df, "rango_edades", "vlr_total_neto_factura"))
+    ax.set_title("Distribución de valores por rango de edad")
+    ax.tick_params(axis="x", rotation=45)
+    plt.show()
+
+    # ----------------------------------------------------------
+    # 9. Correlaciones entre las variables numéricas
+    # ----------------------------------------------------------
+    correlation_matrix = df[cols_numericas_clave].corr()
+    plt.figure(figsize=(10, 6))
+    sns.heatmap(correlation_matrix, annot=True, cmap="coolwarm", vmin=-1, vmax=1)
+    plt.title("Matriz de correlación")
+    plt.show()
+
+
+def eda_streaming(rutas_dataset, chunksize):
+    """
+    Secciones de texto del EDA calculadas en una sola pasada por lotes, para
+    maestros que no caben en memoria (cuantiles aproximados con sketch KLL).
+    """
+    resumen = resumir_csv(rutas_dataset, chunksize=chunksize)
+
+    print("Información del DataFrame:")
+    print(f"{resumen.n_filas:,} filas, {len(resumen.columnas)} columnas")
+    print(resumen.info())
+
+    print("\nDescripción de variables numéricas:")
+    print(resumen.describe())
+
+    print("\nPorcentaje de nulos por columna:")
+    print(resumen.nulos_pct())
+
+    print("\nProporción de viajes internacionales:")
+    print(resumen.media("es_internacional"))
+
+    tops = tops_sketches(rutas_dataset)
+    print("\nTop 10 destinos más frecuentes:")
+    print(tops["top_destinos"] if tops else resumen.value_counts("destino_ciudad", 10))
+
+    print("\nTop 10 proveedores más frecuentes:")
+    print(tops["top_proveedores"] if tops else resumen.value_counts("proveedor_principal", 10))
+
+    print("\nMatriz de correlación:")
+    print(resumen.corr())
+
+
+if __name__ == "__main__":
+    rutas_dataset = archivos_tabla(carpeta_dataset, tabla_dataset, args.desde, args.hasta)
+    if not rutas_dataset:
+        parser.exit(1, "No hay particiones del maestro en el rango pedido.\n")
+
+    if args.reporte:
+        with etapa("eda_reporte"):
+            generar_reporte(rutas_dataset, forzar=args.forzar, chunksize=args.chunksize)
+    elif args.chunksize:
+        with etapa("eda_streaming"):
+            eda_streaming(rutas_dataset, args.chunksize)
+    else:
+        with etapa("eda_interactiva"):
+            eda_interactiva(rutas_dataset)
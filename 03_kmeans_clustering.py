@@ -1,39 +1,61 @@
-import pandas as pd
-import numpy as np
-from sklearn.preprocessing import StandardScaler
-from sklearn.cluster import KMeans
+import argparse
+
+# Rango de fechas opcional: solo se leen las particiones anio=/mes= del maestro en ese rango
+# (los argumentos se leen antes de importar sklearn/matplotlib: --help responde al instante)
+parser = argparse.ArgumentParser(description="Segmentación K-Means de las facturas.")
+parser.add_argument('--desde', help="Primer periodo (AAAA o AAAA-MM).")
+parser.add_argument('--hasta', help="Último periodo (AAAA o AAAA-MM).")
+parser.add_argument('--codificacion', choices=('onehot', 'hashing', 'ninguna'), default='onehot',
+                    help="Cómo entran las columnas categóricas (proveedor, destino, género, edad...) "
+                         "en la matriz dispersa: one-hot, truco del hashing o no entran.")
+parser.add_argument('--caracteristicas', type=int, default=2 ** 18,
+                    help="Columnas del truco del hashing (con --codificacion hashing).")
+args = parser.parse_args()
+
 import matplotlib.pyplot as plt
+from memoria_maestro import cargar_maestro
+from segmentacion import matriz_caracteristicas, modelo_kmeans, proyeccion_2d, resumen_categoricas
+from instrumentacion import etapa
 
 # Cargar los datos
-df = pd.read_csv('datos_enriquecidos/dataset_maestro_facturas.csv')  # Ajusta la ruta si es necesario
-
-# Eliminar las columnas no numéricas que no aportan al clustering
-df_numeric = df.select_dtypes(include=[np.number])
+etapa_carga = etapa("cargar_maestro")
+df = cargar_maestro('datos_enriquecidos', args.desde, args.hasta)  # Ajusta la ruta si es necesario
 
-# Imputar o eliminar los valores faltantes (NaN) en las columnas numéricas
-df_numeric = df_numeric.fillna(df_numeric.mean())  # O usa .dropna() si prefieres eliminar las filas con NaN
+etapa_carga.terminar(filas_salida=len(df))
 
-# Normalizar los datos
-scaler = StandardScaler()
-df_scaled = scaler.fit_transform(df_numeric)
+# Matriz de características dispersa (CSR): numéricas estandarizadas (las columnas
+# sin ningún valor, p. ej. vlr_total_neto_factura en la exportación actual, se
+# descartan y los nulos se imputan con la media) + categóricas en one-hot o hashing
+etapa_kmeans = etapa("kmeans", filas_entrada=len(df))
+df_scaled, columnas_numericas = matriz_caracteristicas(df, args.codificacion, n_caracteristicas=args.caracteristicas)
+print(f"Matriz de segmentación: {df_scaled.shape[0]:,} x {df_scaled.shape[1]:,}, {df_scaled.nnz:,} no nulos "
+      f"({(df_scaled.data.nbytes + df_scaled.indices.nbytes + df_scaled.indptr.nbytes) / 2**20:,.1f} MiB)")
 
-# Aplicar K-Means
-kmeans = KMeans(n_clusters=4, random_state=42)  # Ajusta el número de clusters
+# Aplicar K-Means (directamente sobre la matriz dispersa)
+kmeans = modelo_kmeans(4, df_scaled.shape[0])  # Ajusta el número de clusters
 df['cluster'] = kmeans.fit_predict(df_scaled)
 
-# Resumen por cluster (media de las columnas numéricas)
-cluster_summary = df.groupby('cluster')[df_numeric.columns].mean()
+# Guardar la asignación de cluster por factura (la usa 04_apriori_association.py --particion cluster)
+df[['no_factura', 'cluster']].to_csv('datos_enriquecidos/clusters_facturas.csv', index=False)
+
+etapa_kmeans.terminar(filas_salida=len(df))
+
+# Resumen por cluster (media de las columnas numéricas y valor más frecuente de las categóricas)
+cluster_summary = df.groupby('cluster')[columnas_numericas].mean()
 
 # Mostrar el resumen
 print("Resumen de Clusters")
 print(cluster_summary)
+print(resumen_categoricas(df, df['cluster']))
 
 # Graficar el método del codo para elegir el número de clusters
+etapa_codo = etapa("metodo_codo", filas_entrada=df_scaled.shape[0])
 inertia = []
 for k in range(1, 11):
-    kmeans = KMeans(n_clusters=k, random_state=42)
+    kmeans = modelo_kmeans(k, df_scaled.shape[0])
     kmeans.fit(df_scaled)
     inertia.append(kmeans.inertia_)
+etapa_codo.terminar()
 
 plt.plot(range(1, 11), inertia, marker='o', color='blue')
 plt.title("Método del Codo para K-Means")
@@ -41,11 +63,10 @@ plt.xlabel("Número de Clústeres")
 plt.ylabel("Inercia")
 plt.show()
 
-# Graficar la segmentación de clientes en 2D (PCA para reducir la dimensionalidad)
-from sklearn.decomposition import PCA
-
-pca = PCA(n_components=2)
-df_pca = pca.fit_transform(df_scaled)
+# Graficar la segmentación de clientes en 2D (TruncatedSVD: PCA no acepta matrices dispersas)
+etapa_pca = etapa("pca", filas_entrada=df_scaled.shape[0])
+df_pca = proyeccion_2d(df_scaled)
+etapa_pca.terminar(filas_salida=len(df_pca))
 
 plt.figure(figsize=(10, 6))
 plt.scatter(df_pca[:, 0], df_pca[:, 1], c=df['cluster'], cmap='viridis')
@@ -1,57 +1,150 @@
+import argparse
+import os
+
+
+def crear_parser():
+    parser = argparse.ArgumentParser(description="Reglas de asociación sobre el dataset maestro.")
+    parser.add_argument('--particion', help="Minar por separado cada valor de esta columna "
+                                             "(p. ej. anio_factura, region_colombia, cluster).")
+    parser.add_argument('--procesos', type=int, default=None, help="Número de procesos para --particion.")
+    parser.add_argument('--desde', help="Primer periodo (AAAA o AAAA-MM); lee solo esas particiones.")
+    parser.add_argument('--hasta', help="Último periodo (AAAA o AAAA-MM).")
+    parser.add_argument('--muestreo', action='store_true',
+                        help="Muestreo progresivo: crece la muestra hasta acotar support/confidence de las reglas "
+                             "principales dentro de --tolerancia.")
+    parser.add_argument('--tolerancia', type=float, default=0.02,
+                        help="Error máximo admitido en support/confidence con --muestreo.")
+    parser.add_argument('--delta', type=float, default=0.05,
+                        help="Probabilidad de que alguna cota de --muestreo no se cumpla.")
+    return parser
+
+
+if __name__ == "__main__":
+    # Los argumentos se leen antes de importar pandas/mlxtend: --help responde al instante
+    args = crear_parser().parse_args()
+
 import pandas as pd
-from mlxtend.frequent_patterns import apriori, association_rules
+from motor_reglas import (codificar_transacciones, reglas_por_umbrales, minar_por_particion, comparar_particiones,
+                          minar_progresivo)
+from almacen_reglas import guardar_reglas
+from memoria_maestro import cargar_maestro
+from instrumentacion import etapa
+
+# Carpeta/tabla del dataset maestro y ruta de la asignación de clusters (salida de 03_kmeans_clustering.py)
+carpeta_dataset = "datos_enriquecidos"
+tabla_dataset = "dataset_maestro_facturas"
+ruta_clusters = "datos_enriquecidos/clusters_facturas.csv"
+
+# Ruta de salida de la tabla de reglas (y de la versión con intervalos del modo --muestreo)
+ruta_reglas = "reglas_asociacion.csv"
+ruta_reglas_muestreo = "reglas_asociacion_muestreo.csv"
+
+# Seleccionar las columnas relevantes para la asociación.
+# Se usa el 100% de las facturas: el motor trabaja sobre transacciones
+# codificadas como enteros (sin One-Hot denso) y los nulos solo omiten el ítem.
+columnas_transaccion = ['proveedor_principal', 'destino_ciudad', 'genero', 'rango_edades']
+
+
+def reglas_globales(df):
+    transacciones = codificar_transacciones(df, columnas_transaccion)
+    print(f"Transacciones codificadas: {transacciones.n:,} facturas, {len(transacciones.etiquetas):,} ítems distintos")
+
+    # Minar UNA sola vez al soporte más bajo de la rejilla (Eclat sobre bitsets) y
+    # derivar de ese resultado los soportes más altos y los cortes de confianza/lift.
+    # Todos los umbrales son mínimos inclusivos (>=).
+    soportes = [0.01, 0.02]
+    confianzas = [0.0, 0.7]
+    lifts = [1.5, 3]
+    reglas_rejilla = reglas_por_umbrales(transacciones, soportes=soportes, confianzas=confianzas, lifts=lifts)
+
+    for min_support in soportes:
+        rules_soporte = reglas_rejilla[(min_support, 0.0, 1.5)]
+        rules_high_confidence = reglas_rejilla[(min_support, 0.7, 1.5)]
+        rules_high_lift = reglas_rejilla[(min_support, 0.0, 3)]
+
+        # Mostrar todas las reglas de asociación encontradas con este soporte
+        print(f"\nReglas de asociación con min_support={min_support} y min_threshold=1.5:")
+        print(rules_soporte)
+
+        print(f"\nReglas de alta confianza (>= 0.7) con min_support={min_support}:")
+        print(rules_high_confidence)
+
+        print(f"\nReglas con alto lift (>= 3) con min_support={min_support}:")
+        print(rules_high_lift)
+
+    rules = reglas_rejilla[(min(soportes), 0.0, 1.5)]
+
+    # Guardar la tabla de reglas (mismas columnas que mlxtend.association_rules)
+    rules.to_csv(ruta_reglas, index=False)
+    print(f"\nReglas guardadas en: {ruta_reglas}")
 
-# Cargar el dataset maestro
-ruta_dataset = "datos_enriquecidos/dataset_maestro_facturas.csv"
-df = pd.read_csv(ruta_dataset)
+    # Guardar también en el almacén indexado (SQLite) para consultas por ítem
+    # sin tener que re-parsear los frozenset del CSV
+    guardar_reglas(rules, origen="reglas_asociacion", columnas_items=transacciones.columnas_items)
 
-# Tomar una muestra del 50% de los datos para probar
-df_sample = df.sample(frac=0.50, random_state=42)
 
-# Eliminar las filas con valores nulos
-df_transacciones = df_sample.dropna()
+def reglas_muestreo(df, tolerancia, delta):
+    # Muestras crecientes hasta que las reglas principales quedan acotadas (Hoeffding)
+    # dentro de la tolerancia; cada regla lleva sus intervalos de support/confidence/lift
+    rules, historial = minar_progresivo(df, columnas=columnas_transaccion, min_support=0.01,
+                                        metric="lift", min_threshold=1.5, tolerancia=tolerancia, delta=delta)
+    print("\nMuestras evaluadas:")
+    print(historial)
 
-# Seleccionar las columnas relevantes para la asociación
-df_transacciones = df_transacciones[['proveedor_principal', 'destino_ciudad', 'genero', 'rango_edades']]
+    print(f"\nReglas con intervalos al {1 - delta:.0%} (min_support=0.01, lift >= 1.5):")
+    print(rules[['antecedents', 'consequents', 'support', 'support_inf', 'support_sup',
+                 'confidence', 'confidence_inf', 'confidence_sup', 'lift', 'lift_inf', 'lift_sup']].head(20))
 
-# Realizamos One-Hot Encoding en lugar de Label Encoding
-df_transacciones = pd.get_dummies(df_transacciones)
+    rules.to_csv(ruta_reglas_muestreo, index=False)
+    print(f"\nReglas guardadas en: {ruta_reglas_muestreo}")
+    columnas_items = codificar_transacciones(df, columnas_transaccion).columnas_items
+    guardar_reglas(rules, origen="reglas_asociacion_muestreo", columnas_items=columnas_items)
 
-# Ejecutar Apriori para encontrar los conjuntos frecuentes con un soporte mínimo de 0.01
-frequent_itemsets = apriori(df_transacciones, min_support=0.01, use_colnames=True)
 
-# Generar las reglas de asociación
-rules = association_rules(frequent_itemsets, metric="lift", min_threshold=1.5)
+def reglas_por_particion(df, columna, n_procesos):
+    # Los clusters no están en el maestro: se unen desde la salida del script 03
+    if columna == 'cluster' and 'cluster' not in df.columns:
+        if not os.path.exists(ruta_clusters):
+            print(f"Error: No existe '{ruta_clusters}'. Ejecuta primero 03_kmeans_clustering.py.")
+            return
+        df = df.merge(pd.read_csv(ruta_clusters), on='no_factura', how='left')
 
-# Mostrar todas las reglas de asociación encontradas
-print("Reglas de asociación encontradas:")
-print(rules)
+    if columna not in df.columns:
+        print(f"Error: La columna '{columna}' no existe en el dataset maestro.")
+        return
 
-# Filtrar las reglas de alta confianza (mayores a 0.7)
-rules_high_confidence = rules[rules['confidence'] > 0.7]
-print("\nReglas de alta confianza:")
-print(rules_high_confidence)
+    rules = minar_por_particion(df, columna, columnas=columnas_transaccion, min_support=0.01,
+                                metric="lift", min_threshold=1.5, n_procesos=n_procesos)
+    print(f"\nReglas por {columna}:")
+    print(rules.groupby('particion').size().rename('n_reglas'))
 
-# Filtrar las reglas con alto lift (mayores a 3)
-rules_high_lift = rules[rules['lift'] > 3]
-print("\nReglas con alto lift:")
-print(rules_high_lift)
+    # Comparar la misma regla entre particiones (p. ej. deriva del lift entre años)
+    comparacion = comparar_particiones(rules, metrica='lift')
+    print(f"\nDeriva del lift entre particiones de {columna} (reglas presentes en más de una):")
+    print(comparacion[comparacion['n_particiones'] > 1].head(20))
 
-# Probar con diferentes valores de min_support y min_threshold
-# Cambiar el min_support a 0.02 y min_threshold a 1.5 para obtener reglas más comunes y fuertes
-frequent_itemsets_2 = apriori(df_transacciones, min_support=0.02, use_colnames=True)
-rules_2 = association_rules(frequent_itemsets_2, metric="lift", min_threshold=1.5)
+    ruta_salida = f"reglas_asociacion_por_{columna}.csv"
+    rules.to_csv(ruta_salida, index=False)
+    print(f"\nReglas guardadas en: {ruta_salida}")
 
-# Mostrar las nuevas reglas
-print("\nNuevas reglas con min_support=0.02 y min_threshold=1.5:")
-print(rules_2)
+    columnas_items = codificar_transacciones(df, columnas_transaccion).columnas_items
+    for valor, reglas_particion in rules.groupby('particion'):
+        guardar_reglas(reglas_particion, origen=f"reglas_asociacion_{columna}={valor}",
+                       columnas_items=columnas_items)
 
-# Filtrar las nuevas reglas de alta confianza y alto lift
-rules_high_confidence_2 = rules_2[rules_2['confidence'] > 0.7]
-rules_high_lift_2 = rules_2[rules_2['lift'] > 3]
 
-print("\nNuevas reglas de alta confianza:")
-print(rules_high_confidence_2)
+if __name__ == "__main__":
+    # Cargar el dataset maestro compacto (completo o solo las particiones del rango)
+    with etapa("cargar_maestro") as e:
+        df = cargar_maestro(carpeta_dataset, args.desde, args.hasta)
+        e.filas(salida=len(df))
 
-print("\nNuevas reglas con alto lift:")
-print(rules_high_lift_2)
+    if args.particion:
+        with etapa("reglas_por_particion", filas_entrada=len(df)):
+            reglas_por_particion(df, args.particion, args.procesos)
+    elif args.muestreo:
+        with etapa("reglas_muestreo", filas_entrada=len(df)):
+            reglas_muestreo(df, args.tolerancia, args.delta)
+    else:
+        with etapa("reglas_globales", filas_entrada=len(df)):
+            reglas_globales(df)
@@ -0,0 +1,259 @@
+# almacen_reglas.py
+
+import argparse
+import ast
+import os
+import sqlite3
+
+import pandas as pd
+
+from motor_reglas import COLUMNAS_REGLAS
+
+# -----------------------------------------------------------------------------
+# 1. DEFINICIONES
+# -----------------------------------------------------------------------------
+
+RUTA_ALMACEN = "reglas_asociacion.sqlite"
+
+# Métricas de la tabla de reglas con nombre válido para SQL
+METRICAS = {col: col.replace(' ', '_') for col in COLUMNAS_REGLAS[2:]}
+
+LADOS = {'antecedente': 'A', 'consecuente': 'C'}
+
+ESQUEMA = f"""
+CREATE TABLE IF NOT EXISTS items (
+    id INTEGER PRIMARY KEY,
+    etiqueta TEXT NOT NULL UNIQUE,
+    columna TEXT
+);
+CREATE TABLE IF NOT EXISTS reglas (
+    id INTEGER PRIMARY KEY,
+    origen TEXT NOT NULL,
+    {', '.join(f'{m} REAL' for m in METRICAS.values())}
+);
+CREATE TABLE IF NOT EXISTS regla_items (
+    regla_id INTEGER NOT NULL REFERENCES reglas(id),
+    item_id INTEGER NOT NULL REFERENCES items(id),
+    lado TEXT NOT NULL CHECK (lado IN ('A', 'C'))
+);
+CREATE INDEX IF NOT EXISTS idx_regla_items_item ON regla_items (item_id, lado, regla_id);
+CREATE INDEX IF NOT EXISTS idx_regla_items_regla ON regla_items (regla_id);
+CREATE INDEX IF NOT EXISTS idx_reglas_origen_lift ON reglas (origen, lift);
+CREATE INDEX IF NOT EXISTS idx_items_columna ON items (columna);
+"""
+
+
+def conectar(ruta_db=RUTA_ALMACEN):
+    """Abre (y crea si no existe) el almacén de reglas."""
+    con = sqlite3.connect(ruta_db)
+    con.executescript(ESQUEMA)
+    return con
+
+
+# -----------------------------------------------------------------------------
+# 2. CARGA DE REGLAS
+# -----------------------------------------------------------------------------
+
+def parsear_itemset(texto):
+    """Convierte "frozenset({'A', 'B'})" (formato de los CSV de reglas) en un frozenset."""
+    if isinstance(texto, frozenset):
+        return texto
+    texto = texto.strip()
+    if texto.startswith('frozenset(') and texto.endswith(')'):
+        texto = texto[len('frozenset('):-1]
+    return frozenset(ast.literal_eval(texto)) if texto else frozenset()
+
+
+def inferir_columnas_items(etiquetas, df, columnas):
+    """
+    Para reglas importadas de CSV (sin columna de origen), busca en qué columna
+    del dataset aparece cada etiqueta. Devuelve {etiqueta: columna}.
+    """
+    resultado = {}
+    for col in columnas:
+        valores = set(df[col].dropna().astype(str).unique())
+        for etiqueta in etiquetas:
+            if etiqueta in valores and etiqueta not in resultado:
+                resultado[etiqueta] = col
+    return resultado
+
+
+def guardar_reglas(reglas, ruta_db=RUTA_ALMACEN, origen='reglas_asociacion', columnas_items=None):
+    """
+    Guarda una tabla de reglas (formato mlxtend) en el almacén, reemplazando
+    las reglas previas del mismo 'origen'. Los ítems se guardan una sola vez
+    en un diccionario (items) y cada regla referencia sus ítems por id.
+    """
+    columnas_items = columnas_items or {}
+    antecedentes = [parsear_itemset(a) for a in reglas['antecedents']]
+    consecuentes = [parsear_itemset(c) for c in reglas['consequents']]
+
+    con = conectar(ruta_db)
+    with con:
+        con.execute(
+            "DELETE FROM regla_items WHERE regla_id IN (SELECT id FROM reglas WHERE origen = ?)", (origen,)
+        )
+        con.execute("DELETE FROM reglas WHERE origen = ?", (origen,))
+
+        etiquetas = sorted(set().union(*antecedentes, *consecuentes))
+        con.executemany(
+            "INSERT INTO items (etiqueta, columna) VALUES (?, ?) "
+            "ON CONFLICT(etiqueta) DO UPDATE SET columna = COALESCE(excluded.columna, items.columna)",
+            [(e, columnas_items.get(e)) for e in etiquetas],
+        )
+        ids_items = dict(con.execute("SELECT etiqueta, id FROM items"))
+
+        columnas_sql = ', '.join(METRICAS.values())
+        marcadores = ', '.join('?' * (len(METRICAS) + 1))
+        valores = reglas[list(METRICAS)].astype(float).itertuples(index=False, name=None)
+        filas_items = []
+        for a, c, metricas in zip(antecedentes, consecuentes, valores):
+            cur = con.execute(f"INSERT INTO reglas (origen, {columnas_sql}) VALUES ({marcadores})",
+                              (origen, *metricas))
+            filas_items.extend((cur.lastrowid, ids_items[e], 'A') for e in a)
+            filas_items.extend((cur.lastrowid, ids_items[e], 'C') for e in c)
+        con.executemany("INSERT INTO regla_items (regla_id, item_id, lado) VALUES (?, ?, ?)", filas_items)
+    con.close()
+    print(f"Almacén '{ruta_db}': {len(reglas)} reglas guardadas con origen '{origen}'.")
+
+
+def importar_csv(ruta_csv, ruta_db=RUTA_ALMACEN, origen=None, df_maestro=None, columnas=None):
+    """Importa un CSV de reglas (antecedents/consequents como frozenset) al almacén."""
+    origen = origen or os.path.splitext(os.path.basename(ruta_csv))[0]
+    reglas = pd.read_csv(ruta_csv)
+    columnas_items = None
+    if df_maestro is not None and columnas:
+        etiquetas = set().union(*map(parsear_itemset, reglas['antecedents']),
+                                *map(parsear_itemset, reglas['consequents']))
+        columnas_items = inferir_columnas_items(etiquetas, df_maestro, columnas)
+    guardar_reglas(reglas, ruta_db, origen=origen, columnas_items=columnas_items)
+
+
+# -----------------------------------------------------------------------------
+# 3. CONSULTAS
+# -----------------------------------------------------------------------------
+
+def _armar_reglas(con, filas):
+    """Reconstruye antecedents/consequents (frozensets) de las reglas seleccionadas."""
+    columnas = ['id', 'origen'] + list(METRICAS.values())
+    df = pd.DataFrame(filas, columns=columnas)
+    if df.empty:
+        return pd.DataFrame(columns=['origen'] + COLUMNAS_REGLAS)
+
+    ids = df['id'].tolist()
+    marcadores = ', '.join('?' * len(ids))
+    lados = {(i, 'A'): set() for i in ids} | {(i, 'C'): set() for i in ids}
+    for regla_id, etiqueta, lado in con.execute(
+        f"SELECT ri.regla_id, it.etiqueta, ri.lado FROM regla_items ri "
+        f"JOIN items it ON it.id = ri.item_id WHERE ri.regla_id IN ({marcadores})", ids
+    ):
+        lados[(regla_id, lado)].add(etiqueta)
+
+    df['antecedents'] = [frozenset(lados[(i, 'A')]) for i in ids]
+    df['consequents'] = [frozenset(lados[(i, 'C')]) for i in ids]
+    df = df.rename(columns={v: k for k, v in METRICAS.items()})
+    return df[['origen'] + COLUMNAS_REGLAS]
+
+
+def top_reglas(item, lado='antecedente', n=10, orden='lift', origen=None, ruta_db=RUTA_ALMACEN):
+    """
+    Top-N reglas que contienen 'item' en el lado indicado ('antecedente' o
+    'consecuente'), ordenadas por la métrica 'orden' (desc). Usa el índice
+    (item_id, lado) en vez de recorrer y parsear el CSV completo.
+    """
+    if orden not in METRICAS:
+        raise ValueError(f"Métrica de orden desconocida: '{orden}'.")
+    con = conectar(ruta_db)
+    sql = (
+        f"SELECT r.id, r.origen, {', '.join('r.' + m for m in METRICAS.values())} "
+        f"FROM regla_items ri JOIN items it ON it.id = ri.item_id "
+        f"JOIN reglas r ON r.id = ri.regla_id "
+        f"WHERE it.etiqueta = ? AND ri.lado = ?"
+    )
+    params = [item, LADOS[lado]]
+    if origen is not None:
+        sql += " AND r.origen = ?"
+        params.append(origen)
+    sql += f" ORDER BY r.{METRICAS[orden]} DESC LIMIT ?"
+    params.append(n)
+    resultado = _armar_reglas(con, con.execute(sql, params).fetchall())
+    con.close()
+    return resultado
+
+
+def consecuentes_de(item, columna=None, orden='lift', origen=None, ruta_db=RUTA_ALMACEN):
+    """
+    Ítems que aparecen como consecuente de reglas cuyo antecedente contiene
+    'item' (p. ej. qué destinos siguen al proveedor X con columna='destino_ciudad').
+    Devuelve una fila por ítem consecuente con su mejor métrica y el número de reglas.
+    """
+    if orden not in METRICAS:
+        raise ValueError(f"Métrica de orden desconocida: '{orden}'.")
+    con = conectar(ruta_db)
+    m = METRICAS[orden]
+    sql = (
+        f"SELECT ic.etiqueta, ic.columna, MAX(r.{m}) AS {m}, MAX(r.confidence) AS confidence, "
+        f"COUNT(DISTINCT r.id) AS n_reglas "
+        f"FROM items ia "
+        f"JOIN regla_items ra ON ra.item_id = ia.id AND ra.lado = 'A' "
+        f"JOIN reglas r ON r.id = ra.regla_id "
+        f"JOIN regla_items rc ON rc.regla_id = r.id AND rc.lado = 'C' "
+        f"JOIN items ic ON ic.id = rc.item_id "
+        f"WHERE ia.etiqueta = ?"
+    )
+    params = [item]
+    if columna is not None:
+        sql += " AND ic.columna = ?"
+        params.append(columna)
+    if origen is not None:
+        sql += " AND r.origen = ?"
+        params.append(origen)
+    sql += f" GROUP BY ic.id ORDER BY {m} DESC"
+    resultado = pd.DataFrame(con.execute(sql, params).fetchall(),
+                             columns=['item', 'columna', orden, 'confidence', 'n_reglas'])
+    con.close()
+    return resultado
+
+
+# -----------------------------------------------------------------------------
+# 4. EJECUCIÓN PRINCIPAL
+# -----------------------------------------------------------------------------
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Almacén indexado de reglas de asociación (SQLite).")
+    parser.add_argument('--db', default=RUTA_ALMACEN, help="Ruta del almacén SQLite.")
+    sub = parser.add_subparsers(dest='comando', required=True)
+
+    p_imp = sub.add_parser('importar', help="Importa CSVs de reglas al almacén.")
+    p_imp.add_argument('csv', nargs='+')
+    p_imp.add_argument('--maestro', help="Dataset maestro para inferir la columna de cada ítem.")
+
+    p_top = sub.add_parser('top', help="Top-N reglas que contienen un ítem.")
+    p_top.add_argument('item')
+    p_top.add_argument('--lado', choices=list(LADOS), default='antecedente')
+    p_top.add_argument('-n', type=int, default=10)
+    p_top.add_argument('--orden', default='lift')
+    p_top.add_argument('--origen')
+
+    p_con = sub.add_parser('consecuentes', help="Ítems que siguen a un ítem antecedente.")
+    p_con.add_argument('item')
+    p_con.add_argument('--columna')
+    p_con.add_argument('--orden', default='lift')
+    p_con.add_argument('--origen')
+
+    args = parser.parse_args()
+    pd.set_option('display.width', 200)
+
+    if args.comando == 'importar':
+        df_maestro = None
+        columnas = ['proveedor_principal', 'destino_ciudad', 'genero', 'rango_edades', 'region_colombia']
+        if args.maestro:
+            df_maestro = pd.read_csv(args.maestro, usecols=columnas, low_memory=False)
+        for ruta in args.csv:
+            importar_csv(ruta, args.db, df_maestro=df_maestro, columnas=columnas)
+    elif args.comando == 'top':
+        print(top_reglas(args.item, lado=args.lado, n=args.n, orden=args.orden,
+                         origen=args.origen, ruta_db=args.db))
+    elif args.comando == 'consecuentes':
+        print(consecuentes_de(args.item, columna=args.columna, orden=args.orden,
+                              origen=args.origen, ruta_db=args.db))
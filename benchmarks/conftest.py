@@ -0,0 +1,68 @@
+import os
+import sys
+
+import pytest
+
+# Los benchmarks no deben dejar JSON de métricas en el repositorio
+os.environ.setdefault("CVU_METRICAS", "0")
+os.environ.setdefault("MPLBACKEND", "Agg")
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if RAIZ not in sys.path:
+    sys.path.insert(0, RAIZ)
+
+# Tamaño de la exportación sintética (10k por defecto; hasta 50M para corridas nocturnas)
+FILAS = int(os.environ.get("CVU_BENCH_FILAS", "10000"))
+ANIOS = [int(a) for a in os.environ.get("CVU_BENCH_ANIOS", "2017 2018").split()]
+RONDAS = int(os.environ.get("CVU_BENCH_RONDAS", "3"))
+
+
+@pytest.fixture(scope="session")
+def raiz():
+    """Carpeta raíz del repositorio (scripts de cada etapa)."""
+    return RAIZ
+
+
+@pytest.fixture
+def medir(benchmark):
+    """Mide una etapa: cada ronda es una corrida completa (sin repeticiones internas)."""
+    def _medir(funcion, preparar=None):
+        return benchmark.pedantic(funcion, setup=preparar, rounds=RONDAS, iterations=1)
+    return _medir
+
+
+@pytest.fixture(scope="session")
+def carpetas_bench(tmp_path_factory):
+    """
+    Genera la exportación sintética una vez por sesión y corre el pipeline
+    completo para dejar las entradas de cada etapa (limpios, enriquecidos, maestro).
+    """
+    from generador_sintetico import generar_exportaciones
+    from procesar_ventas_v2 import cargar_y_consolidar, limpiar_datos, crear_tablas_normalizadas
+
+    base = tmp_path_factory.mktemp("bench")
+    carpetas = {
+        "base": str(base),
+        "csv": str(base / "datos_csv"),
+        "limpios": str(base / "datos_limpios"),
+        "enriquecidos": str(base / "datos_enriquecidos"),
+    }
+    for carpeta in carpetas.values():
+        os.makedirs(carpeta, exist_ok=True)
+
+    generar_exportaciones(carpetas["csv"], FILAS, ANIOS)
+    crear_tablas_normalizadas(limpiar_datos(cargar_y_consolidar(carpetas["csv"])), carpetas["limpios"])
+    return carpetas
+
+
+@pytest.fixture(scope="session")
+def carpetas_enriquecidas(carpetas_bench):
+    pytest.importorskip("pycountry")
+    pytest.importorskip("geonamescache")
+    from enriquecer_datos import enriquecer_datos
+    from build_dataset_maestro import cargar_enriquecidos, construir_maestro, guardar_maestro
+
+    enriquecer_datos(carpetas_bench["limpios"], carpetas_bench["enriquecidos"])
+    maestro = construir_maestro(*cargar_enriquecidos(carpetas_bench["enriquecidos"]))
+    guardar_maestro(maestro, carpetas_bench["enriquecidos"])
+    return carpetas_bench
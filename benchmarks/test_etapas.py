@@ -0,0 +1,82 @@
+import os
+import runpy
+import sys
+
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+
+def test_ingesta(medir, carpetas_bench):
+    from procesar_ventas_v2 import cargar_y_consolidar
+
+    df = medir(lambda: cargar_y_consolidar(carpetas_bench["csv"]))
+    assert len(df)
+
+
+def test_limpieza(medir, carpetas_bench):
+    from procesar_ventas_v2 import cargar_y_consolidar, limpiar_datos
+
+    df_bruto = cargar_y_consolidar(carpetas_bench["csv"])
+
+    def preparar():
+        return (df_bruto.copy(),), {}
+
+    medir(limpiar_datos, preparar)
+
+
+def test_normalizacion(medir, carpetas_bench, tmp_path):
+    from procesar_ventas_v2 import cargar_y_consolidar, limpiar_datos, crear_tablas_normalizadas
+
+    df_limpio = limpiar_datos(cargar_y_consolidar(carpetas_bench["csv"]))
+
+    def preparar():
+        return (df_limpio.copy(), str(tmp_path)), {}
+
+    medir(crear_tablas_normalizadas, preparar)
+    assert os.path.exists(tmp_path / "facturas.csv")
+
+
+def test_enriquecimiento_geo(medir, carpetas_bench, tmp_path):
+    pytest.importorskip("pycountry")
+    pytest.importorskip("geonamescache")
+    from enriquecer_datos import enriquecer_datos
+
+    medir(lambda: enriquecer_datos(carpetas_bench["limpios"], str(tmp_path)))
+    assert os.path.exists(tmp_path / "facturas_enriquecido.csv")
+
+
+def test_construccion_maestro(medir, carpetas_enriquecidas):
+    from build_dataset_maestro import cargar_enriquecidos, construir_maestro
+
+    def construir():
+        return construir_maestro(*cargar_enriquecidos(carpetas_enriquecidas["enriquecidos"]))
+
+    maestro = medir(construir)
+    assert maestro["no_factura"].is_unique
+
+
+def test_kmeans(medir, raiz, carpetas_enriquecidas, monkeypatch):
+    pytest.importorskip("sklearn")
+    monkeypatch.chdir(carpetas_enriquecidas["base"])
+    monkeypatch.setattr(sys, "argv", ["03_kmeans_clustering.py"])
+    script = os.path.join(raiz, "03_kmeans_clustering.py")
+
+    medir(lambda: runpy.run_path(script, run_name="__main__"))
+    assert os.path.exists(os.path.join("datos_enriquecidos", "clusters_facturas.csv"))
+
+
+def test_apriori(medir, carpetas_enriquecidas):
+    import pandas as pd
+    from motor_reglas import codificar_transacciones, reglas_por_umbrales
+
+    maestro = pd.read_csv(os.path.join(carpetas_enriquecidas["enriquecidos"], "dataset_maestro_facturas.csv"),
+                          low_memory=False)
+    columnas = ["proveedor_principal", "destino_ciudad", "genero", "rango_edades"]
+
+    def minar():
+        transacciones = codificar_transacciones(maestro, columnas)
+        return reglas_por_umbrales(transacciones, soportes=[0.01, 0.02], confianzas=[0.0, 0.7], lifts=[1.5, 3])
+
+    reglas = medir(minar)
+    assert (0.01, 0.0, 1.5) in reglas
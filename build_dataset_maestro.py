@@ -1,8 +1,31 @@
 # 01_build_dataset_maestro_facturas.py
 
+import argparse
+import os
+
+
+def crear_parser():
+    # Rango de fechas opcional (año o año-mes, inclusivo): solo se leen las
+    # particiones anio=/mes= de ese rango y solo se reescriben esas particiones del maestro
+    parser = argparse.ArgumentParser(description="Construye el dataset maestro a nivel factura.")
+    parser.add_argument("--desde", help="Primer periodo a procesar (AAAA o AAAA-MM).")
+    parser.add_argument("--hasta", help="Último periodo a procesar (AAAA o AAAA-MM).")
+    return parser
+
+
+if __name__ == "__main__":
+    # Los argumentos se leen antes de importar pandas: --help responde al instante
+    args = crear_parser().parse_args()
+
 import pandas as pd
 import numpy as np
-import os
+
+from top_k_maestro import reconstruir_sketches
+from cubo_facturas import construir_cubo
+from indice_facturas import construir_indices
+from particiones import escribir_particionado, leer_tabla
+from instrumentacion import etapa
+from memoria_maestro import compactar_maestro
 
 # ---------------------------------------------------------
 # 1. Rutas de archivos (ajusta si tu estructura es distinta)
@@ -10,37 +33,35 @@ import os
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))  # carpeta donde está este script
 RUTA_DATOS_ENRIQ = os.path.join(BASE_DIR, "datos_enriquecidos")
 
-RUTA_CLIENTES = os.path.join(RUTA_DATOS_ENRIQ, "clientes_enriquecido.csv")
-RUTA_FACTURAS = os.path.join(RUTA_DATOS_ENRIQ, "facturas_enriquecido.csv")
-RUTA_PROV = os.path.join(RUTA_DATOS_ENRIQ, "proveedores_por_factura_enriquecido.csv")
-
-print("Cargando archivos enriquecidos...")
 
-df_clientes = pd.read_csv(RUTA_CLIENTES, low_memory=False)
-df_facturas = pd.read_csv(RUTA_FACTURAS, low_memory=False)
-df_prov = pd.read_csv(RUTA_PROV, low_memory=False)
-
-print(f"clientes_enriquecido: {len(df_clientes):,} filas")
-print(f"facturas_enriquecido: {len(df_facturas):,} filas")
-print(f"proveedores_por_factura_enriquecido: {len(df_prov):,} filas")
+def cargar_enriquecidos(carpeta=RUTA_DATOS_ENRIQ, desde=None, hasta=None):
+    """
+    Lee clientes, facturas y proveedores enriquecidos. Con rango de fechas
+    (año o año-mes, inclusivo) solo se leen las particiones anio=/mes= de ese rango.
+    """
+    print("Cargando archivos enriquecidos...")
+    with etapa("cargar_enriquecidos") as e:
+        df_clientes = leer_tabla(carpeta, "clientes_enriquecido", desde, hasta, low_memory=False)
+        df_facturas = leer_tabla(carpeta, "facturas_enriquecido", desde, hasta, low_memory=False)
+        df_prov = leer_tabla(carpeta, "proveedores_por_factura_enriquecido", desde, hasta, low_memory=False)
+        if desde or hasta:
+            # Un cliente está en la partición de su primera factura: los clientes de
+            # facturas del rango que empezaron antes se buscan en la tabla completa
+            faltantes = set(df_facturas["id_cliente"]) - set(df_clientes["id_cliente"])
+            if faltantes:
+                todos = leer_tabla(carpeta, "clientes_enriquecido", low_memory=False)
+                df_clientes = pd.concat([df_clientes, todos[todos["id_cliente"].isin(faltantes)]],
+                                        ignore_index=True)
+        e.filas(salida=len(df_clientes) + len(df_facturas) + len(df_prov))
+
+    print(f"clientes_enriquecido: {len(df_clientes):,} filas")
+    print(f"facturas_enriquecido: {len(df_facturas):,} filas")
+    print(f"proveedores_por_factura_enriquecido: {len(df_prov):,} filas")
+    return df_clientes, df_facturas, df_prov
 
-# ---------------------------------------------------------
-# 2. Asegurar tipos básicos
-# ---------------------------------------------------------
-# no_factura debería ser string para evitar problemas con ceros a la izquierda, etc.
-for df in [df_facturas, df_prov]:
-    if "no_factura" in df.columns:
-        df["no_factura"] = df["no_factura"].astype(str).str.strip()
-
-# vlr_presupuesto_ppto a numérico
-if "vlr_presupuesto_ppto" in df_prov.columns:
-    df_prov["vlr_presupuesto_ppto"] = pd.to_numeric(
-        df_prov["vlr_presupuesto_ppto"], errors="coerce"
-    )
 
 # ---------------------------------------------------------
-# 3. Agregación de proveedores por factura
-#    (puede haber varias filas por no_factura)
+# Funciones auxiliares: proveedor principal y agregados por factura
 # ---------------------------------------------------------
 def proveedor_principal(grupo):
     """
@@ -77,78 +98,157 @@ def agregar_proveedores(grupo):
     )
 
 
-print("Agregando información de proveedores por factura...")
-df_prov_agg = (
-    df_prov.groupby("no_factura")
-    .apply(agregar_proveedores)
-    .reset_index()
-)
-
-print(f"Tabla agregada de proveedores: {len(df_prov_agg):,} facturas")
+def agregar_por_factura(df_prov):
+    """
+    Agrega las filas de proveedores a una fila por no_factura: n_proveedores,
+    suma y promedio de vlr_presupuesto_ppto y proveedor_principal.
+    """
+    print("Agregando información de proveedores por factura...")
+    with etapa("agregar_proveedores", filas_entrada=len(df_prov)) as e:
+        df_prov_agg = (
+            df_prov.groupby("no_factura")
+            .apply(agregar_proveedores)
+            .reset_index()
+        )
+        e.filas(salida=len(df_prov_agg))
 
-# ---------------------------------------------------------
-# 4. Unir facturas con atributos del 'cliente' de esa factura
-#    (en tu pipeline, id_cliente es 1:1 con no_factura)
-# ---------------------------------------------------------
-if "id_cliente" not in df_facturas.columns:
-    raise ValueError("facturas_enriquecido no tiene columna 'id_cliente'.")
+    print(f"Tabla agregada de proveedores: {len(df_prov_agg):,} facturas")
+    return df_prov_agg
 
-if "id_cliente" not in df_clientes.columns:
-    raise ValueError("clientes_enriquecido no tiene columna 'id_cliente'.")
 
-print("Uniendo facturas con información de clientes (por id_cliente)...")
+def construir_maestro(df_clientes, df_facturas, df_prov):
+    """
+    Une clientes, facturas y la agregación de proveedores en el dataset
+    maestro a nivel factura y crea las variables derivadas.
+    """
+    # ---------------------------------------------------------
+    # 2. Asegurar tipos básicos
+    # ---------------------------------------------------------
+    # no_factura debería ser string para evitar problemas con ceros a la izquierda, etc.
+    for df in [df_facturas, df_prov]:
+        if "no_factura" in df.columns:
+            df["no_factura"] = df["no_factura"].astype(str).str.strip()
+
+    # vlr_presupuesto_ppto a numérico
+    if "vlr_presupuesto_ppto" in df_prov.columns:
+        df_prov["vlr_presupuesto_ppto"] = pd.to_numeric(
+            df_prov["vlr_presupuesto_ppto"], errors="coerce"
+        )
+
+    # ---------------------------------------------------------
+    # 3. Agregación de proveedores por factura
+    #    (puede haber varias filas por no_factura)
+    # ---------------------------------------------------------
+    df_prov_agg = agregar_por_factura(df_prov)
+
+    # ---------------------------------------------------------
+    # 4. Unir facturas con atributos del 'cliente' de esa factura
+    #    (varias facturas pueden compartir cliente tras la resolución de clientes)
+    # ---------------------------------------------------------
+    if "id_cliente" not in df_facturas.columns:
+        raise ValueError("facturas_enriquecido no tiene columna 'id_cliente'.")
+
+    if "id_cliente" not in df_clientes.columns:
+        raise ValueError("clientes_enriquecido no tiene columna 'id_cliente'.")
+
+    print("Uniendo facturas con información de clientes (por id_cliente)...")
+    etapa_union = etapa("unir_tablas", filas_entrada=len(df_facturas))
+
+    df_fact_cli = df_facturas.merge(
+        df_clientes,
+        on="id_cliente",
+        how="left",
+        suffixes=("_fac", "_cli")  # por si en algún momento hay nombres repetidos
+    )
 
-df_fact_cli = df_facturas.merge(
-    df_clientes,
-    on="id_cliente",
-    how="left",
-    suffixes=("_fac", "_cli")  # por si en algún momento hay nombres repetidos
-)
+    print(f"Facturas + clientes: {len(df_fact_cli):,} filas")
 
-print(f"Facturas + clientes: {len(df_fact_cli):,} filas")
+    # ---------------------------------------------------------
+    # 5. Unir la agregación de proveedores a nivel factura
+    # ---------------------------------------------------------
+    print("Uniendo información de proveedores (por no_factura)...")
 
-# ---------------------------------------------------------
-# 5. Unir la agregación de proveedores a nivel factura
-# ---------------------------------------------------------
-print("Uniendo información de proveedores (por no_factura)...")
+    df_maestro = df_fact_cli.merge(
+        df_prov_agg,
+        on="no_factura",
+        how="left"
+    )
 
-df_maestro = df_fact_cli.merge(
-    df_prov_agg,
-    on="no_factura",
-    how="left"
-)
+    # ---------------------------------------------------------
+    # 6. Crear algunas variables derivadas útiles (nacional vs internacional)
+    # ---------------------------------------------------------
+    print("Creando variables derivadas...")
 
-# ---------------------------------------------------------
-# 6. Crear algunas variables derivadas útiles (nacional vs internacional)
-# ---------------------------------------------------------
-print("Creando variables derivadas...")
-
-# es_internacional = 1 si el destino no es Colombia y no es NaN
-df_maestro["es_internacional"] = np.where(
-    (df_maestro["destino_pais"].notna()) & (df_maestro["destino_pais"] != "Colombia"),
-    1,
-    0,
-)
-
-# año_factura (si no existe ya)
-if "fecha_factura" in df_maestro.columns and "anio_factura" not in df_maestro.columns:
-    df_maestro["fecha_factura"] = pd.to_datetime(
-        df_maestro["fecha_factura"], errors="coerce"
+    # es_internacional = 1 si el destino no es Colombia y no es NaN
+    df_maestro["es_internacional"] = np.where(
+        (df_maestro["destino_pais"].notna()) & (df_maestro["destino_pais"] != "Colombia"),
+        1,
+        0,
     )
-    df_maestro["anio_factura"] = df_maestro["fecha_factura"].dt.year
 
-print(f"Dataset maestro a nivel factura: {len(df_maestro):,} filas")
+    # año_factura (si no existe ya)
+    if "fecha_factura" in df_maestro.columns and "anio_factura" not in df_maestro.columns:
+        df_maestro["fecha_factura"] = pd.to_datetime(
+            df_maestro["fecha_factura"], errors="coerce"
+        )
+        df_maestro["anio_factura"] = df_maestro["fecha_factura"].dt.year
+
+    etapa_union.terminar(filas_salida=len(df_maestro))
+    print(f"Dataset maestro a nivel factura: {len(df_maestro):,} filas")
+
+    return df_maestro
+
 
 # ---------------------------------------------------------
 # 7. Guardar resultado
 # ---------------------------------------------------------
-RUTA_SALIDA = os.path.join(RUTA_DATOS_ENRIQ, "dataset_maestro_facturas.csv")
-df_maestro.to_csv(RUTA_SALIDA, index=False, encoding="utf-8-sig")
+def guardar_maestro(df_maestro, carpeta=RUTA_DATOS_ENRIQ, en_rango=False):
+    """
+    Guarda el maestro (CSV plano + copia particionada) y sus derivados. Con
+    'en_rango' solo se reemplazan las particiones presentes en df_maestro.
+    """
+    ruta_salida = os.path.join(carpeta, "dataset_maestro_facturas.csv")
+    ruta_particiones = os.path.join(carpeta, "dataset_maestro_facturas")
+    with etapa("guardar_maestro", filas_entrada=len(df_maestro)):
+        if en_rango:
+            # Solo se reemplazan las particiones del rango; el CSV plano y los derivados
+            # (sketches, cubo, índices) se regeneran con una corrida completa
+            escribir_particionado(df_maestro, ruta_particiones, modo="particiones")
+            print("\nRango de fechas: no se actualizan el CSV plano, los sketches, el cubo ni los índices.")
+            return
+
+        df_maestro.to_csv(ruta_salida, index=False, encoding="utf-8-sig")
+        escribir_particionado(df_maestro, ruta_particiones)
+
+        print(f"\nArchivo guardado en: {ruta_salida}")
+
+        # Esquema compacto (categóricas, tipos numéricos mínimos, booleanos) con el
+        # que EDA, clustering y reglas cargan el maestro, más el reporte de memoria
+        compactar_maestro(carpeta)
+
+        # Sketches de top-k (destinos, proveedores...) persistidos junto al maestro,
+        # para consultar los rankings sin volver a recorrer el dataset
+        reconstruir_sketches(df_maestro, os.path.join(carpeta, "top_k_maestro.json"))
 
-print(f"\nArchivo guardado en: {RUTA_SALIDA}")
+        # Cubo pre-agregado (rollups de valores y conteos por año, mes, geo, proveedor,
+        # género y edad) para responder consultas sin releer el maestro
+        construir_cubo(df_maestro, os.path.join(carpeta, "cubo_facturas.parquet"))
+
+        # Índice lateral por no_factura / id_cliente sobre las tablas enriquecidas y el
+        # maestro, para consultar una factura sin cargar ni filtrar cada tabla
+        construir_indices(carpeta, os.path.join(carpeta, ".indices"))
+
+
+# ---------------------------------------------------------
+# 8. Ejecución principal
+# ---------------------------------------------------------
+if __name__ == "__main__":
+    df_clientes, df_facturas, df_prov = cargar_enriquecidos(RUTA_DATOS_ENRIQ, args.desde, args.hasta)
+    df_maestro = construir_maestro(df_clientes, df_facturas, df_prov)
+    guardar_maestro(df_maestro, RUTA_DATOS_ENRIQ, en_rango=args.desde is not None or args.hasta is not None)
 
-print("\nColumnas del dataset maestro:")
-print(df_maestro.columns.tolist())
+    print("\nColumnas del dataset maestro:")
+    print(df_maestro.columns.tolist())
 
-print("\nVista rápida de 5 filas:")
-print(df_maestro.head())
+    print("\nVista rápida de 5 filas:")
+    print(df_maestro.head())
@@ -0,0 +1,165 @@
+# consultas_sql.py
+
+import argparse
+import os
+import sqlite3
+
+import pandas as pd
+
+# -----------------------------------------------------------------------------
+# 1. DEFINICIONES
+# -----------------------------------------------------------------------------
+
+CARPETA_LIMPIOS = "datos_limpios"
+CARPETA_ENRIQ = "datos_enriquecidos"
+
+# Vistas registradas: nombre -> archivo de salida del pipeline
+TABLAS = {
+    "clientes": os.path.join(CARPETA_LIMPIOS, "clientes.csv"),
+    "facturas": os.path.join(CARPETA_LIMPIOS, "facturas.csv"),
+    "proveedores_por_factura": os.path.join(CARPETA_LIMPIOS, "proveedores_por_factura.csv"),
+    "clientes_enriquecido": os.path.join(CARPETA_ENRIQ, "clientes_enriquecido.csv"),
+    "facturas_enriquecido": os.path.join(CARPETA_ENRIQ, "facturas_enriquecido.csv"),
+    "proveedores_por_factura_enriquecido": os.path.join(CARPETA_ENRIQ, "proveedores_por_factura_enriquecido.csv"),
+    "maestro": os.path.join(CARPETA_ENRIQ, "dataset_maestro_facturas.csv"),
+    "cubo": os.path.join(CARPETA_ENRIQ, "cubo_facturas.parquet"),
+}
+
+# Columnas indexadas en el respaldo SQLite
+INDICES = ["no_factura", "id_cliente"]
+
+RUTA_SQLITE = os.path.join(CARPETA_ENRIQ, "consultas.sqlite")
+
+
+# -----------------------------------------------------------------------------
+# 2. MOTORES
+# -----------------------------------------------------------------------------
+
+def _conectar_duckdb(tablas):
+    """
+    DuckDB: cada tabla es una VISTA sobre el archivo (read_csv_auto /
+    read_parquet), así que filtros, proyecciones y agregados se resuelven
+    leyendo el archivo directamente, sin materializarlo en pandas.
+    """
+    import duckdb
+
+    con = duckdb.connect()
+    for nombre, ruta in tablas.items():
+        if not os.path.exists(ruta):
+            continue
+        ruta_sql = ruta.replace("'", "''")
+        lector = (f"read_parquet('{ruta_sql}')" if ruta.endswith(".parquet")
+                  else f"read_csv_auto('{ruta_sql}', header=true)")
+        con.execute(f'CREATE VIEW "{nombre}" AS SELECT * FROM {lector}')
+    return con
+
+
+def _conectar_sqlite(tablas, ruta_db=RUTA_SQLITE):
+    """
+    Respaldo sin DuckDB: carga cada CSV una vez a SQLite (por lotes, con
+    índices en no_factura / id_cliente) y solo lo recarga si el archivo cambió.
+    """
+    con = sqlite3.connect(ruta_db)
+    con.execute("CREATE TABLE IF NOT EXISTS _origen (tabla TEXT PRIMARY KEY, mtime REAL)")
+    cargadas = dict(con.execute("SELECT tabla, mtime FROM _origen"))
+    for nombre, ruta in tablas.items():
+        if not os.path.exists(ruta) or not ruta.endswith(".csv"):
+            continue
+        mtime = os.path.getmtime(ruta)
+        if cargadas.get(nombre) == mtime:
+            continue
+        print(f"Cargando '{ruta}' en SQLite como '{nombre}'...")
+        con.execute(f'DROP TABLE IF EXISTS "{nombre}"')
+        columnas = []
+        for chunk in pd.read_csv(ruta, chunksize=100_000, low_memory=False, encoding="utf-8-sig"):
+            chunk.to_sql(nombre, con, if_exists="append", index=False)
+            columnas = chunk.columns
+        for col in INDICES:
+            if col in columnas:
+                con.execute(f'CREATE INDEX IF NOT EXISTS "idx_{nombre}_{col}" ON "{nombre}" ("{col}")')
+        con.execute("INSERT OR REPLACE INTO _origen (tabla, mtime) VALUES (?, ?)", (nombre, mtime))
+        con.commit()
+    return con
+
+
+def conectar(motor="auto", tablas=TABLAS):
+    """
+    Abre el motor de consultas con las tablas del pipeline registradas.
+    motor: 'duckdb', 'sqlite' o 'auto' (DuckDB si está instalado).
+    Devuelve (nombre_motor, conexion).
+    """
+    if motor in ("auto", "duckdb"):
+        try:
+            return "duckdb", _conectar_duckdb(tablas)
+        except ImportError:
+            if motor == "duckdb":
+                raise
+            print("(Instala 'duckdb' con 'pip install duckdb' para consultar los archivos sin cargarlos a SQLite)")
+    return "sqlite", _conectar_sqlite(tablas)
+
+
+def consultar(sql, con):
+    """Ejecuta una consulta SQL y devuelve el resultado como DataFrame."""
+    if isinstance(con, sqlite3.Connection):
+        return pd.read_sql_query(sql, con)
+    return con.execute(sql).df()
+
+
+def listar_tablas(motor, con):
+    if motor == "duckdb":
+        return [fila[0] for fila in con.execute("SELECT view_name FROM duckdb_views() WHERE NOT internal").fetchall()]
+    return [fila[0] for fila in con.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE '\\_%' ESCAPE '\\'"
+    ).fetchall()]
+
+
+# -----------------------------------------------------------------------------
+# 3. CLI / REPL
+# -----------------------------------------------------------------------------
+
+def repl(motor, con):
+    """Bucle interactivo: consultas terminadas en ';', '.tablas' para listar, '.salir' para terminar."""
+    print(f"Motor: {motor}. Tablas: {', '.join(listar_tablas(motor, con))}")
+    print("Escribe consultas SQL terminadas en ';' ('.tablas' para listar, '.salir' para terminar).")
+    buffer = []
+    while True:
+        try:
+            linea = input("sql> " if not buffer else "...> ")
+        except EOFError:
+            print()
+            break
+        comando = linea.strip()
+        if not buffer and comando in (".salir", ".quit", ".exit"):
+            break
+        if not buffer and comando == ".tablas":
+            print("\n".join(listar_tablas(motor, con)))
+            continue
+        buffer.append(linea)
+        if comando.endswith(";"):
+            sql = "\n".join(buffer)
+            buffer = []
+            try:
+                print(consultar(sql, con))
+            except Exception as e:
+                print(f"Error: {e}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Consultas SQL sobre las salidas del pipeline.")
+    parser.add_argument("sql", nargs="?", help="Consulta a ejecutar; sin consulta abre el REPL.")
+    parser.add_argument("--motor", choices=["auto", "duckdb", "sqlite"], default="auto")
+    parser.add_argument("--salida", help="Guardar el resultado en este CSV.")
+    args = parser.parse_args()
+
+    pd.set_option("display.width", 200)
+    pd.set_option("display.max_columns", 50)
+    motor, con = conectar(args.motor)
+    if args.sql:
+        resultado = consultar(args.sql, con)
+        if args.salida:
+            resultado.to_csv(args.salida, index=False, encoding="utf-8-sig")
+            print(f"Resultado guardado en: {args.salida}")
+        else:
+            print(resultado)
+    else:
+        repl(motor, con)
@@ -0,0 +1,188 @@
+# cubo_facturas.py
+
+import argparse
+import os
+
+import pandas as pd
+
+# -----------------------------------------------------------------------------
+# 1. DEFINICIONES
+# -----------------------------------------------------------------------------
+
+RUTA_CUBO = os.path.join("datos_enriquecidos", "cubo_facturas.parquet")
+
+# Dimensiones del cubo (se guardan como categóricas = codificadas por diccionario)
+DIMENSIONES = [
+    "anio_factura",
+    "mes_factura",
+    "destino_continente",
+    "destino_pais",
+    "region_colombia",
+    "proveedor_principal",
+    "genero",
+    "rango_edades",
+]
+
+# Medidas aditivas: para cada columna se guarda la suma y el número de no nulos,
+# así cualquier rollup puede recalcular sumas, conteos y promedios
+MEDIDAS = {
+    "vlr_total_neto_factura": "vlr_neto",
+    "suma_vlr_presupuesto_ppto": "vlr_ppto",
+}
+
+SIN_DATO = "(sin dato)"
+
+_CACHE_CUBO = {}
+
+
+# -----------------------------------------------------------------------------
+# 2. CONSTRUCCIÓN
+# -----------------------------------------------------------------------------
+
+def _cuboide_base(df_maestro):
+    """Agrega el maestro al cuboide base (sin guardarlo)."""
+    df = df_maestro.copy()
+    if "mes_factura" not in df.columns and "fecha_factura" in df.columns:
+        df["mes_factura"] = pd.to_datetime(df["fecha_factura"], errors="coerce").dt.month
+
+    dims = [d for d in DIMENSIONES if d in df.columns]
+    for dim in dims:
+        # Los nulos se vuelven un miembro explícito para no perderlos en el groupby
+        if pd.api.types.is_numeric_dtype(df[dim]):
+            df[dim] = df[dim].astype("Int64")
+        df[dim] = df[dim].astype("string").fillna(SIN_DATO).astype("category")
+
+    agregaciones = {"n_facturas": ("no_factura", "size")}
+    for col, nombre in MEDIDAS.items():
+        if col in df.columns:
+            agregaciones[f"suma_{nombre}"] = (col, "sum")
+            agregaciones[f"n_{nombre}"] = (col, "count")
+
+    cubo = df.groupby(dims, observed=True).agg(**agregaciones).reset_index()
+    for dim in dims:
+        cubo[dim] = cubo[dim].cat.remove_unused_categories()
+    return cubo
+
+
+def _hay_pyarrow():
+    try:
+        import pyarrow  # noqa: F401
+        return True
+    except ImportError:
+        print("Aviso: 'pyarrow' no está instalado; no se construye el cubo. Corre: pip install pyarrow")
+        return False
+
+
+def construir_cubo(df_maestro, ruta=RUTA_CUBO):
+    """
+    Materializa el cuboide base (todas las dimensiones) del maestro: una fila
+    por combinación observada con n_facturas y, por cada medida, suma y conteo.
+    Cualquier rollup/slice/dice se responde agregando este cuboide, que es
+    mucho más pequeño que el maestro. Se guarda en Parquet (columnar).
+    """
+    if not _hay_pyarrow():
+        return None
+
+    cubo = _cuboide_base(df_maestro)
+    os.makedirs(os.path.dirname(ruta) or ".", exist_ok=True)
+    cubo.to_parquet(ruta, index=False)
+    print(f"Cubo guardado en: {ruta} ({len(cubo):,} celdas a partir de {len(df_maestro):,} facturas)")
+    return cubo
+
+
+def agregar_lote(df_lote, ruta=RUTA_CUBO, df_retirar=None):
+    """
+    Suma un lote nuevo de facturas al cubo persistido sin releer el maestro:
+    todas las medidas son aditivas, así que basta con reagregar las celdas.
+    'df_retirar' son filas del maestro que el lote reemplaza (la versión
+    anterior de facturas que se recalculan): su aporte se resta.
+    """
+    if not _hay_pyarrow():
+        return None
+    if not os.path.exists(ruta):
+        return construir_cubo(df_lote, ruta)
+
+    existente = pd.read_parquet(ruta)
+    dims = [d for d in DIMENSIONES if d in existente.columns]
+    medidas = [c for c in existente.columns if c not in dims]
+    partes = [existente, _cuboide_base(df_lote)]
+    if df_retirar is not None and len(df_retirar):
+        retirado = _cuboide_base(df_retirar)
+        restadas = retirado.columns.intersection(medidas)
+        retirado[restadas] = -retirado[restadas]
+        partes.append(retirado)
+    cubo = pd.concat([p.astype({d: "string" for d in dims}) for p in partes], ignore_index=True)
+    cubo = cubo.groupby(dims, sort=True)[medidas].sum().reset_index()
+    # Las celdas que solo tenían facturas retiradas desaparecen
+    cubo = cubo[cubo["n_facturas"] > 0].reset_index(drop=True)
+    cubo[dims] = cubo[dims].astype("category")
+    cubo.to_parquet(ruta, index=False)
+    print(f"Cubo actualizado en: {ruta} ({len(cubo):,} celdas, +{len(df_lote):,} facturas)")
+    return cubo
+
+
+# -----------------------------------------------------------------------------
+# 3. CONSULTAS
+# -----------------------------------------------------------------------------
+
+def cargar_cubo(ruta=RUTA_CUBO):
+    """Lee el cubo (cacheado en memoria mientras el archivo no cambie)."""
+    mtime = os.path.getmtime(ruta)
+    if _CACHE_CUBO.get(ruta, (None,))[0] != mtime:
+        _CACHE_CUBO[ruta] = (mtime, pd.read_parquet(ruta))
+    return _CACHE_CUBO[ruta][1]
+
+
+def consultar_cubo(por=(), filtros=None, ruta=RUTA_CUBO, cubo=None):
+    """
+    Slice/dice sobre el cubo: 'filtros' es {dimension: valor o lista de valores}
+    y 'por' la lista de dimensiones del resultado. Devuelve n_facturas, sumas,
+    conteos y promedios de cada medida.
+
+        consultar_cubo(por=["anio_factura", "destino_continente"], filtros={"genero": "Mujer"})
+    """
+    cubo = cubo if cubo is not None else cargar_cubo(ruta)
+    seleccion = cubo
+    for dim, valores in (filtros or {}).items():
+        if dim not in cubo.columns:
+            raise ValueError(f"Dimensión desconocida: '{dim}'.")
+        valores = valores if isinstance(valores, (list, tuple, set)) else [valores]
+        seleccion = seleccion[seleccion[dim].isin([str(v) for v in valores])]
+
+    medidas = [c for c in cubo.columns if c == "n_facturas" or c.startswith(("suma_", "n_"))]
+    por = list(por)
+    if por:
+        resultado = seleccion.groupby(por, observed=True)[medidas].sum().reset_index()
+    else:
+        resultado = seleccion[medidas].sum().to_frame().T
+
+    for nombre in MEDIDAS.values():
+        if f"suma_{nombre}" in resultado.columns:
+            resultado[f"prom_{nombre}"] = resultado[f"suma_{nombre}"] / resultado[f"n_{nombre}"].where(
+                resultado[f"n_{nombre}"] > 0
+            )
+    return resultado
+
+
+# -----------------------------------------------------------------------------
+# 4. EJECUCIÓN PRINCIPAL
+# -----------------------------------------------------------------------------
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Consultas slice/dice sobre el cubo de facturas.")
+    parser.add_argument("--por", nargs="*", default=[], help="Dimensiones del resultado.")
+    parser.add_argument("--filtro", action="append", default=[], help="dimension=valor (repetible).")
+    parser.add_argument("--ruta", default=RUTA_CUBO)
+    parser.add_argument("--construir", help="CSV del maestro a partir del cual construir el cubo.")
+    args = parser.parse_args()
+
+    if args.construir:
+        construir_cubo(pd.read_csv(args.construir, low_memory=False), args.ruta)
+
+    filtros = {}
+    for filtro in args.filtro:
+        dim, valor = filtro.split("=", 1)
+        filtros.setdefault(dim, []).append(valor)
+
+    pd.set_option("display.width", 200)
+    print(consultar_cubo(por=args.por, filtros=filtros, ruta=args.ruta))
@@ -0,0 +1,97 @@
+# cvu.py
+
+import argparse
+import os
+import runpy
+import sys
+
+# -----------------------------------------------------------------------------
+# Punto de entrada único del pipeline:
+#
+#   python -m cvu ingest [--clientes factura]
+#   python -m cvu enrich --procesos 4
+#   python -m cvu maestro --desde 2018
+#   python -m cvu eda --reporte
+#   python -m cvu cluster
+#   python -m cvu rules --particion destino_continente
+#   python -m cvu vecinos 240400069130 -k 5
+#
+# Este módulo solo importa la biblioteca estándar: pandas, sklearn,
+# matplotlib/seaborn, mlxtend y pycountry/geonamescache se cargan cuando el
+# script del subcomando se ejecuta, así que 'cvu --help' (o un error de
+# argumentos) responde al instante. Los argumentos que siguen al subcomando
+# se pasan tal cual al script, que los valida con su propio argparse
+# ('cvu eda --help' muestra la ayuda del EDA).
+# -----------------------------------------------------------------------------
+
+RAIZ = os.path.dirname(os.path.abspath(__file__))
+
+# subcomando: (script, alias en español, descripción)
+SUBCOMANDOS = {
+    "ingest": ("procesar_ventas_v2.py", ["ingesta"],
+               "Consolida, limpia y normaliza las exportaciones de datos_csv."),
+    "servicio": ("servicio_ingesta.py", [],
+                 "Servicio de ingesta por micro-lotes que vigila datos_csv."),
+    "enrich": ("enriquecer_datos.py", ["enriquecer"],
+               "Enriquece las tablas básicas con regiones y clasificación GEO."),
+    "maestro": ("build_dataset_maestro.py", [],
+                "Construye el dataset maestro a nivel factura."),
+    "eda": ("02_eda_facturas.py", [],
+            "EDA del dataset maestro de facturas."),
+    "cluster": ("03_kmeans_clustering.py", ["clustering"],
+                "Segmentación K-Means de las facturas."),
+    "rules": ("04_apriori_association.py", ["reglas"],
+              "Reglas de asociación sobre el dataset maestro."),
+    "vecinos": ("indice_vecinos.py", [],
+                "Facturas o clientes parecidos (índice de vecinos aproximados)."),
+}
+
+
+def crear_parser():
+    parser = argparse.ArgumentParser(
+        prog="cvu", description="Pipeline de analítica de ventas CVU.",
+        epilog="Los argumentos tras el subcomando se pasan a su script; usa 'cvu <subcomando> --help'.")
+    subparsers = parser.add_subparsers(dest="comando", metavar="<subcomando>")
+    for nombre, (_, alias, descripcion) in SUBCOMANDOS.items():
+        # Sin ayuda propia: --help y el resto de argumentos los procesa el script
+        subparsers.add_parser(nombre, aliases=alias, help=descripcion, add_help=False)
+    return parser
+
+
+def _nombre_canonico(comando):
+    for nombre, (_, alias, _) in SUBCOMANDOS.items():
+        if comando == nombre or comando in alias:
+            return nombre
+    return None
+
+
+def ejecutar(nombre, argumentos):
+    """
+    Ejecuta el script del subcomando como __main__ con 'argumentos' en sys.argv.
+    runpy instala el script como módulo __main__ mientras corre, así que los
+    pools de procesos que pasan funciones del script siguen funcionando.
+    """
+    script = os.path.join(RAIZ, SUBCOMANDOS[nombre][0])
+    if RAIZ not in sys.path:
+        sys.path.insert(0, RAIZ)
+    argv_original = sys.argv
+    sys.argv = [script] + list(argumentos)
+    try:
+        runpy.run_path(script, run_name="__main__")
+    finally:
+        sys.argv = argv_original
+
+
+def main(argv=None):
+    parser = crear_parser()
+    args, resto = parser.parse_known_args(argv)
+    nombre = _nombre_canonico(args.comando)
+    if nombre is None:
+        parser.print_help()
+        return 2
+    ejecutar(nombre, resto)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,9 +1,25 @@
-import pandas as pd
+import argparse
 import os
-import numpy as np
-import unicodedata
 import re
-import time # Para medir tiempo
+
+
+def crear_parser():
+    parser = argparse.ArgumentParser(description="Enriquece las tablas básicas con regiones y clasificación GEO.")
+    parser.add_argument("--procesos", type=int, default=None,
+                        help="Procesos para clasificar destinos (por defecto, uno por CPU; 1 = sin paralelismo).")
+    return parser
+
+
+if __name__ == "__main__":
+    # Los argumentos se leen antes de importar pandas y las librerías GEO: --help responde al instante
+    args = crear_parser().parse_args()
+
+import pandas as pd
+import numpy as np
+
+from particiones import escribir_particionado, fechas_por_clave
+from instrumentacion import etapa
+from indice_geo import normalize_geo_name, cargar_indice_geo
 
 # --- IMPORTANTE: Instalación de nuevas librerías ---
 # Este script necesita librerías GEO. Antes de ejecutar,
@@ -13,7 +29,7 @@ import time # Para medir tiempo
 # ----------------------------------------------------
 try:
     import pycountry
-    from geonamescache import GeonamesCache
+    import geonamescache  # noqa: F401  (indice_geo lo usa para construir el índice)
     print("Librerías 'pycountry' y 'geonamescache' importadas correctamente.")
 except ImportError:
     print("Error: Faltan librerías. Por favor, instala 'pycountry' y 'geonamescache'.")
@@ -55,71 +71,9 @@ MAPEO_REGIONES_COLOMBIA = {
 }
 
 # --- B. Clasificación Geográfica de Destinos (Mundial) ---
-print("Inicializando bases de datos geográficas (esto puede tardar unos segundos)...")
-start_time_geo_init = time.time()
-gc = GeonamesCache()
-CITIES = gc.get_cities()
-COUNTRIES = gc.get_countries()
-CONTINENTS = gc.get_continents()
-
-def normalize_geo_name(name):
-    """Convierte a mayúsculas, quita tildes y caracteres especiales para búsqueda."""
-    if pd.isna(name) or not isinstance(name, str) or name.strip() == '':
-        return None # Devolver None para nulos o vacíos
-    try:
-        # NFD separa tildes, encode/decode las quita
-        normalized = unicodedata.normalize('NFD', name.upper())
-        # Eliminar caracteres no alfanuméricos excepto espacios
-        normalized = re.sub(r'[^\w\s]', '', normalized)
-        # Reemplazar múltiples espacios con uno solo y quitar espacios al inicio/final
-        normalized = re.sub(r'\s+', ' ', normalized).strip()
-        # Manejar casos especiales que quedan después de normalizar
-        if normalized == 'BOGOTA D C': normalized = 'BOGOTA'
-        # Si después de limpiar queda vacío, retornar None
-        return normalized if normalized else None
-    except Exception:
-        return None # Retornar None si hay error en normalización
-
-# Crear diccionarios de búsqueda rápida (normalizados)
-CITIES_LOOKUP = {}
-for city_id, city_data in CITIES.items():
-    norm_name = normalize_geo_name(city_data.get('name', ''))
-    if norm_name: CITIES_LOOKUP[norm_name] = city_data
-    alt_names = city_data.get('alternatenames', [])
-    if isinstance(alt_names, list):
-        for alt in alt_names:
-            norm_alt = normalize_geo_name(alt)
-            # Solo añadir si no existe ya Y no es un número Y tiene más de 2 caracteres
-            if norm_alt and norm_alt not in CITIES_LOOKUP and not norm_alt.isdigit() and len(norm_alt) > 2:
-                CITIES_LOOKUP[norm_alt] = city_data
-
-COUNTRIES_LOOKUP = {}
-COUNTRY_ISO_LOOKUP = {}
-for country_code, country_data in COUNTRIES.items():
-    norm_name = normalize_geo_name(country_data.get('name', ''))
-    iso_code = country_data.get('iso')
-    if norm_name: COUNTRIES_LOOKUP[norm_name] = country_data
-    if iso_code: COUNTRY_ISO_LOOKUP[iso_code] = country_data.get('name')
-    try:
-        pyc_country = pycountry.countries.get(alpha_2=iso_code)
-        if pyc_country and hasattr(pyc_country, 'alpha_3'):
-            norm_a3 = normalize_geo_name(pyc_country.alpha_3)
-            if norm_a3 and norm_a3 not in COUNTRIES_LOOKUP:
-                COUNTRIES_LOOKUP[norm_a3] = country_data
-    except Exception: pass
-
-COUNTRIES_LOOKUP['ESTADOS UNIDOS'] = COUNTRIES_LOOKUP.get('UNITED STATES')
-COUNTRIES_LOOKUP['USA'] = COUNTRIES_LOOKUP.get('UNITED STATES')
-COUNTRIES_LOOKUP['EEUU'] = COUNTRIES_LOOKUP.get('UNITED STATES')
-COUNTRIES_LOOKUP['EEU'] = COUNTRIES_LOOKUP.get('UNITED STATES')
-COUNTRIES_LOOKUP['EESTADOS UNIDOS'] = COUNTRIES_LOOKUP.get('UNITED STATES')
-COUNTRIES_LOOKUP['REINO UNIDO'] = COUNTRIES_LOOKUP.get('UNITED KINGDOM')
-COUNTRIES_LOOKUP['UK'] = COUNTRIES_LOOKUP.get('UNITED KINGDOM')
-COUNTRIES_LOOKUP['PAISES BAJOS'] = COUNTRIES_LOOKUP.get('NETHERLANDS')
-COUNTRIES_LOOKUP['NUEVA ZELANDA'] = COUNTRIES_LOOKUP.get('NEW ZEALAND')
-COUNTRIES_LOOKUP['NEW ZELANDA'] = COUNTRIES_LOOKUP.get('NEW ZEALAND')
-
-print(f"Bases de datos GEO inicializadas en {time.time() - start_time_geo_init:.2f} segundos.")
+# Las bases geográficas (ciudades, países y continentes de geonamescache) se
+# consultan a través del índice compacto de indice_geo.py, que se carga la
+# primera vez que se clasifica un destino y queda en memoria para el proceso.
 
 # Formato: ('TIPO', 'Ciudad/Nombre Estandarizado', 'País Oficial', 'Continente Oficial')
 MAPEO_DESTINOS_MANUAL = {
@@ -733,35 +687,17 @@ def clasificar_destino(destino_limpio):
              ciudad = destino_limpio # Usar el nombre limpio original
         return (tipo, ciudad, pais, cont)
 
+    indice = cargar_indice_geo()
+
     # 4. Buscar en Ciudades (geonames) - Búsqueda exacta
-    if destino_limpio in CITIES_LOOKUP:
-        try:
-            city_data = CITIES_LOOKUP[destino_limpio]
-            country_code = city_data.get('countrycode')
-            if country_code and country_code in COUNTRIES:
-                country_data = COUNTRIES[country_code]
-                continent_code = country_data.get('continentcode')
-                if continent_code and continent_code in CONTINENTS:
-                    continent = CONTINENTS[continent_code]['name']
-                    ciudad_oficial = city_data.get('name')
-                    pais_oficial = country_data.get('name')
-                    if ciudad_oficial and pais_oficial:
-                        return ('CIUDAD', ciudad_oficial, pais_oficial, continent)
-        except Exception as e:
-            print(f"Warning: Error procesando ciudad '{destino_limpio}' en geonames: {e}")
+    resultado = indice.ciudad(destino_limpio)
+    if resultado is not None:
+        return resultado
 
     # 5. Buscar en Países (geonames) - Búsqueda exacta
-    if destino_limpio in COUNTRIES_LOOKUP:
-        try:
-            country_data = COUNTRIES_LOOKUP[destino_limpio]
-            continent_code = country_data.get('continentcode')
-            if continent_code and continent_code in CONTINENTS:
-                continent = CONTINENTS[continent_code]['name']
-                pais_oficial = country_data.get('name')
-                if pais_oficial:
-                    return ('PAIS', None, pais_oficial, continent)
-        except Exception as e:
-            print(f"Warning: Error procesando país '{destino_limpio}' en geonames: {e}")
+    resultado = indice.pais(destino_limpio)
+    if resultado is not None:
+        return resultado
 
     # 6. Buscar en Países (pycountry) - Búsqueda fuzzy
     try:
@@ -769,87 +705,150 @@ def clasificar_destino(destino_limpio):
         if paises_encontrados:
             pais_pyc = paises_encontrados[0]
             if hasattr(pais_pyc, 'alpha_2'):
-                country_data = COUNTRIES.get(pais_pyc.alpha_2)
-                if country_data:
-                    continent_code = country_data.get('continentcode')
-                    if continent_code and continent_code in CONTINENTS:
-                         continent = CONTINENTS[continent_code]['name']
-                         pais_oficial = country_data.get('name', pais_pyc.name)
-                         if pais_oficial:
-                             return ('PAIS', None, pais_oficial, continent)
+                resultado = indice.pais_por_codigo(pais_pyc.alpha_2)
+                if resultado is not None:
+                    return resultado
     except Exception: pass
 
     # 7. Si después de todo no se encontró, marcar como 'NO CLASIFICADO'
     print(f"Info: Destino '{destino_limpio}' no encontrado, marcado como NO CLASIFICADO.")
     return ('NO CLASIFICADO', destino_limpio, None, None) # Usar nombre limpio original
 
+COLUMNAS_GEO = ['destino_tipo', 'destino_ciudad', 'destino_pais', 'destino_continente']
+
+def enriquecer_clientes(df_clientes):
+    """Añade 'region_colombia' a partir de 'zonas_ciudades_cli'."""
+    # Aplicar limpieza primero, devuelve None para nulos/vacíos
+    zona_busqueda = df_clientes['zonas_ciudades_cli'].apply(limpiar_texto_geo)
+    # Mapear, los None se quedarán como NaN (Nulo en CSV)
+    df_clientes = df_clientes.copy()
+    df_clientes['region_colombia'] = zona_busqueda.map(MAPEO_REGIONES_COLOMBIA)
+    return df_clientes
+
+# A partir de cuántos destinos nuevos se reparte la clasificación entre procesos
+UMBRAL_PARALELO = 2000
+
+def _procesos_por_defecto():
+    return os.cpu_count() or 1
+
+def _clasificar_en_paralelo(pendientes, procesos):
+    """
+    Clasifica 'pendientes' en un pool de procesos y devuelve los resultados en
+    el mismo orden. El índice GEO y la base de pycountry se cargan antes de
+    crear el pool: con 'fork' los procesos hijos los heredan (copy-on-write)
+    en lugar de reconstruirlos; con 'forkserver'/'spawn' cada hijo los lee de
+    la caché en disco. Si el proceso tiene otros hilos (p. ej. el servicio de
+    ingesta) no se usa 'fork': el hijo heredaría locks tomados por esos hilos
+    (el de stdout, entre otros) y podría bloquearse.
+    """
+    import multiprocessing
+    import threading
+
+    cargar_indice_geo()
+    len(pycountry.countries)  # Fuerza la carga perezosa de la base de pycountry
+    disponibles = multiprocessing.get_all_start_methods()
+    if threading.active_count() > 1:
+        metodo = 'forkserver' if 'forkserver' in disponibles else 'spawn'
+    else:
+        metodo = 'fork' if 'fork' in disponibles else None
+    contexto = multiprocessing.get_context(metodo)
+    tamano_tarea = max(1, min(500, len(pendientes) // (procesos * 8)))
+    with contexto.Pool(procesos) as pool:
+        resultados = pool.imap(clasificar_destino, pendientes, chunksize=tamano_tarea)
+        try:
+            from tqdm import tqdm
+            resultados = tqdm(resultados, total=len(pendientes), desc=f"Clasificando GEO ({procesos} procesos)")
+        except ImportError:
+            pass
+        # imap conserva el orden de entrada: la unión de resultados es determinista
+        return list(resultados)
+
+def clasificar_destinos(destinos, cache=None, procesos=None):
+    """
+    Clasifica una serie de destinos crudos y devuelve un DataFrame con
+    COLUMNAS_GEO (mismo índice). Cada destino distinto se clasifica una sola
+    vez; 'cache' (dict destino_limpio -> tupla) permite reutilizar las
+    clasificaciones entre llamadas, p. ej. entre lotes del servicio de ingesta.
+    Con al menos UMBRAL_PARALELO destinos nuevos y procesos > 1 la clasificación
+    se reparte entre 'procesos' procesos (por defecto, uno por CPU).
+    """
+    cache = {} if cache is None else cache
+    procesos = _procesos_por_defecto() if procesos is None else max(1, int(procesos))
+    # Aplicar limpieza primero, devuelve None para nulos/vacíos
+    destino_busqueda = destinos.apply(limpiar_texto_geo)
+    pendientes = [d for d in destino_busqueda.dropna().unique() if d not in cache]
+
+    # Aplicar la clasificación GEO solo a los destinos aún no vistos
+    print(f"Clasificando destinos ({len(pendientes)} nuevos de {destino_busqueda.nunique()} distintos)...")
+    if procesos > 1 and len(pendientes) >= UMBRAL_PARALELO:
+        cache.update(zip(pendientes, _clasificar_en_paralelo(pendientes, procesos)))
+    elif pendientes:
+        cargar_indice_geo()
+        try:
+            from tqdm import tqdm
+            iterador = tqdm(pendientes, desc="Clasificando GEO")
+        except ImportError:
+            print("(Instala 'tqdm' con 'pip install tqdm' para ver una barra de progreso)")
+            iterador = pendientes
+        for destino in iterador:
+            cache[destino] = clasificar_destino(destino)
+
+    vacio = (None, None, None, None)
+    resultados_geo = [cache[d] if isinstance(d, str) else vacio for d in destino_busqueda]
+    return pd.DataFrame(resultados_geo, index=destinos.index, columns=COLUMNAS_GEO)
+
+def enriquecer_facturas(df_facturas, cache=None, procesos=None):
+    """Añade las columnas GEO del destino, manteniendo la columna original 'ciudad_destino'."""
+    df_geo = clasificar_destinos(df_facturas['ciudad_destino'], cache, procesos)
+    return pd.concat([df_facturas.reset_index(drop=True), df_geo.reset_index(drop=True)], axis=1)
+
 # ... (función enriquecer_datos sin cambios) ...
-def enriquecer_datos(carpeta_entrada, carpeta_salida):
+def enriquecer_datos(carpeta_entrada, carpeta_salida, procesos=None):
     """
     Función principal para leer los 3 CSV BÁSICOS, enriquecerlos,
-    y guardarlos en la carpeta final.
+    y guardarlos en la carpeta final. 'procesos' limita los procesos de la
+    clasificación GEO (por defecto, uno por CPU).
     """
     print(f"Iniciando Script 2: Leyendo archivos básicos de: '{carpeta_entrada}'")
-    start_script_time = time.time()
+    etapa_total = etapa("enriquecer_datos")
 
     # --- 1. Cargar archivos BÁSICOS ---
     try:
-        df_clientes = pd.read_csv(os.path.join(carpeta_entrada, 'clientes.csv'), low_memory=False)
-        df_facturas = pd.read_csv(os.path.join(carpeta_entrada, 'facturas.csv'), low_memory=False)
-        df_proveedores = pd.read_csv(os.path.join(carpeta_entrada, 'proveedores_por_factura.csv'), low_memory=False)
+        with etapa("cargar_basicos") as e:
+            df_clientes = pd.read_csv(os.path.join(carpeta_entrada, 'clientes.csv'), low_memory=False)
+            df_facturas = pd.read_csv(os.path.join(carpeta_entrada, 'facturas.csv'), low_memory=False)
+            df_proveedores = pd.read_csv(os.path.join(carpeta_entrada, 'proveedores_por_factura.csv'), low_memory=False)
+            e.filas(salida=len(df_clientes) + len(df_facturas) + len(df_proveedores))
         print(f"Archivos básicos cargados: {len(df_clientes)} clientes, {len(df_facturas)} facturas.")
     except FileNotFoundError:
         print(f"Error CRÍTICO: No se encontraron los 3 archivos CSV básicos en '{carpeta_entrada}'.")
         print("Asegúrate de haber ejecutado primero el script 'crear_tablas_basicas.py'.")
+        etapa_total.terminar()
         return
     except Exception as e:
         print(f"Error CRÍTICO al leer los archivos CSV de entrada: {e}")
+        etapa_total.terminar()
         return
 
     # --- 2. Enriquecer CLIENTES (Regiones de Colombia) ---
     print("Enriqueciendo CLIENTES con Regiones de Colombia...")
-    # Aplicar limpieza primero, devuelve None para nulos/vacíos
-    df_clientes['zona_busqueda'] = df_clientes['zonas_ciudades_cli'].apply(limpiar_texto_geo)
-    # Mapear, los None se quedarán como NaN (Nulo en CSV)
-    df_clientes['region_colombia'] = df_clientes['zona_busqueda'].map(MAPEO_REGIONES_COLOMBIA)
-    # Si algún valor mapeado es 'DESCONOCIDA', convertirlo a None también (ya está manejado en el dict con None)
-    # df_clientes['region_colombia'] = df_clientes['region_colombia'].replace('DESCONOCIDA', None) #Redundante
-    df_clientes = df_clientes.drop(columns=['zona_busqueda'])
+    with etapa("enriquecer_clientes", filas_entrada=len(df_clientes)) as e:
+        df_clientes = enriquecer_clientes(df_clientes)
+        e.filas(salida=len(df_clientes))
     print("Clientes enriquecidos.")
 
     # --- 3. Enriquecer FACTURAS (Geo-destinos) ---
     print("Enriqueciendo FACTURAS con clasificación GEO (esto puede tomar varios minutos)...")
-    start_time_clasif = time.time()
-    # Aplicar limpieza primero, devuelve None para nulos/vacíos
-    df_facturas['destino_busqueda'] = df_facturas['ciudad_destino'].apply(limpiar_texto_geo)
-
-    # Aplicar la clasificación GEO (manejará los None de 'destino_busqueda')
-    print("Clasificando destinos...")
-    try:
-        from tqdm import tqdm
-        tqdm.pandas(desc="Clasificando GEO")
-        resultados_geo = df_facturas['destino_busqueda'].progress_apply(clasificar_destino)
-    except ImportError:
-        print("(Instala 'tqdm' con 'pip install tqdm' para ver una barra de progreso)")
-        resultados_geo = df_facturas['destino_busqueda'].apply(clasificar_destino)
-
-    # Convertir resultados (tuplas) a DataFrame
-    df_geo = pd.DataFrame(resultados_geo.tolist(),
-                          index=df_facturas.index,
-                          columns=['destino_tipo', 'destino_ciudad', 'destino_pais', 'destino_continente'])
-
-    # Unir las nuevas columnas GEO. Mantener la columna original 'ciudad_destino'.
-    df_facturas.reset_index(drop=True, inplace=True)
-    df_geo.reset_index(drop=True, inplace=True)
-    df_facturas_enriquecido = pd.concat([df_facturas, df_geo], axis=1)
-
-    # Eliminar columna temporal
-    df_facturas_enriquecido = df_facturas_enriquecido.drop(columns=['destino_busqueda'])
-    print(f"Facturas enriquecidas en {time.time() - start_time_clasif:.2f} segundos.")
+    etapa_clasif = etapa("clasificar_destinos", filas_entrada=len(df_facturas))
+    df_facturas_enriquecido = enriquecer_facturas(df_facturas, procesos=procesos)
+    etapa_clasif.terminar(filas_salida=len(df_facturas_enriquecido))
+    print(f"Facturas enriquecidas en {etapa_clasif.metricas['reloj_s']:.2f} segundos.")
 
     # --- 4. Guardar archivos FINALES ---
     os.makedirs(carpeta_salida, exist_ok=True)
     print(f"\nGuardando archivos finales enriquecidos en: '{carpeta_salida}'")
+    etapa_guardar = etapa("guardar_enriquecidos",
+                          filas_entrada=len(df_clientes) + len(df_facturas_enriquecido) + len(df_proveedores))
     try:
         # Renombrar archivos de salida para claridad
         ruta_clientes_out = os.path.join(carpeta_salida, 'clientes_enriquecido.csv')
@@ -862,6 +861,13 @@ def enriquecer_datos(carpeta_entrada, carpeta_salida):
         ruta_proveedores_out = os.path.join(carpeta_salida, 'proveedores_por_factura_enriquecido.csv')
         df_proveedores.to_csv(ruta_proveedores_out, index=False, encoding='utf-8-sig')
 
+        # Copia particionada por año/mes de factura para lecturas por rango de fechas
+        escribir_particionado(df_clientes, os.path.join(carpeta_salida, 'clientes_enriquecido'),
+                              fechas_por_clave(df_clientes, df_facturas_enriquecido, 'id_cliente'))
+        escribir_particionado(df_facturas_enriquecido, os.path.join(carpeta_salida, 'facturas_enriquecido'))
+        escribir_particionado(df_proveedores, os.path.join(carpeta_salida, 'proveedores_por_factura_enriquecido'),
+                              fechas_por_clave(df_proveedores, df_facturas_enriquecido, 'no_factura'))
+
         print(f"¡Archivos finales guardados con éxito en '{carpeta_salida}'!")
         print(f" - {os.path.basename(ruta_clientes_out)}")
         print(f" - {os.path.basename(ruta_facturas_out)}")
@@ -869,8 +875,10 @@ def enriquecer_datos(carpeta_entrada, carpeta_salida):
 
     except Exception as e:
         print(f"Error CRÍTICO al guardar los archivos CSV finales: {e}")
+    etapa_guardar.terminar()
 
-    print(f"\nTiempo total Script 2: {time.time() - start_script_time:.2f} segundos.")
+    etapa_total.terminar()
+    print(f"\nTiempo total Script 2: {etapa_total.metricas['reloj_s']:.2f} segundos.")
 
 
 # -----------------------------------------------------------------------------
@@ -879,7 +887,7 @@ def enriquecer_datos(carpeta_entrada, carpeta_salida):
 if __name__ == "__main__":
     CARPETA_DATOS_ENTRADA = 'datos_limpios' # Lee de la salida del Script 1
     CARPETA_DATOS_SALIDA = 'datos_enriquecidos' # Carpeta final con datos mejorados
-    enriquecer_datos(CARPETA_DATOS_ENTRADA, CARPETA_DATOS_SALIDA)
+    enriquecer_datos(CARPETA_DATOS_ENTRADA, CARPETA_DATOS_SALIDA, args.procesos)
     print("\n" + "="*30 + "\n¡SCRIPT 2 (Enriquecimiento) COMPLETADO!\n" +
           f"Tus 3 archivos CSV finales están en: '{CARPETA_DATOS_SALIDA}'\n" +
           "¡Este es el final del proceso!\n" + "="*30)
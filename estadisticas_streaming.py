@@ -0,0 +1,278 @@
+# estadisticas_streaming.py
+
+import numpy as np
+import pandas as pd
+
+from sketches import SketchKLL, SpaceSaving
+
+# -----------------------------------------------------------------------------
+# 1. DEFINICIONES
+# -----------------------------------------------------------------------------
+
+# Columnas categóricas de las que se guardan frecuencias (top-k)
+COLUMNAS_FRECUENCIA = [
+    "genero", "estado_civil", "rango_edades", "region_colombia",
+    "destino_ciudad", "destino_continente", "proveedor_principal", "es_internacional",
+]
+
+# Columnas numéricas para la matriz de correlación
+COLUMNAS_CORRELACION = [
+    "vlr_total_neto_factura",
+    "vlr_total_item_factura",
+    "vlr_total_neto_item_factura",
+    "suma_vlr_presupuesto_ppto",
+    "prom_vlr_presupuesto_ppto",
+    "n_proveedores",
+]
+
+CUANTILES_DESCRIBE = [0.25, 0.5, 0.75]
+
+
+# -----------------------------------------------------------------------------
+# 2. ACUMULADORES
+# -----------------------------------------------------------------------------
+
+class Momentos:
+    """Conteo, media y M2 (Welford/Chan), mínimo y máximo de una columna, combinables."""
+
+    def __init__(self):
+        self.n = 0
+        self.media = 0.0
+        self.m2 = 0.0
+        self.minimo = np.nan
+        self.maximo = np.nan
+
+    def _unir(self, n, media, m2, minimo, maximo):
+        if n == 0:
+            return
+        total = self.n + n
+        delta = media - self.media
+        self.media += delta * n / total
+        self.m2 += m2 + delta * delta * self.n * n / total
+        self.n = total
+        self.minimo = np.fmin(self.minimo, minimo)
+        self.maximo = np.fmax(self.maximo, maximo)
+
+    def actualizar(self, valores):
+        valores = valores[~np.isnan(valores)]
+        if len(valores):
+            media = valores.mean()
+            self._unir(len(valores), media, ((valores - media) ** 2).sum(), valores.min(), valores.max())
+
+    def combinar(self, otro):
+        self._unir(otro.n, otro.media, otro.m2, otro.minimo, otro.maximo)
+        return self
+
+    @property
+    def std(self):
+        return np.sqrt(self.m2 / (self.n - 1)) if self.n > 1 else np.nan
+
+
+class CoMomentos:
+    """
+    Co-momentos por pares de columnas con observaciones completas por pares
+    (igual que DataFrame.corr): para cada par (i, j) se guardan n, medias, M2
+    y el co-momento C, y se combinan entre lotes con la fórmula de Chan.
+    """
+
+    def __init__(self, columnas):
+        k = len(columnas)
+        self.columnas = list(columnas)
+        self.n = np.zeros((k, k))
+        self.mx = np.zeros((k, k))
+        self.m2x = np.zeros((k, k))
+        self.c = np.zeros((k, k))
+
+    def _unir(self, n, mx, m2x, c):
+        total = self.n + n
+        with np.errstate(divide='ignore', invalid='ignore'):
+            peso = np.where(total > 0, n / total, 0.0)
+            factor = np.where(total > 0, self.n * n / total, 0.0)
+        dx = mx - self.mx
+        dy = dx.T
+        self.mx = self.mx + dx * peso
+        self.m2x = self.m2x + m2x + dx * dx * factor
+        self.c = self.c + c + dx * dy * factor
+        self.n = total
+
+    def actualizar(self, df):
+        x = df.reindex(columns=self.columnas).apply(pd.to_numeric, errors='coerce').to_numpy(dtype=float)
+        m = (~np.isnan(x)).astype(float)
+        x = np.nan_to_num(x)
+        n = m.T @ m
+        sx = x.T @ m            # sx[i, j] = suma de x_i donde i y j son no nulos
+        sxx = (x * x).T @ m
+        sxy = x.T @ x
+        with np.errstate(divide='ignore', invalid='ignore'):
+            mx = np.where(n > 0, sx / n, 0.0)
+        m2x = sxx - sx * mx
+        c = sxy - sx * mx.T
+        self._unir(n, mx, m2x, c)
+
+    def combinar(self, otro):
+        self._unir(otro.n, otro.mx, otro.m2x, otro.c)
+        return self
+
+    def corr(self):
+        with np.errstate(divide='ignore', invalid='ignore'):
+            corr = self.c / np.sqrt(self.m2x * self.m2x.T)
+        corr[self.n < 2] = np.nan
+        return pd.DataFrame(corr, index=self.columnas, columns=self.columnas)
+
+
+# -----------------------------------------------------------------------------
+# 3. RESUMEN EN UNA PASADA
+# -----------------------------------------------------------------------------
+
+class ResumenStreaming:
+    """
+    Estadísticas del EDA calculadas en una sola pasada por lotes y combinables
+    entre archivos: conteos y nulos, media/varianza (Welford), mín/máx,
+    cuantiles aproximados (KLL), top-k (Space-Saving) y co-momentos para la
+    correlación. El tipo de cada columna se decide en el primer lote; en los
+    siguientes las columnas numéricas se convierten con pd.to_numeric.
+    """
+
+    def __init__(self, columnas_frecuencia=COLUMNAS_FRECUENCIA, columnas_correlacion=COLUMNAS_CORRELACION,
+                 cuantiles_por_grupo=(), capacidad_top=1000, k_cuantiles=200):
+        self.columnas_frecuencia = list(columnas_frecuencia)
+        self.cuantiles_por_grupo = list(cuantiles_por_grupo)
+        self.capacidad_top = capacidad_top
+        self.k_cuantiles = k_cuantiles
+        self.n_filas = 0
+        self.columnas = []
+        self.dtypes = {}
+        self.no_nulos = {}
+        self.momentos = {}
+        self.kll = {}
+        self.frecuencias = {}
+        self.grupos = {par: {} for par in self.cuantiles_por_grupo}
+        self.comomentos = CoMomentos(columnas_correlacion)
+
+    def _numerica(self, col):
+        return self.dtypes[col].kind in 'biuf'
+
+    def actualizar(self, chunk):
+        """Incorpora un lote (DataFrame) al resumen."""
+        for col in chunk.columns:
+            if col not in self.dtypes:
+                self.columnas.append(col)
+                self.dtypes[col] = chunk[col].dtype
+                self.no_nulos[col] = 0
+                if self._numerica(col):
+                    self.momentos[col] = Momentos()
+                    self.kll[col] = SketchKLL(k=self.k_cuantiles)
+
+        self.n_filas += len(chunk)
+        for col in chunk.columns:
+            serie = chunk[col]
+            if self._numerica(col):
+                if serie.dtype.kind not in 'biuf':
+                    serie = pd.to_numeric(serie, errors='coerce')
+                self.dtypes[col] = np.result_type(self.dtypes[col], serie.dtype)
+                valores = serie.to_numpy(dtype=float)
+                self.momentos[col].actualizar(valores)
+                self.kll[col].actualizar(valores)
+            self.no_nulos[col] += int(serie.notna().sum())
+
+        for col in self.columnas_frecuencia:
+            if col in chunk.columns:
+                self.frecuencias.setdefault(col, SpaceSaving(self.capacidad_top)).actualizar(chunk[col])
+
+        for grupo, valor in self.cuantiles_por_grupo:
+            if grupo in chunk.columns and valor in chunk.columns:
+                valores = pd.to_numeric(chunk[valor], errors='coerce')
+                sketches = self.grupos[(grupo, valor)]
+                for g, sub in valores.groupby(chunk[grupo], sort=False):
+                    sketches.setdefault(g, SketchKLL(k=self.k_cuantiles)).actualizar(sub.to_numpy(dtype=float))
+
+        self.comomentos.actualizar(chunk)
+        return self
+
+    def combinar(self, otro):
+        """Une el resumen de otro archivo/lote a este (in-place)."""
+        for col in otro.columnas:
+            if col not in self.dtypes:
+                self.columnas.append(col)
+                self.dtypes[col] = otro.dtypes[col]
+                self.no_nulos[col] = 0
+                if col in otro.momentos:
+                    self.momentos[col] = Momentos()
+                    self.kll[col] = SketchKLL(k=self.k_cuantiles)
+            else:
+                self.dtypes[col] = np.result_type(self.dtypes[col], otro.dtypes[col])
+            self.no_nulos[col] += otro.no_nulos[col]
+            if col in otro.momentos and col in self.momentos:
+                self.momentos[col].combinar(otro.momentos[col])
+                self.kll[col].combinar(otro.kll[col])
+        for col, sketch in otro.frecuencias.items():
+            self.frecuencias.setdefault(col, SpaceSaving(self.capacidad_top)).combinar(sketch)
+        for par, sketches in otro.grupos.items():
+            destino = self.grupos.setdefault(par, {})
+            for g, sketch in sketches.items():
+                destino.setdefault(g, SketchKLL(k=self.k_cuantiles)).combinar(sketch)
+        self.comomentos.combinar(otro.comomentos)
+        self.n_filas += otro.n_filas
+        return self
+
+    # --- Salidas con el mismo formato que las impresiones del EDA ---
+
+    def info(self):
+        """Equivalente a df.info(): no nulos y dtype por columna."""
+        return pd.DataFrame({
+            "Non-Null Count": pd.Series(self.no_nulos)[self.columnas],
+            "Dtype": pd.Series({c: str(self.dtypes[c]) for c in self.columnas})[self.columnas],
+        })
+
+    def describe(self):
+        """Equivalente a df.select_dtypes(include=[np.number]).describe().T"""
+        filas = {}
+        for col, mom in self.momentos.items():
+            q = self.kll[col].cuantiles(CUANTILES_DESCRIBE)
+            filas[col] = {
+                "count": float(mom.n), "mean": mom.media if mom.n else np.nan, "std": mom.std,
+                "min": mom.minimo, "25%": q[0], "50%": q[1], "75%": q[2], "max": mom.maximo,
+            }
+        return pd.DataFrame.from_dict(filas, orient="index")
+
+    def nulos_pct(self):
+        """Equivalente a (df.isna().mean() * 100).round(2).sort_values(ascending=False)"""
+        no_nulos = pd.Series(self.no_nulos, dtype=float)[self.columnas]
+        return ((1 - no_nulos / self.n_filas) * 100).round(2).sort_values(ascending=False)
+
+    def value_counts(self, col, n=None, dropna=True):
+        """Equivalente a df[col].value_counts(dropna=...).head(n) (exacto si hay < capacidad_top valores)."""
+        conteos = self.frecuencias[col].top(n if n is not None else self.capacidad_top).rename("count")
+        conteos.index.name = col
+        if not dropna:
+            nulos = self.n_filas - self.no_nulos.get(col, 0)
+            if nulos:
+                conteos = pd.concat([conteos, pd.Series({np.nan: nulos}, name="count")])
+                conteos = conteos.sort_values(ascending=False, kind="stable")
+                conteos.index.name = col
+        return conteos
+
+    def media(self, col):
+        return self.momentos[col].media
+
+    def corr(self):
+        """Equivalente a df[columnas_correlacion].corr()"""
+        return self.comomentos.corr()
+
+    def cuantiles_grupo(self, grupo, valor, qs):
+        """Cuantiles aproximados de 'valor' para cada valor de 'grupo'."""
+        sketches = self.grupos[(grupo, valor)]
+        filas = {g: s.cuantiles(qs) for g, s in sketches.items() if s.n}
+        return pd.DataFrame.from_dict(filas, orient="index", columns=list(qs)).sort_index()
+
+
+def resumir_csv(ruta, chunksize=100_000, **kwargs):
+    """
+    Recorre el CSV (o la lista de CSV, p. ej. particiones) por lotes una sola
+    vez y devuelve su ResumenStreaming.
+    """
+    resumen = ResumenStreaming(**kwargs)
+    for r in ([ruta] if isinstance(ruta, str) else ruta):
+        for chunk in pd.read_csv(r, chunksize=chunksize, low_memory=False):
+            resumen.actualizar(chunk)
+    return resumen
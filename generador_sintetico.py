@@ -0,0 +1,229 @@
+# generador_sintetico.py
+
+import argparse
+import glob
+import os
+
+import numpy as np
+import pandas as pd
+
+# -----------------------------------------------------------------------------
+# Generador de exportaciones sintéticas "Reporte_de_Ventas_VC_PorProveedor"
+# con la misma cabecera y distribuciones que la muestra real (datos_csv/):
+# destinos y proveedores con frecuencias de Zipf, facturas con varios ítems y
+# proveedores, nulos como cadenas vacías y atributos de cliente vacíos en
+# bloque. Escribe por lotes, así que escala de 10k a decenas de millones de filas.
+# -----------------------------------------------------------------------------
+
+# Cabecera exacta de la exportación (mismo orden)
+ENCABEZADO = [
+    "Año Factura", "Valor Cvu A Vc", "Valor Cvu A Gnc", "Estado Civil", "Pais Residencia",
+    "Cant Polizas", "Rango Edades", "Genero", "Rango Vlr Anticipos Polizas",
+    "Rango Vlr Disponible Polizas", "Empresa Cvu Cv", "Anio Mes Compro 1ra Poliza",
+    "Zonas Ciudades Cli", "Fecha Factura", "Ciudad Origen", "Ciudad Destino", "Nombre Proveedor",
+    "Valor Presupuesto Servicios Ppto", "No. Factura", "Mes Nombre Factura",
+    "Nombre Asesor Servicios Ppto", "Cod Tipos Servicio", "Nombre Director",
+    "Valor Total Neto Factura", "Valor Base Comisionable", "Mes Factura",
+    "Valor Total Item Factura", "Valor Total Neto Item Factura",
+]
+
+# Atributos del cliente: constantes dentro de una factura y vacíos en bloque
+COLUMNAS_CLIENTE = [
+    "Valor Cvu A Vc", "Valor Cvu A Gnc", "Estado Civil", "Pais Residencia", "Cant Polizas",
+    "Rango Edades", "Genero", "Rango Vlr Anticipos Polizas", "Rango Vlr Disponible Polizas",
+    "Empresa Cvu Cv", "Anio Mes Compro 1ra Poliza", "Zonas Ciudades Cli",
+    "Valor Presupuesto Servicios Ppto", "Nombre Asesor Servicios Ppto", "Nombre Director",
+]
+# Columnas de factura (una vez por factura)
+COLUMNAS_FACTURA = ["Ciudad Origen", "Ciudad Destino", "Valor Total Neto Factura"]
+# Columnas de ítem (una por fila)
+COLUMNAS_ITEM = ["Nombre Proveedor", "Cod Tipos Servicio"]
+# Columnas con frecuencias de Zipf sobre el ranking observado en la muestra
+COLUMNAS_ZIPF = ["Ciudad Destino", "Nombre Proveedor"]
+
+MESES = ["Enero", "Febrero", "Marzo", "Abril", "Mayo", "Junio", "Julio", "Agosto",
+         "Septiembre", "Octubre", "Noviembre", "Diciembre"]
+
+CARPETA_MUESTRA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "datos_csv")
+PREFIJO_ARCHIVO = "PM_VC02_Reporte_de_Ventas_VC_PorProveedor"
+EXPONENTE_ZIPF = 1.1
+TAMANO_LOTE = 500_000
+
+
+# -----------------------------------------------------------------------------
+# 1. PERFIL DE LA MUESTRA
+# -----------------------------------------------------------------------------
+
+def perfilar_muestra(carpeta=CARPETA_MUESTRA):
+    """
+    Distribuciones empíricas de la exportación real: por columna, valores no
+    vacíos con su probabilidad y proporción de vacíos; ítems por factura y
+    relación entre valor bruto y neto del ítem.
+    """
+    archivos = sorted(glob.glob(os.path.join(carpeta, "*.csv")))
+    if not archivos:
+        raise FileNotFoundError(f"No hay exportaciones de muestra en '{carpeta}' para perfilar.")
+    df = pd.concat([pd.read_csv(a, dtype=str, keep_default_na=False) for a in archivos], ignore_index=True)
+    faltantes = [c for c in ENCABEZADO if c not in df.columns]
+    if faltantes:
+        raise ValueError(f"La muestra no tiene la cabecera esperada; faltan: {faltantes}")
+
+    # Las columnas de cliente y factura se perfilan a nivel factura; los
+    # atributos de cliente, solo sobre los clientes identificados (los vacíos
+    # en bloque se generan aparte con p_cliente_vacio)
+    facturas = df.drop_duplicates(subset=["No. Factura"])
+    bloque = (facturas[["Estado Civil", "Genero", "Rango Edades"]].apply(lambda s: s.str.strip()) == "").all(axis=1)
+    perfil = {"columnas": {}, "p_cliente_vacio": float(bloque.mean())}
+    for col in COLUMNAS_CLIENTE + COLUMNAS_FACTURA + COLUMNAS_ITEM:
+        if col in COLUMNAS_ITEM:
+            serie = df[col].str.strip()
+        elif col in COLUMNAS_CLIENTE and col != "Empresa Cvu Cv":
+            serie = facturas.loc[~bloque, col].str.strip()
+        else:
+            serie = facturas[col].str.strip()
+        conteos = serie[serie != ""].value_counts()
+        perfil["columnas"][col] = {
+            "valores": conteos.index.to_numpy(dtype=object),
+            "probs": (conteos / conteos.sum()).to_numpy() if len(conteos) else np.empty(0),
+            "p_vacio": float((serie == "").mean()),
+        }
+
+    perfil["items_por_factura"] = df.groupby("No. Factura").size().value_counts(normalize=True).sort_index()
+
+    bruto = pd.to_numeric(df["Valor Total Item Factura"], errors="coerce")
+    neto = pd.to_numeric(df["Valor Total Neto Item Factura"], errors="coerce")
+    validos = (bruto > 0) & (neto > 0)
+    perfil["log_bruto"] = (float(np.log(bruto[validos]).mean()), float(np.log(bruto[validos]).std()))
+    perfil["p_con_iva"] = float((bruto[validos] > neto[validos]).mean())
+    base = pd.to_numeric(df["Valor Base Comisionable"], errors="coerce")
+    perfil["p_base_cero"] = float((base == 0).mean())
+    return perfil
+
+
+# -----------------------------------------------------------------------------
+# 2. MUESTREO
+# -----------------------------------------------------------------------------
+
+def _probs_zipf(n, exponente=EXPONENTE_ZIPF):
+    pesos = 1.0 / np.arange(1, n + 1) ** exponente
+    return pesos / pesos.sum()
+
+
+def _muestrear(rng, perfil_col, n, zipf=False):
+    """Valores de una columna (cadenas vacías incluidas) según su perfil."""
+    valores, probs = perfil_col["valores"], perfil_col["probs"]
+    salida = np.full(n, "", dtype=object)
+    if len(valores) == 0:
+        return salida
+    if zipf:
+        probs = _probs_zipf(len(valores))
+    llenos = rng.random(n) >= perfil_col["p_vacio"]
+    salida[llenos] = valores[rng.choice(len(valores), size=int(llenos.sum()), p=probs)]
+    return salida
+
+
+def generar_lote(perfil, n_filas, anio, primera_factura, rng):
+    """
+    Genera un DataFrame de 'n_filas' ítems (todas columnas texto, como la
+    exportación) para facturas numeradas desde 'primera_factura'.
+    Devuelve (df, número de facturas generadas).
+    """
+    tamanos, probs = perfil["items_por_factura"].index.to_numpy(), perfil["items_por_factura"].to_numpy()
+    n_facturas = int(np.ceil(n_filas / float((tamanos * probs).sum()))) + 1
+    items = rng.choice(tamanos, size=n_facturas, p=probs)
+    while items.sum() < n_filas:
+        items = np.append(items, rng.choice(tamanos, size=n_facturas, p=probs))
+    corte = int(np.searchsorted(np.cumsum(items), n_filas))
+    items = items[:corte + 1]
+    items[-1] -= int(items.sum() - n_filas)
+    n_facturas = len(items)
+    fila_factura = np.repeat(np.arange(n_facturas), items)
+
+    # --- Nivel factura ---
+    por_factura = {}
+    cliente_vacio = rng.random(n_facturas) < perfil["p_cliente_vacio"]
+    for col in COLUMNAS_CLIENTE + COLUMNAS_FACTURA:
+        valores = _muestrear(rng, perfil["columnas"][col], n_facturas, zipf=col in COLUMNAS_ZIPF)
+        if col in COLUMNAS_CLIENTE and col != "Empresa Cvu Cv":
+            valores[cliente_vacio] = ""
+        por_factura[col] = valores
+
+    dias = rng.integers(0, 366 if anio % 4 == 0 else 365, size=n_facturas)
+    fechas = pd.Timestamp(f"{anio}-01-01") + pd.to_timedelta(dias, unit="D")
+    por_factura["Fecha Factura"] = fechas.strftime("%Y/%m/%d 00:00:00").to_numpy(dtype=object)
+    por_factura["Mes Factura"] = fechas.month.astype(str).to_numpy(dtype=object)
+    por_factura["Mes Nombre Factura"] = np.array(MESES, dtype=object)[fechas.month - 1]
+    por_factura["No. Factura"] = (primera_factura + np.arange(n_facturas)).astype(str).astype(object)
+
+    df = pd.DataFrame({col: valores[fila_factura] for col, valores in por_factura.items()})
+
+    # --- Nivel ítem: varios proveedores por factura ---
+    for col in COLUMNAS_ITEM:
+        df[col] = _muestrear(rng, perfil["columnas"][col], n_filas, zipf=col in COLUMNAS_ZIPF)
+
+    media, desv = perfil["log_bruto"]
+    bruto = np.round(np.exp(rng.normal(media, desv, size=n_filas)))
+    neto = np.where(rng.random(n_filas) < perfil["p_con_iva"], np.round(bruto / 1.19), bruto)
+    base = np.where(rng.random(n_filas) < perfil["p_base_cero"], 0, neto)
+    df["Valor Total Item Factura"] = bruto.astype(np.int64).astype(str)
+    df["Valor Total Neto Item Factura"] = neto.astype(np.int64).astype(str)
+    df["Valor Base Comisionable"] = base.astype(np.int64).astype(str)
+    df["Año Factura"] = str(anio)
+    return df[ENCABEZADO], n_facturas
+
+
+# -----------------------------------------------------------------------------
+# 3. ESCRITURA
+# -----------------------------------------------------------------------------
+
+def generar_exportacion(ruta, n_filas, anio, perfil=None, semilla=42, primera_factura=None,
+                        tamano_lote=TAMANO_LOTE):
+    """
+    Escribe una exportación sintética de 'n_filas' en 'ruta' (todas las
+    celdas entre comillas, como el archivo original), por lotes.
+    Devuelve el siguiente número de factura libre.
+    """
+    perfil = perfil if perfil is not None else perfilar_muestra()
+    rng = np.random.default_rng(semilla)
+    siguiente = primera_factura if primera_factura is not None else 240_000_000_000 + anio * 10_000_000
+    os.makedirs(os.path.dirname(ruta) or ".", exist_ok=True)
+    escritas = 0
+    with open(ruta, "w", encoding="utf-8", newline="") as f:
+        while escritas < n_filas:
+            n = min(tamano_lote, n_filas - escritas)
+            lote, n_facturas = generar_lote(perfil, n, anio, siguiente, rng)
+            lote.to_csv(f, index=False, header=escritas == 0, quoting=1)
+            escritas += n
+            siguiente += n_facturas
+    return siguiente
+
+
+def generar_exportaciones(carpeta, n_filas, anios=(2017,), semilla=42, tamano_lote=TAMANO_LOTE,
+                          carpeta_muestra=CARPETA_MUESTRA):
+    """
+    Genera un archivo por año ('<anio> PM_VC02_Reporte_de_Ventas_VC_PorProveedor.csv')
+    repartiendo 'n_filas' entre ellos. Devuelve la lista de rutas.
+    """
+    perfil = perfilar_muestra(carpeta_muestra)
+    rutas = []
+    siguiente = None
+    por_anio = np.full(len(anios), n_filas // len(anios))
+    por_anio[: n_filas % len(anios)] += 1
+    for i, (anio, n) in enumerate(zip(anios, por_anio)):
+        ruta = os.path.join(carpeta, f"{anio} {PREFIJO_ARCHIVO}.csv")
+        siguiente = generar_exportacion(ruta, int(n), int(anio), perfil, semilla + i, siguiente, tamano_lote)
+        rutas.append(ruta)
+        print(f"Exportación sintética: {ruta} ({int(n):,} filas)")
+    return rutas
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Genera exportaciones de ventas sintéticas para benchmarks.")
+    parser.add_argument("--filas", type=int, default=10_000, help="Filas totales (10k a 50M).")
+    parser.add_argument("--anios", type=int, nargs="+", default=[2017], help="Un archivo por año.")
+    parser.add_argument("--salida", default="datos_sinteticos")
+    parser.add_argument("--semilla", type=int, default=42)
+    parser.add_argument("--muestra", default=CARPETA_MUESTRA, help="Carpeta con la exportación real a imitar.")
+    args = parser.parse_args()
+
+    generar_exportaciones(args.salida, args.filas, args.anios, args.semilla, carpeta_muestra=args.muestra)
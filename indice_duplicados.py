@@ -0,0 +1,215 @@
+# indice_duplicados.py
+
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from sketches import FiltroBloom
+
+# -----------------------------------------------------------------------------
+# Índice de duplicados en la ingesta. Por cada fila bruta (ya con nombres
+# limpios) se guardan dos hashes de 64 bits:
+#
+#   - 'filas': el contenido canónico completo de la fila (textos sin espacios
+#     sobrantes, números normalizados, nulos como vacío). Una fila idéntica a
+#     otra ya ingerida, de cualquier archivo, se descarta.
+#   - 'factura_proveedor': No. Factura + proveedor. Si la pareja ya llegó en
+#     OTRO archivo (mes reexportado, proveedor repetido en dos exportaciones)
+#     se descartan sus filas y gana la primera versión. Dentro de un mismo
+#     archivo la pareja se repite legítimamente (varios ítems).
+#
+# Cada conjunto es un arreglo ordenado de uint64 en disco (.npy, se abre con
+# mmap) con un filtro de Bloom en memoria delante: la mayoría de los hashes
+# nuevos se descartan con el filtro sin tocar el arreglo. Los hashes de un
+# lote quedan pendientes hasta confirmar(), para no marcar como vistas filas
+# de un lote que luego falla.
+# -----------------------------------------------------------------------------
+
+CARPETA_INDICE = os.path.join("datos_limpios", ".duplicados")
+CONJUNTOS = ("filas", "factura_proveedor")
+
+COLUMNAS_CLAVE = ["no_factura", "nombre_proveedor"]
+COLUMNAS_NUMERICAS = ["cant_polizas", "vlr_presupuesto_ppto", "vlr_total_neto_factura",
+                      "vlr_total_item_factura", "vlr_total_neto_item_factura"]
+
+# El filtro se dimensiona para el doble de los elementos actuales (mínimo este valor)
+CAPACIDAD_MINIMA_BLOOM = 100_000
+
+
+def texto_canonico(serie, numerica=False):
+    """Representación de texto estable entre archivos: '123', 123 y 123.0 dan lo mismo."""
+    if not (numerica or pd.api.types.is_numeric_dtype(serie)):
+        return serie.astype(str).str.strip().where(serie.notna(), "")
+    numeros = pd.to_numeric(serie, errors="coerce")
+    texto = pd.Series("", index=serie.index, dtype=object)
+    enteros = numeros.notna() & (numeros == np.round(numeros)) & (numeros.abs() < 2 ** 53)
+    decimales = numeros.notna() & ~enteros
+    no_numericos = numeros.isna() & serie.notna()
+    texto[enteros] = numeros[enteros].astype(np.int64).astype(str)
+    texto[decimales] = numeros[decimales].astype(str)
+    texto[no_numericos] = serie[no_numericos].astype(str).str.strip()
+    return texto
+
+
+def _canonico(df, columnas):
+    return pd.DataFrame({c: texto_canonico(df[c], c in COLUMNAS_NUMERICAS) for c in columnas}, index=df.index)
+
+
+def hash_filas(df):
+    """Hash de 64 bits del contenido canónico de cada fila."""
+    return pd.util.hash_pandas_object(_canonico(df, list(df.columns)), index=False).to_numpy()
+
+
+def hash_factura_proveedor(df):
+    """Hash de 64 bits de No. Factura + proveedor de cada fila."""
+    return pd.util.hash_pandas_object(_canonico(df, COLUMNAS_CLAVE), index=False).to_numpy()
+
+
+class ConjuntoHashes:
+    """Conjunto persistente de hashes uint64: arreglo ordenado en disco + filtro de Bloom."""
+
+    def __init__(self, ruta_base, usar_bloom=True):
+        self.ruta_arreglo = ruta_base + ".npy"
+        self.ruta_bloom = ruta_base + ".bloom.npz"
+        self.usar_bloom = usar_bloom
+        self.valores = (np.load(self.ruta_arreglo, mmap_mode="r") if os.path.exists(self.ruta_arreglo)
+                        else np.empty(0, dtype=np.uint64))
+        self.pendientes = np.empty(0, dtype=np.uint64)
+        self.bloom = None
+        if usar_bloom:
+            if os.path.exists(self.ruta_bloom):
+                with np.load(self.ruta_bloom) as datos:
+                    self.bloom = FiltroBloom.desde_dict(datos)
+            if self.bloom is None or self.bloom.n < len(self.valores):
+                self._reconstruir_bloom()
+
+    def _reconstruir_bloom(self):
+        self.bloom = FiltroBloom(max(2 * (len(self.valores) + len(self.pendientes)), CAPACIDAD_MINIMA_BLOOM))
+        for parte in (self.valores, self.pendientes):
+            if len(parte):
+                self.bloom.agregar(np.asarray(parte))
+
+    @staticmethod
+    def _en_ordenado(ordenado, hashes):
+        if len(ordenado) == 0 or len(hashes) == 0:
+            return np.zeros(len(hashes), dtype=bool)
+        pos = np.searchsorted(ordenado, hashes)
+        pos[pos == len(ordenado)] = len(ordenado) - 1
+        return np.asarray(ordenado[pos]) == hashes
+
+    def contiene(self, hashes):
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        encontrados = np.zeros(len(hashes), dtype=bool)
+        candidatos = np.arange(len(hashes))
+        if self.bloom is not None:
+            candidatos = candidatos[self.bloom.contiene(hashes)]
+        if len(candidatos):
+            sub = hashes[candidatos]
+            encontrados[candidatos] = self._en_ordenado(self.valores, sub) | self._en_ordenado(self.pendientes, sub)
+        return encontrados
+
+    def agregar(self, hashes):
+        """Añade hashes como pendientes (visibles para contiene(), no guardados aún)."""
+        hashes = np.unique(np.asarray(hashes, dtype=np.uint64))
+        self.pendientes = np.union1d(self.pendientes, hashes)
+        if self.bloom is not None:
+            self.bloom.agregar(hashes)
+            if self.bloom.n > self.bloom.capacidad:
+                self._reconstruir_bloom()
+
+    def confirmar(self):
+        if len(self.pendientes) == 0:
+            return
+        self.valores = np.union1d(np.asarray(self.valores), self.pendientes)
+        self.pendientes = np.empty(0, dtype=np.uint64)
+        np.save(self.ruta_arreglo, self.valores)
+        if self.bloom is not None:
+            np.savez_compressed(self.ruta_bloom, **self.bloom.a_dict())
+        self.valores = np.load(self.ruta_arreglo, mmap_mode="r")
+
+    def descartar(self):
+        self.pendientes = np.empty(0, dtype=np.uint64)
+        if self.bloom is not None:
+            self._reconstruir_bloom()
+
+    def __len__(self):
+        return len(self.valores) + len(self.pendientes)
+
+
+class IndiceDuplicados:
+    """
+    Índice de duplicados de la ingesta (ver el encabezado del módulo).
+
+        indice = IndiceDuplicados(reiniciar=True)
+        df = indice.filtrar(df_bruto, "2017 ...csv")
+        indice.confirmar()
+    """
+
+    def __init__(self, carpeta=CARPETA_INDICE, usar_bloom=True, reiniciar=False):
+        self.carpeta = carpeta
+        self.ruta_reporte = os.path.join(carpeta, "reporte.json")
+        if reiniciar:
+            self.reiniciar()
+        os.makedirs(carpeta, exist_ok=True)
+        self.conjuntos = {nombre: ConjuntoHashes(os.path.join(carpeta, nombre), usar_bloom)
+                          for nombre in CONJUNTOS}
+        self.reporte = {}
+        if os.path.exists(self.ruta_reporte):
+            with open(self.ruta_reporte, encoding="utf-8") as f:
+                self.reporte = json.load(f)
+        self._reporte_pendiente = {}
+
+    def reiniciar(self):
+        """Vacía el índice (una corrida completa vuelve a ingerir todos los archivos)."""
+        for nombre in CONJUNTOS:
+            for sufijo in (".npy", ".bloom.npz"):
+                ruta = os.path.join(self.carpeta, nombre + sufijo)
+                if os.path.exists(ruta):
+                    os.remove(ruta)
+        if os.path.exists(self.ruta_reporte):
+            os.remove(self.ruta_reporte)
+
+    def filtrar(self, df, origen):
+        """
+        Devuelve df sin las filas ya vistas (en este u otros archivos) ni las
+        parejas factura+proveedor que ya llegaron en otro archivo, e imprime
+        los conteos del archivo 'origen'.
+        """
+        h_filas = hash_filas(df)
+        h_clave = hash_factura_proveedor(df)
+
+        repetidas = self.conjuntos["filas"].contiene(h_filas) | pd.Series(h_filas).duplicated().to_numpy()
+        clave_vista = self.conjuntos["factura_proveedor"].contiene(h_clave) & ~repetidas
+        conservar = ~(repetidas | clave_vista)
+
+        self.conjuntos["filas"].agregar(h_filas[conservar])
+        self.conjuntos["factura_proveedor"].agregar(h_clave[conservar])
+
+        conteo = {
+            "filas": int(len(df)),
+            "filas_repetidas": int(repetidas.sum()),
+            "factura_proveedor_vista": int(clave_vista.sum()),
+            "conservadas": int(conservar.sum()),
+        }
+        self._reporte_pendiente[os.path.basename(origen)] = conteo
+        print(f"Duplicados en {os.path.basename(origen)}: {conteo['filas_repetidas']:,} filas idénticas y "
+              f"{conteo['factura_proveedor_vista']:,} de factura+proveedor ya ingerida en otro archivo; "
+              f"se conservan {conteo['conservadas']:,} de {conteo['filas']:,}.")
+        return df[conservar]
+
+    def confirmar(self):
+        """Persiste los hashes y conteos de los lotes filtrados desde la última confirmación."""
+        for conjunto in self.conjuntos.values():
+            conjunto.confirmar()
+        self.reporte.update(self._reporte_pendiente)
+        self._reporte_pendiente = {}
+        with open(self.ruta_reporte, "w", encoding="utf-8") as f:
+            json.dump(self.reporte, f, ensure_ascii=False, indent=2)
+
+    def descartar(self):
+        """Olvida los lotes filtrados sin confirmar (p. ej. si su procesamiento falló)."""
+        for conjunto in self.conjuntos.values():
+            conjunto.descartar()
+        self._reporte_pendiente = {}
@@ -0,0 +1,191 @@
+# indice_facturas.py
+
+import argparse
+import io
+import mmap
+import os
+
+import numpy as np
+import pandas as pd
+
+# -----------------------------------------------------------------------------
+# 1. DEFINICIONES
+# -----------------------------------------------------------------------------
+
+CARPETA_ENRIQ = "datos_enriquecidos"
+CARPETA_INDICES = os.path.join(CARPETA_ENRIQ, ".indices")
+
+# Tablas indexadas: nombre -> (archivo, columna clave)
+TABLAS_INDEXADAS = {
+    "facturas": ("facturas_enriquecido.csv", "no_factura"),
+    "proveedores": ("proveedores_por_factura_enriquecido.csv", "no_factura"),
+    "clientes": ("clientes_enriquecido.csv", "id_cliente"),
+    "maestro": ("dataset_maestro_facturas.csv", "no_factura"),
+    "clusters": ("clusters_facturas.csv", "no_factura"),
+}
+
+TAMANO_BLOQUE = 64 * 1024 * 1024
+
+
+# -----------------------------------------------------------------------------
+# 2. CONSTRUCCIÓN DEL ÍNDICE LATERAL
+# -----------------------------------------------------------------------------
+
+def _offsets_lineas(ruta):
+    """Posición (en bytes) del inicio de cada línea de datos, leyendo el archivo por bloques."""
+    posiciones = []
+    with open(ruta, "rb") as f:
+        tamano = os.fstat(f.fileno()).st_size
+        if tamano == 0:
+            return np.empty(0, dtype=np.int64), 0
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            for inicio in range(0, tamano, TAMANO_BLOQUE):
+                bloque = np.frombuffer(mm[inicio:inicio + TAMANO_BLOQUE], dtype=np.uint8)
+                posiciones.append(np.flatnonzero(bloque == 10) + inicio + 1)
+    saltos = np.concatenate(posiciones).astype(np.int64)
+    # La primera línea es la cabecera; la última posición puede ser el final del archivo
+    inicios = saltos[saltos < tamano]
+    return inicios, tamano
+
+
+def _ruta_indice(nombre, carpeta_indices):
+    return os.path.join(carpeta_indices, f"{nombre}.npz")
+
+
+def construir_indice(ruta_csv, clave, ruta_indice):
+    """
+    Índice lateral de un CSV por 'clave': claves ordenadas + desplazamiento en
+    bytes de la fila correspondiente. Una búsqueda es un searchsorted y un
+    seek, sin leer ni parsear el resto del archivo. Supone una fila por línea
+    (los CSV del pipeline no tienen saltos de línea dentro de los campos).
+    """
+    inicios, tamano = _offsets_lineas(ruta_csv)
+    claves = pd.concat(
+        [c[clave] for c in pd.read_csv(ruta_csv, usecols=[clave], dtype=str, chunksize=1_000_000,
+                                        encoding="utf-8-sig", skip_blank_lines=False)],
+        ignore_index=True,
+    ) if len(inicios) else pd.Series(dtype=str)
+    if len(claves) != len(inicios):
+        raise ValueError(
+            f"'{ruta_csv}': {len(claves)} filas pero {len(inicios)} líneas; "
+            "el archivo tiene saltos de línea dentro de campos y no se puede indexar por líneas."
+        )
+
+    claves = claves.fillna("").str.strip().to_numpy(dtype=str)
+    orden = np.argsort(claves, kind="stable")
+    fines = np.append(inicios[1:], tamano)
+    stat = os.stat(ruta_csv)
+    os.makedirs(os.path.dirname(ruta_indice) or ".", exist_ok=True)
+    np.savez(
+        ruta_indice,
+        claves=claves[orden], inicios=inicios[orden], fines=fines[orden],
+        origen=np.array([os.path.abspath(ruta_csv), str(stat.st_size), str(stat.st_mtime_ns)]),
+    )
+    return ruta_indice
+
+
+def construir_indices(carpeta=CARPETA_ENRIQ, carpeta_indices=CARPETA_INDICES):
+    """Construye los índices de todas las tablas presentes en la carpeta."""
+    for nombre, (archivo, clave) in TABLAS_INDEXADAS.items():
+        ruta_csv = os.path.join(carpeta, archivo)
+        if os.path.exists(ruta_csv):
+            construir_indice(ruta_csv, clave, _ruta_indice(nombre, carpeta_indices))
+    print(f"Índices por no_factura / id_cliente guardados en: {carpeta_indices}")
+
+
+# -----------------------------------------------------------------------------
+# 3. BÚSQUEDAS
+# -----------------------------------------------------------------------------
+
+_CACHE_INDICES = {}
+
+
+def _cargar_indice(nombre, carpeta, carpeta_indices):
+    """Carga (y si falta o está desactualizado, reconstruye) el índice de una tabla."""
+    archivo, clave = TABLAS_INDEXADAS[nombre]
+    ruta_csv = os.path.join(carpeta, archivo)
+    if not os.path.exists(ruta_csv):
+        return None
+    stat = os.stat(ruta_csv)
+    firma = (os.path.abspath(ruta_csv), str(stat.st_size), str(stat.st_mtime_ns))
+
+    en_cache = _CACHE_INDICES.get(ruta_csv)
+    if en_cache is not None and en_cache[0] == firma:
+        return en_cache[1]
+
+    ruta_indice = _ruta_indice(nombre, carpeta_indices)
+    indice = None
+    if os.path.exists(ruta_indice):
+        indice = dict(np.load(ruta_indice))
+        if tuple(indice["origen"]) != firma:
+            indice = None
+    if indice is None:
+        construir_indice(ruta_csv, clave, ruta_indice)
+        indice = dict(np.load(ruta_indice))
+
+    with open(ruta_csv, "rb") as f:
+        indice["cabecera"] = f.readline()
+    _CACHE_INDICES[ruta_csv] = (firma, indice)
+    return indice
+
+
+def buscar(nombre, claves, carpeta=CARPETA_ENRIQ, carpeta_indices=CARPETA_INDICES):
+    """
+    Filas de la tabla 'nombre' cuya clave está en 'claves' (una o varias),
+    leídas directamente por desplazamiento. Devuelve un DataFrame (vacío si
+    la tabla no existe o no hay coincidencias).
+    """
+    indice = _cargar_indice(nombre, carpeta, carpeta_indices)
+    if indice is None:
+        return pd.DataFrame()
+    claves = [claves] if isinstance(claves, (str, int, np.integer)) else list(claves)
+    buscadas = np.array([str(c).strip() for c in claves], dtype=str)
+
+    izq = np.searchsorted(indice["claves"], buscadas, side="left")
+    der = np.searchsorted(indice["claves"], buscadas, side="right")
+    posiciones = np.concatenate([np.arange(i, d) for i, d in zip(izq, der)]) if len(buscadas) else []
+
+    archivo, _ = TABLAS_INDEXADAS[nombre]
+    lineas = [indice["cabecera"]]
+    with open(os.path.join(carpeta, archivo), "rb") as f:
+        for p in sorted(posiciones, key=lambda p: indice["inicios"][p]):
+            f.seek(int(indice["inicios"][p]))
+            linea = f.read(int(indice["fines"][p] - indice["inicios"][p]))
+            lineas.append(linea if linea.endswith(b"\n") else linea + b"\n")
+    return pd.read_csv(io.BytesIO(b"".join(lineas)), encoding="utf-8-sig", dtype={"no_factura": str})
+
+
+def ficha_factura(no_factura, carpeta=CARPETA_ENRIQ, carpeta_indices=CARPETA_INDICES):
+    """
+    Vista completa de una factura: fila de factura (con clasificación geo),
+    atributos del cliente, proveedores, fila del maestro y cluster.
+    Devuelve un dict {tabla: DataFrame}.
+    """
+    ficha = {nombre: buscar(nombre, no_factura, carpeta, carpeta_indices)
+             for nombre in ("facturas", "proveedores", "maestro", "clusters")}
+    facturas = ficha["facturas"]
+    ids_cliente = facturas["id_cliente"].dropna().tolist() if "id_cliente" in facturas.columns else []
+    ficha["clientes"] = buscar("clientes", ids_cliente, carpeta, carpeta_indices)
+    return ficha
+
+
+# -----------------------------------------------------------------------------
+# 4. EJECUCIÓN PRINCIPAL
+# -----------------------------------------------------------------------------
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Búsqueda por no_factura en las salidas del pipeline.")
+    parser.add_argument("no_factura", nargs="*", help="Factura(s) a consultar.")
+    parser.add_argument("--construir", action="store_true", help="(Re)construir todos los índices.")
+    args = parser.parse_args()
+
+    if args.construir:
+        construir_indices()
+
+    pd.set_option("display.width", 200)
+    pd.set_option("display.max_columns", 50)
+    for factura in args.no_factura:
+        print(f"\n===== Factura {factura} =====")
+        for tabla, filas in ficha_factura(factura).items():
+            print(f"\n--- {tabla} ---")
+            print(filas.T if len(filas) == 1 else filas)
@@ -0,0 +1,265 @@
+# indice_geo.py
+
+import bisect
+import os
+import re
+import unicodedata
+
+import numpy as np
+import pandas as pd
+
+# -----------------------------------------------------------------------------
+# Índice geográfico compacto para clasificar destinos. De geonamescache solo
+# se usan el nombre oficial de cada ciudad, su país y el continente del país,
+# así que en lugar de guardar los registros completos (con sus listas de
+# nombres alternativos) se guardan:
+#
+#   - tablas internadas de ciudades, países y continentes (textos UTF-8
+#     concatenados en un arreglo uint8 + offsets, y arreglos int32/int16 con
+#     el país de cada ciudad y el continente de cada país);
+#   - las claves de búsqueda normalizadas (nombre y nombres alternativos)
+#     ordenadas, con búsqueda binaria, y el id de ciudad/país de cada una.
+#
+# El índice se construye una vez a partir de geonamescache/pycountry y se
+# guarda en RUTA_CACHE_GEO (.npz); los procesos siguientes lo cargan sin
+# leer las bases completas. La carga es perezosa: ocurre en la primera
+# clasificación.
+# -----------------------------------------------------------------------------
+
+VERSION_INDICE = 1
+RUTA_CACHE_GEO = os.environ.get(
+    "CVU_CACHE_GEO", os.path.join(os.path.expanduser("~"), ".cache", "cvu", "indice_geo.npz"))
+
+# Alias manuales de países (se añaden tras los nombres de geonamescache y alpha-3)
+ALIAS_PAISES = {
+    'ESTADOS UNIDOS': 'UNITED STATES',
+    'USA': 'UNITED STATES',
+    'EEUU': 'UNITED STATES',
+    'EEU': 'UNITED STATES',
+    'EESTADOS UNIDOS': 'UNITED STATES',
+    'REINO UNIDO': 'UNITED KINGDOM',
+    'UK': 'UNITED KINGDOM',
+    'PAISES BAJOS': 'NETHERLANDS',
+    'NUEVA ZELANDA': 'NEW ZEALAND',
+    'NEW ZELANDA': 'NEW ZEALAND',
+}
+
+_INDICE = None
+
+
+def normalize_geo_name(name):
+    """Convierte a mayúsculas, quita tildes y caracteres especiales para búsqueda."""
+    if pd.isna(name) or not isinstance(name, str) or name.strip() == '':
+        return None # Devolver None para nulos o vacíos
+    try:
+        # NFD separa tildes, encode/decode las quita
+        normalized = unicodedata.normalize('NFD', name.upper())
+        # Eliminar caracteres no alfanuméricos excepto espacios
+        normalized = re.sub(r'[^\w\s]', '', normalized)
+        # Reemplazar múltiples espacios con uno solo y quitar espacios al inicio/final
+        normalized = re.sub(r'\s+', ' ', normalized).strip()
+        # Manejar casos especiales que quedan después de normalizar
+        if normalized == 'BOGOTA D C': normalized = 'BOGOTA'
+        # Si después de limpiar queda vacío, retornar None
+        return normalized if normalized else None
+    except Exception:
+        return None # Retornar None si hay error en normalización
+
+
+# -----------------------------------------------------------------------------
+# TABLAS COMPACTAS
+# -----------------------------------------------------------------------------
+
+class TablaTextos:
+    """Lista inmutable de textos guardada como bytes UTF-8 concatenados + offsets."""
+
+    __slots__ = ("datos", "inicios")
+
+    def __init__(self, datos, inicios):
+        self.datos = datos
+        self.inicios = inicios
+
+    @classmethod
+    def desde_lista(cls, textos):
+        codificados = [t.encode("utf-8") for t in textos]
+        inicios = np.zeros(len(codificados) + 1, dtype=np.int64)
+        inicios[1:] = np.cumsum([len(c) for c in codificados])
+        return cls(np.frombuffer(b"".join(codificados), dtype=np.uint8), inicios)
+
+    def __len__(self):
+        return len(self.inicios) - 1
+
+    def __getitem__(self, i):
+        return self.datos[self.inicios[i]:self.inicios[i + 1]].tobytes().decode("utf-8")
+
+    def buscar(self, texto):
+        """Posición de 'texto' (la tabla debe estar ordenada) o -1."""
+        i = bisect.bisect_left(self, texto)
+        return i if i < len(self) and self[i] == texto else -1
+
+
+class IndiceGeo:
+    """Búsquedas de ciudades y países sobre las tablas compactas."""
+
+    def __init__(self, arreglos):
+        self.continentes = [str(c) for c in arreglos["continentes"]]
+        self.paises = TablaTextos(arreglos["paises_datos"], arreglos["paises_inicios"])
+        self.pais_codigo = [str(c) for c in arreglos["pais_codigo"]]
+        self.pais_continente = arreglos["pais_continente"]
+        self.ciudades = TablaTextos(arreglos["ciudades_datos"], arreglos["ciudades_inicios"])
+        self.ciudad_pais = arreglos["ciudad_pais"]
+        self.claves_ciudad = TablaTextos(arreglos["claves_ciudad_datos"], arreglos["claves_ciudad_inicios"])
+        self.clave_ciudad_id = arreglos["clave_ciudad_id"]
+        self.claves_pais = TablaTextos(arreglos["claves_pais_datos"], arreglos["claves_pais_inicios"])
+        self.clave_pais_id = arreglos["clave_pais_id"]
+        self._pais_por_codigo = {c: i for i, c in enumerate(self.pais_codigo)}
+
+    def _resultado_pais(self, pais):
+        """('PAIS', None, país, continente) o None si el país no tiene continente/nombre válido."""
+        if pais < 0 or self.pais_continente[pais] < 0:
+            return None
+        return ('PAIS', None, self.paises[pais], self.continentes[self.pais_continente[pais]])
+
+    def ciudad(self, nombre):
+        """('CIUDAD', ciudad, país, continente) para un nombre normalizado, o None."""
+        pos = self.claves_ciudad.buscar(nombre)
+        if pos < 0:
+            return None
+        ciudad = int(self.clave_ciudad_id[pos])
+        pais = int(self.ciudad_pais[ciudad])
+        if pais < 0 or self.pais_continente[pais] < 0:
+            return None
+        return ('CIUDAD', self.ciudades[ciudad], self.paises[pais], self.continentes[self.pais_continente[pais]])
+
+    def pais(self, nombre):
+        pos = self.claves_pais.buscar(nombre)
+        return None if pos < 0 else self._resultado_pais(int(self.clave_pais_id[pos]))
+
+    def pais_por_codigo(self, alpha_2):
+        return self._resultado_pais(self._pais_por_codigo.get(alpha_2, -1))
+
+    def memoria(self):
+        """Bytes ocupados por los arreglos del índice."""
+        return sum(a.nbytes for a in (self.paises.datos, self.paises.inicios, self.pais_continente,
+                                      self.ciudades.datos, self.ciudades.inicios, self.ciudad_pais,
+                                      self.claves_ciudad.datos, self.claves_ciudad.inicios, self.clave_ciudad_id,
+                                      self.claves_pais.datos, self.claves_pais.inicios, self.clave_pais_id))
+
+
+# -----------------------------------------------------------------------------
+# CONSTRUCCIÓN Y CACHÉ
+# -----------------------------------------------------------------------------
+
+def _versiones():
+    from importlib.metadata import version, PackageNotFoundError
+    partes = [f"indice={VERSION_INDICE}"]
+    for paquete in ("geonamescache", "pycountry"):
+        try:
+            partes.append(f"{paquete}={version(paquete)}")
+        except PackageNotFoundError:
+            partes.append(f"{paquete}=?")
+    return ";".join(partes)
+
+
+def construir_arreglos():
+    """Recorre geonamescache/pycountry una vez y devuelve los arreglos del índice."""
+    import pycountry
+    from geonamescache import GeonamesCache
+
+    gc = GeonamesCache()
+    cities = gc.get_cities()
+    countries = gc.get_countries()
+    continents = gc.get_continents()
+
+    continentes = [c['name'] for c in continents.values()]
+    id_continente = {codigo: i for i, codigo in enumerate(continents)}
+
+    # Países: válidos para clasificar si tienen nombre y continente conocido
+    pais_codigo = list(countries)
+    id_pais = {codigo: i for i, codigo in enumerate(pais_codigo)}
+    paises = [countries[c].get('name') or '' for c in pais_codigo]
+    pais_continente = np.array(
+        [id_continente.get(countries[c].get('continentcode'), -1) if paises[i] else -1
+         for i, c in enumerate(pais_codigo)], dtype=np.int16)
+
+    # Ciudades: mismas reglas de claves que el diccionario original (el nombre
+    # principal sobrescribe; los alternativos solo si la clave es nueva, no es
+    # un número y tiene más de 2 caracteres)
+    ciudades, ciudad_pais, claves_ciudad = [], [], {}
+    for city_data in cities.values():
+        indice = len(ciudades)
+        ciudades.append(city_data.get('name') or '')
+        pais = id_pais.get(city_data.get('countrycode'), -1)
+        ciudad_pais.append(pais if ciudades[-1] else -1)
+        norm_name = normalize_geo_name(city_data.get('name', ''))
+        if norm_name: claves_ciudad[norm_name] = indice
+        alt_names = city_data.get('alternatenames', [])
+        if isinstance(alt_names, list):
+            for alt in alt_names:
+                norm_alt = normalize_geo_name(alt)
+                if norm_alt and norm_alt not in claves_ciudad and not norm_alt.isdigit() and len(norm_alt) > 2:
+                    claves_ciudad[norm_alt] = indice
+
+    # Países por nombre normalizado, alpha-3 y alias manuales
+    claves_pais = {}
+    for codigo, country_data in countries.items():
+        norm_name = normalize_geo_name(country_data.get('name', ''))
+        if norm_name: claves_pais[norm_name] = id_pais[codigo]
+        try:
+            pyc_country = pycountry.countries.get(alpha_2=country_data.get('iso'))
+            if pyc_country and hasattr(pyc_country, 'alpha_3'):
+                norm_a3 = normalize_geo_name(pyc_country.alpha_3)
+                if norm_a3 and norm_a3 not in claves_pais:
+                    claves_pais[norm_a3] = id_pais[codigo]
+        except Exception: pass
+    for alias, nombre in ALIAS_PAISES.items():
+        claves_pais[alias] = claves_pais.get(nombre, -1)
+
+    arreglos = {
+        "continentes": np.array(continentes),
+        "pais_codigo": np.array(pais_codigo),
+        "pais_continente": pais_continente,
+        "ciudad_pais": np.array(ciudad_pais, dtype=np.int32),
+    }
+    for nombre, textos in (("paises", paises), ("ciudades", ciudades)):
+        tabla = TablaTextos.desde_lista(textos)
+        arreglos[f"{nombre}_datos"], arreglos[f"{nombre}_inicios"] = tabla.datos, tabla.inicios
+    for nombre, claves, tipo in (("ciudad", claves_ciudad, np.int32), ("pais", claves_pais, np.int16)):
+        ordenadas = sorted(claves)
+        tabla = TablaTextos.desde_lista(ordenadas)
+        arreglos[f"claves_{nombre}_datos"], arreglos[f"claves_{nombre}_inicios"] = tabla.datos, tabla.inicios
+        arreglos[f"clave_{nombre}_id"] = np.array([claves[c] for c in ordenadas], dtype=tipo)
+    return arreglos
+
+
+def cargar_indice_geo(ruta=RUTA_CACHE_GEO):
+    """
+    Índice geográfico del proceso (se carga una sola vez). Usa la caché en
+    disco si corresponde a las versiones instaladas; si no, lo construye y
+    la reescribe.
+    """
+    global _INDICE
+    if _INDICE is not None:
+        return _INDICE
+
+    from instrumentacion import etapa
+
+    with etapa("inicializar_geo") as e:
+        versiones = _versiones()
+        arreglos = None
+        if os.path.exists(ruta):
+            with np.load(ruta) as datos:
+                if str(datos["versiones"]) == versiones:
+                    arreglos = {k: datos[k] for k in datos.files}
+        if arreglos is None:
+            print("Construyendo el índice geográfico compacto (solo la primera vez)...")
+            arreglos = construir_arreglos()
+            try:
+                os.makedirs(os.path.dirname(ruta), exist_ok=True)
+                np.savez(ruta, versiones=np.array(versiones), **arreglos)
+            except OSError as error:
+                print(f"Aviso: no se pudo guardar la caché del índice geográfico en '{ruta}': {error}")
+        _INDICE = IndiceGeo(arreglos)
+    print(f"Índice GEO listo en {e.metricas['reloj_s']:.2f} segundos "
+          f"({len(_INDICE.claves_ciudad):,} nombres de ciudad, {_INDICE.memoria() / 2**20:,.1f} MiB).")
+    return _INDICE
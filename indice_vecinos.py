@@ -0,0 +1,301 @@
+# indice_vecinos.py
+
+import argparse
+import json
+import os
+import time
+
+# -----------------------------------------------------------------------------
+# Índice de vecinos aproximados (IVF) para buscar facturas o clientes
+# parecidos a uno dado sin recorrer toda la matriz de características.
+#
+#   - Vectores: la matriz de segmentación de 03_kmeans_clustering (numéricas
+#     estandarizadas + categóricas en one-hot, ver segmentacion.py) reducida
+#     con TruncatedSVD a unas pocas dimensiones densas (float32). Para clientes
+#     se promedian los vectores de sus facturas.
+#   - IVF: MiniBatchKMeans sobre una muestra da n_listas centroides; cada
+#     vector se guarda en la lista de su centroide más cercano, con las listas
+#     contiguas en disco (vectores ordenados por lista + offsets).
+#   - Búsqueda: se eligen las n_sondeos listas de centroide más cercano a la
+#     consulta y solo sus vectores se comparan exactamente (distancia L2).
+#     Con n_listas ~ raíz de N, cada consulta revisa del orden de
+#     n_sondeos * raíz de N vectores en lugar de N.
+#
+# El índice se guarda como una carpeta de .npy (se abren con mmap) y un
+# meta.json; una consulta por no_factura / id_cliente o por vector no
+# necesita cargar el maestro. Con el índice se guardan también el codificador
+# de la matriz (ver segmentacion.ajustar_codificador) y las componentes de la
+# SVD, así que indice.vectorizar(df_filas) lleva filas del maestro que no
+# están indexadas al espacio del índice para buscarlas.
+# -----------------------------------------------------------------------------
+
+CARPETA_ENRIQ = "datos_enriquecidos"
+NIVELES = {"factura": "no_factura", "cliente": "id_cliente"}
+
+DIMENSIONES = 32
+N_SONDEOS = 16
+MUESTRA_ENTRENAMIENTO = 100_000
+# Filas por bloque al asignar vectores a centroides (acota la matriz de distancias)
+FILAS_POR_BLOQUE = 4096
+ARREGLOS = ("centroides", "vectores", "claves", "inicios", "orden_claves")
+
+
+def crear_parser():
+    parser = argparse.ArgumentParser(description="Facturas o clientes parecidos (índice de vecinos aproximados).")
+    parser.add_argument("clave", nargs="?", help="no_factura (o id_cliente con --nivel cliente) a consultar.")
+    parser.add_argument("--nivel", choices=list(NIVELES), default="factura")
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--sondeos", type=int, default=N_SONDEOS, help="Listas revisadas por consulta.")
+    parser.add_argument("--construir", action="store_true", help="(Re)construir los índices desde el maestro.")
+    parser.add_argument("--dimensiones", type=int, default=DIMENSIONES)
+    parser.add_argument("--listas", type=int, default=None, help="Número de listas IVF (por defecto raíz de N).")
+    parser.add_argument("--carpeta", default=CARPETA_ENRIQ)
+    return parser
+
+
+if __name__ == "__main__":
+    # Los argumentos se leen antes de importar numpy/pandas/sklearn: --help responde al instante
+    parser = crear_parser()
+    args = parser.parse_args()
+
+import numpy as np
+import pandas as pd
+
+
+def _ruta_indice(carpeta, nivel):
+    return os.path.join(carpeta, f"indice_vecinos_{nivel}s")
+
+
+def _distancias(x, y, norma_y=None):
+    """Distancias L2 al cuadrado entre las filas de x y las de y."""
+    norma_y = (y * y).sum(axis=1) if norma_y is None else norma_y
+    d = (x * x).sum(axis=1)[:, np.newaxis] - 2 * (x @ y.T) + norma_y[np.newaxis, :]
+    return np.maximum(d, 0)
+
+
+def _mas_cercanos(x, centroides, n):
+    """Índices de los n centroides más cercanos a cada fila de x (por bloques)."""
+    norma = (centroides * centroides).sum(axis=1)
+    n = min(n, len(centroides))
+    resultado = np.empty((len(x), n), dtype=np.int64)
+    for inicio in range(0, len(x), FILAS_POR_BLOQUE):
+        d = _distancias(x[inicio:inicio + FILAS_POR_BLOQUE], centroides, norma)
+        if n == 1:
+            resultado[inicio:inicio + len(d), 0] = d.argmin(axis=1)
+        else:
+            cercanos = np.argpartition(d, n - 1, axis=1)[:, :n]
+            orden = np.take_along_axis(d, cercanos, axis=1).argsort(axis=1)
+            resultado[inicio:inicio + len(d)] = np.take_along_axis(cercanos, orden, axis=1)
+    return resultado
+
+
+# -----------------------------------------------------------------------------
+# VECTORES DEL MAESTRO
+# -----------------------------------------------------------------------------
+
+def vectores_maestro(df, dimensiones=DIMENSIONES, codificacion='onehot', semilla=42):
+    """
+    Vectores densos float32 de cada factura: matriz de segmentación (CSR)
+    reducida a 'dimensiones' con TruncatedSVD (si es más ancha). Devuelve
+    (vectores, codificador, componentes de la SVD o None si no se reduce).
+    """
+    from segmentacion import ajustar_codificador, codificar
+
+    codificador = ajustar_codificador(df, codificacion)
+    matriz = codificar(df, codificador)
+    if matriz.shape[1] <= dimensiones:
+        return np.ascontiguousarray(matriz.toarray(), dtype=np.float32), codificador, None
+    from sklearn.decomposition import TruncatedSVD
+
+    svd = TruncatedSVD(n_components=dimensiones, random_state=semilla)
+    vectores = np.ascontiguousarray(svd.fit_transform(matriz), dtype=np.float32)
+    return vectores, codificador, svd.components_.astype(np.float32)
+
+
+def vectores_clientes(vectores, id_cliente):
+    """Perfil de cada cliente: promedio de los vectores de sus facturas. Devuelve (vectores, ids)."""
+    codigos, ids = pd.factorize(pd.Series(id_cliente).astype(str), sort=True)
+    sumas = np.zeros((len(ids), vectores.shape[1]), dtype=np.float64)
+    np.add.at(sumas, codigos, vectores)
+    conteos = np.bincount(codigos, minlength=len(ids))[:, np.newaxis]
+    return (sumas / conteos).astype(np.float32), np.asarray(ids, dtype=str)
+
+
+# -----------------------------------------------------------------------------
+# ÍNDICE IVF
+# -----------------------------------------------------------------------------
+
+class IndiceVecinos:
+    """
+    Índice IVF de vecinos aproximados.
+
+        indice = IndiceVecinos.construir(vectores, claves)
+        indice.guardar("datos_enriquecidos/indice_vecinos_facturas")
+        claves, distancias = IndiceVecinos.cargar(ruta).vecinos_de(12345, k=10)
+    """
+
+    def __init__(self, centroides, vectores, claves, inicios, orden_claves, codificador=None, componentes=None):
+        self.centroides = centroides
+        self.vectores = vectores
+        self.claves = claves
+        self.inicios = inicios
+        self.orden_claves = orden_claves
+        # Cómo se llevan filas del maestro al espacio del índice (ver vectorizar)
+        self.codificador = codificador
+        self.componentes = componentes
+
+    @classmethod
+    def construir(cls, vectores, claves, n_listas=None, muestra=MUESTRA_ENTRENAMIENTO, semilla=42,
+                  codificador=None, componentes=None):
+        """
+        Entrena los centroides sobre una muestra y reparte todos los vectores en
+        sus listas. 'codificador' y 'componentes' (de vectores_maestro) se
+        guardan con el índice para vectorizar filas nuevas.
+        """
+        from sklearn.cluster import MiniBatchKMeans
+
+        vectores = np.ascontiguousarray(vectores, dtype=np.float32)
+        claves = np.asarray(claves)
+        n = len(vectores)
+        n_listas = max(1, min(int(n_listas or round(np.sqrt(n))), n))
+
+        rng = np.random.default_rng(semilla)
+        entrenamiento = vectores[rng.choice(n, min(n, max(muestra, n_listas)), replace=False)]
+        kmeans = MiniBatchKMeans(n_clusters=n_listas, random_state=semilla, n_init=1,
+                                 batch_size=max(1024, 2 * n_listas))
+        centroides = kmeans.fit(entrenamiento).cluster_centers_.astype(np.float32)
+
+        lista = _mas_cercanos(vectores, centroides, 1)[:, 0]
+        orden = np.argsort(lista, kind='stable')
+        inicios = np.zeros(n_listas + 1, dtype=np.int64)
+        inicios[1:] = np.cumsum(np.bincount(lista, minlength=n_listas))
+        claves_ordenadas = claves[orden]
+        return cls(centroides, vectores[orden], claves_ordenadas, inicios,
+                   np.argsort(claves_ordenadas, kind='stable'), codificador, componentes)
+
+    def guardar(self, carpeta):
+        os.makedirs(carpeta, exist_ok=True)
+        for nombre in ARREGLOS:
+            np.save(os.path.join(carpeta, f"{nombre}.npy"), getattr(self, nombre))
+        ruta_componentes = os.path.join(carpeta, "componentes.npy")
+        if self.componentes is not None:
+            np.save(ruta_componentes, self.componentes)
+        elif os.path.exists(ruta_componentes):
+            os.remove(ruta_componentes)
+        with open(os.path.join(carpeta, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump({"n": len(self.vectores), "dimensiones": int(self.vectores.shape[1]),
+                       "n_listas": len(self.centroides), "codificador": self.codificador}, f, indent=2)
+
+    @classmethod
+    def cargar(cls, carpeta):
+        """Abre el índice con mmap (solo se leen del disco las listas consultadas)."""
+        arreglos = [np.load(os.path.join(carpeta, f"{nombre}.npy"), mmap_mode="r") for nombre in ARREGLOS]
+        with open(os.path.join(carpeta, "meta.json"), encoding="utf-8") as f:
+            codificador = json.load(f).get("codificador")
+        ruta_componentes = os.path.join(carpeta, "componentes.npy")
+        componentes = np.load(ruta_componentes) if os.path.exists(ruta_componentes) else None
+        return cls(*arreglos, codificador=codificador, componentes=componentes)
+
+    def vectorizar(self, df_filas):
+        """
+        Vectores (float32, uno por fila) de filas del maestro en el espacio del
+        índice: misma codificación y proyección SVD que al construirlo. En el
+        índice de clientes el perfil de un cliente es el promedio de los
+        vectores de sus facturas (vectores_clientes).
+        """
+        if self.codificador is None:
+            raise ValueError("El índice no guarda su codificador; reconstrúyelo con --construir.")
+        from segmentacion import codificar
+
+        matriz = codificar(df_filas, self.codificador)
+        if self.componentes is None:
+            return np.ascontiguousarray(matriz.toarray(), dtype=np.float32)
+        return np.ascontiguousarray(matriz @ np.asarray(self.componentes, dtype=np.float64).T, dtype=np.float32)
+
+    def posicion(self, clave):
+        """Posición del vector de 'clave' en el índice, o None."""
+        if self.claves.dtype.kind == 'U' and len(str(clave)) > self.claves.dtype.itemsize // 4:
+            return None  # Más larga que cualquier clave guardada (se truncaría al convertirla)
+        clave = np.asarray(clave, dtype=self.claves.dtype)
+        i = np.searchsorted(self.claves, clave, sorter=self.orden_claves)
+        if i < len(self.claves) and self.claves[self.orden_claves[i]] == clave:
+            return int(self.orden_claves[i])
+        return None
+
+    def buscar(self, consulta, k=10, n_sondeos=N_SONDEOS, excluir=None):
+        """
+        Los k vecinos aproximados de un vector (en el espacio del índice, p. ej.
+        una fila de vectorizar()).
+        Devuelve (claves, distancias L2) ordenados de más a menos parecido;
+        'excluir' es una posición del índice que no se devuelve (la propia consulta).
+        """
+        consulta = np.asarray(consulta, dtype=np.float32).reshape(1, -1)
+        listas = _mas_cercanos(consulta, np.asarray(self.centroides), n_sondeos)[0]
+        posiciones = np.concatenate([np.arange(self.inicios[l], self.inicios[l + 1]) for l in listas])
+        if excluir is not None:
+            posiciones = posiciones[posiciones != excluir]
+        if len(posiciones) == 0:
+            return self.claves[:0], np.empty(0, dtype=np.float32)
+        candidatos = np.asarray(self.vectores[posiciones])
+        d = _distancias(consulta, candidatos)[0]
+        k = min(k, len(d))
+        mejores = np.argpartition(d, k - 1)[:k]
+        mejores = mejores[np.argsort(d[mejores], kind='stable')]
+        return np.asarray(self.claves[posiciones[mejores]]), np.sqrt(d[mejores])
+
+    def vecinos_de(self, clave, k=10, n_sondeos=N_SONDEOS):
+        """Los k vecinos aproximados de una factura / cliente ya indexado (sin incluirlo)."""
+        pos = self.posicion(clave)
+        if pos is None:
+            raise KeyError(f"'{clave}' no está en el índice.")
+        return self.buscar(self.vectores[pos], k, n_sondeos, excluir=pos)
+
+
+# -----------------------------------------------------------------------------
+# CONSTRUCCIÓN DESDE EL MAESTRO
+# -----------------------------------------------------------------------------
+
+def construir_indices(carpeta=CARPETA_ENRIQ, dimensiones=DIMENSIONES, codificacion='onehot', n_listas=None):
+    """Construye y guarda los índices de facturas y de clientes a partir del maestro compacto."""
+    from memoria_maestro import cargar_maestro
+    from instrumentacion import etapa
+
+    df = cargar_maestro(carpeta)
+    with etapa("indice_vecinos", filas_entrada=len(df)):
+        vectores, codificador, componentes = vectores_maestro(df, dimensiones, codificacion)
+        por_nivel = {
+            "factura": (vectores, df["no_factura"].to_numpy(dtype=np.int64)),
+            "cliente": vectores_clientes(vectores, df["id_cliente"]),
+        }
+        for nivel, (v, claves) in por_nivel.items():
+            indice = IndiceVecinos.construir(v, claves, n_listas, codificador=codificador, componentes=componentes)
+            indice.guardar(_ruta_indice(carpeta, nivel))
+            print(f"Índice de vecinos de {nivel}s: {len(v):,} vectores de {v.shape[1]} dimensiones en "
+                  f"{len(indice.centroides):,} listas -> {_ruta_indice(carpeta, nivel)}")
+
+
+if __name__ == "__main__":
+    if args.construir:
+        construir_indices(args.carpeta, args.dimensiones, n_listas=args.listas)
+    if args.clave is not None:
+        ruta = _ruta_indice(args.carpeta, args.nivel)
+        if not os.path.exists(ruta):
+            parser.exit(1, f"No existe el índice '{ruta}'. Ejecuta primero con --construir.\n")
+        indice = IndiceVecinos.cargar(ruta)
+        clave = args.clave
+        if args.nivel == "factura":
+            try:
+                clave = int(args.clave)
+            except ValueError:
+                parser.error(f"no_factura debe ser numérico, no '{args.clave}'.")
+        inicio = time.perf_counter()
+        try:
+            claves, distancias = indice.vecinos_de(clave, args.k, args.sondeos)
+        except KeyError as error:
+            parser.exit(1, f"{error.args[0]}\n")
+        parecidos = "facturas más parecidas" if args.nivel == "factura" else "clientes más parecidos"
+        print(f"{len(claves)} {parecidos} a {NIVELES[args.nivel]}={clave} "
+              f"({(time.perf_counter() - inicio) * 1000:.1f} ms):")
+        print(pd.DataFrame({NIVELES[args.nivel]: claves, "distancia": distancias.round(4)}).to_string(index=False))
+    elif not args.construir:
+        parser.print_help()
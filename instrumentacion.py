@@ -0,0 +1,277 @@
+# instrumentacion.py
+
+import atexit
+import json
+import os
+import platform
+import socket
+import sys
+import time
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# -----------------------------------------------------------------------------
+# Instrumentación uniforme de las etapas del pipeline. Por cada etapa se
+# registra tiempo de reloj, tiempo de CPU, pico de memoria (RSS), filas de
+# entrada/salida y bytes leídos/escritos; al terminar el proceso se escribe un
+# JSON por ejecución en CARPETA_METRICAS.
+#
+# Variables de entorno:
+#   CVU_METRICAS    carpeta de salida de los JSON ('0' para no escribirlos)
+#   CVU_PERFILAR    etapas a perfilar, separadas por comas ('*' = todas)
+#   CVU_PERFILADOR  'cprofile' (por defecto) o 'pyinstrument'
+#
+#     with etapa("limpiar_datos", filas_entrada=len(df)) as e:
+#         df = limpiar_datos(df)
+#         e.filas(salida=len(df))
+# -----------------------------------------------------------------------------
+
+CARPETA_METRICAS = os.environ.get("CVU_METRICAS", "metricas_ejecucion")
+
+_EJECUCION = None
+
+
+def _leer_proc(ruta):
+    try:
+        with open(ruta, encoding="ascii") as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def _bytes_io():
+    """(leídos, escritos) por el proceso según /proc/self/io (rchar/wchar), o (None, None)."""
+    contenido = _leer_proc("/proc/self/io")
+    if contenido is None:
+        return None, None
+    valores = dict(linea.split(": ") for linea in contenido.splitlines() if ": " in linea)
+    return int(valores["rchar"]), int(valores["wchar"])
+
+
+def _pico_rss():
+    """Pico de RSS en bytes (VmHWM en Linux; ru_maxrss en otros sistemas)."""
+    contenido = _leer_proc("/proc/self/status")
+    if contenido is not None:
+        for linea in contenido.splitlines():
+            if linea.startswith("VmHWM:"):
+                return int(linea.split()[1]) * 1024
+    if resource is not None:
+        maximo = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return maximo if sys.platform == "darwin" else maximo * 1024
+    return None
+
+
+def _reiniciar_pico_rss():
+    """Reinicia VmHWM (Linux) para medir el pico de cada etapa por separado."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def _etapas_a_perfilar():
+    valor = os.environ.get("CVU_PERFILAR", "").strip()
+    return {e.strip() for e in valor.split(",") if e.strip()}
+
+
+# -----------------------------------------------------------------------------
+# ETAPAS
+# -----------------------------------------------------------------------------
+
+class Etapa:
+    """Mediciones de una etapa; se usa como context manager o con terminar()."""
+
+    def __init__(self, nombre, filas_entrada=None, padre=None):
+        self.nombre = nombre
+        self.filas_entrada = filas_entrada
+        self.filas_salida = None
+        self.padre = padre
+        self.metricas = {}
+        self._pico_hijos = 0
+        self._error = None
+        self._perfilador = None
+        self.metricas_perfil = None
+        self._terminada = False
+
+        etapas = _etapas_a_perfilar()
+        if "*" in etapas or nombre in etapas:
+            self._iniciar_perfilador()
+
+        self._pico_reiniciado = _reiniciar_pico_rss()
+        self._leidos, self._escritos = _bytes_io()
+        self._cpu = time.process_time()
+        self._inicio = time.perf_counter()
+
+    def filas(self, entrada=None, salida=None):
+        if entrada is not None:
+            self.filas_entrada = int(entrada)
+        if salida is not None:
+            self.filas_salida = int(salida)
+
+    def terminar(self, filas_salida=None):
+        if self._terminada:
+            return self.metricas
+        self._terminada = True
+        self.filas(salida=filas_salida)
+        reloj = time.perf_counter() - self._inicio
+        cpu = time.process_time() - self._cpu
+        leidos, escritos = _bytes_io()
+        pico = _pico_rss()
+        if pico is not None:
+            pico = max(pico, self._pico_hijos)
+        if self.padre is not None and pico is not None:
+            self.padre._pico_hijos = max(self.padre._pico_hijos, pico)
+        self._detener_perfilador()
+
+        self.metricas = {
+            "etapa": self.nombre,
+            "reloj_s": round(reloj, 4),
+            "cpu_s": round(cpu, 4),
+            "pico_rss_bytes": pico,
+            "pico_rss_por_etapa": self._pico_reiniciado,
+            "filas_entrada": self.filas_entrada,
+            "filas_salida": self.filas_salida,
+            "bytes_leidos": None if leidos is None else leidos - self._leidos,
+            "bytes_escritos": None if escritos is None else escritos - self._escritos,
+        }
+        if self._error is not None:
+            self.metricas["error"] = self._error
+        _ejecucion_actual().registrar(self)
+        memoria = f", pico {pico / 2**20:,.0f} MiB" if pico is not None else ""
+        print(f"[etapa] {self.nombre}: {reloj:.2f} s reloj, {cpu:.2f} s CPU{memoria}")
+        return self.metricas
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, tipo, valor, traza):
+        if tipo is not None:
+            self._error = repr(valor)
+        self.terminar()
+        return False
+
+    # --- Perfilado opcional ---
+    def _iniciar_perfilador(self):
+        backend = os.environ.get("CVU_PERFILADOR", "cprofile").lower()
+        if backend == "pyinstrument":
+            try:
+                from pyinstrument import Profiler
+                self._perfilador = ("pyinstrument", Profiler())
+                self._perfilador[1].start()
+                return
+            except ImportError:
+                print("(Instala 'pyinstrument' con 'pip install pyinstrument'; se usa cProfile)")
+        import cProfile
+        self._perfilador = ("cprofile", cProfile.Profile())
+        self._perfilador[1].enable()
+
+    def _detener_perfilador(self):
+        if self._perfilador is None:
+            return
+        backend, perfilador = self._perfilador
+        carpeta = CARPETA_METRICAS if CARPETA_METRICAS != "0" else "."
+        os.makedirs(carpeta, exist_ok=True)
+        base = os.path.join(carpeta, f"{_ejecucion_actual().id}_{self.nombre}")
+        if backend == "pyinstrument":
+            perfilador.stop()
+            ruta = base + ".html"
+            with open(ruta, "w", encoding="utf-8") as f:
+                f.write(perfilador.output_html())
+        else:
+            perfilador.disable()
+            ruta = base + ".prof"
+            perfilador.dump_stats(ruta)
+        self.metricas_perfil = ruta
+        print(f"[etapa] Perfil de '{self.nombre}' guardado en: {ruta}")
+
+
+def etapa(nombre, filas_entrada=None):
+    """Abre una etapa instrumentada (anidable) dentro de la ejecución actual."""
+    ejecucion = _ejecucion_actual()
+    padre = ejecucion.pila[-1] if ejecucion.pila else None
+    if padre is not None:
+        # La etapa hija reinicia VmHWM: el pico del padre hasta ahora se guarda
+        # antes y se combina al terminar (max con _pico_hijos)
+        pico = _pico_rss()
+        if pico is not None:
+            padre._pico_hijos = max(padre._pico_hijos, pico)
+    nueva = Etapa(nombre, filas_entrada=filas_entrada, padre=padre)
+    ejecucion.pila.append(nueva)
+    return nueva
+
+
+# -----------------------------------------------------------------------------
+# EJECUCIONES
+# -----------------------------------------------------------------------------
+
+class Ejecucion:
+    """Una corrida de un script: agrupa sus etapas y se vuelca a JSON al salir."""
+
+    def __init__(self, script):
+        self.script = script
+        self.inicio = datetime.now()
+        self.id = f"{script}_{self.inicio:%Y%m%d-%H%M%S}_{os.getpid()}"
+        self.etapas = []
+        self.pila = []
+        self._reloj = time.perf_counter()
+        self._cpu = time.process_time()
+        atexit.register(self.guardar)
+
+    def registrar(self, etapa_terminada):
+        if etapa_terminada in self.pila:
+            self.pila.remove(etapa_terminada)
+        metricas = dict(etapa_terminada.metricas)
+        if etapa_terminada.padre is not None:
+            metricas["padre"] = etapa_terminada.padre.nombre
+        if etapa_terminada.metricas_perfil:
+            metricas["perfil"] = etapa_terminada.metricas_perfil
+        self.etapas.append(metricas)
+
+    def a_dict(self):
+        leidos, escritos = _bytes_io()
+        return {
+            "script": self.script,
+            "id": self.id,
+            "inicio": self.inicio.isoformat(timespec="seconds"),
+            "argv": sys.argv[1:],
+            "host": socket.gethostname(),
+            "python": platform.python_version(),
+            "reloj_s": round(time.perf_counter() - self._reloj, 4),
+            "cpu_s": round(time.process_time() - self._cpu, 4),
+            "bytes_leidos": leidos,
+            "bytes_escritos": escritos,
+            "etapas": self.etapas,
+        }
+
+    def guardar(self):
+        """Escribe el JSON de la ejecución (una vez; también se llama al salir)."""
+        if CARPETA_METRICAS == "0" or not self.etapas:
+            return None
+        for pendiente in list(reversed(self.pila)):
+            pendiente.terminar()
+        os.makedirs(CARPETA_METRICAS, exist_ok=True)
+        ruta = os.path.join(CARPETA_METRICAS, f"{self.id}.json")
+        with open(ruta, "w", encoding="utf-8") as f:
+            json.dump(self.a_dict(), f, ensure_ascii=False, indent=2)
+        self.etapas = []
+        return ruta
+
+
+def iniciar_ejecucion(script):
+    """Abre la ejecución con el nombre del script (si no, se usa sys.argv[0])."""
+    global _EJECUCION
+    _EJECUCION = Ejecucion(script)
+    return _EJECUCION
+
+
+def _ejecucion_actual():
+    if _EJECUCION is None:
+        nombre = os.path.splitext(os.path.basename(sys.argv[0] or "interactivo"))[0] or "interactivo"
+        iniciar_ejecucion(nombre)
+    return _EJECUCION
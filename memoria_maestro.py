@@ -0,0 +1,182 @@
+# memoria_maestro.py
+
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from particiones import archivos_tabla, leer_csvs
+
+# -----------------------------------------------------------------------------
+# Compactación en memoria del dataset maestro: categóricas para los textos de
+# baja cardinalidad, el tipo numérico más pequeño que no pierde información
+# (los indicadores 0/1 como es_internacional quedan en int8, así siguen siendo
+# numéricos en describe() y en los conteos) y fechas. El esquema resultante se guarda junto al maestro para
+# que EDA, clustering y reglas lo carguen ya compacto.
+# -----------------------------------------------------------------------------
+
+CARPETA_ENRIQ = "datos_enriquecidos"
+TABLA_MAESTRO = "dataset_maestro_facturas"
+
+# Un texto pasa a categórica si tiene menos valores distintos que esta fracción de filas
+UMBRAL_CATEGORICA = 0.5
+
+COLUMNAS_FECHA = ["fecha_factura"]
+# Siempre codificadas por diccionario, sea cual sea su cardinalidad
+COLUMNAS_DICCIONARIO = ["proveedor_principal"]
+
+
+def _hay_pyarrow():
+    try:
+        import pyarrow  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def _tipo_numerico(serie):
+    """Tipo más pequeño que representa exactamente todos los valores de la serie."""
+    if pd.api.types.is_integer_dtype(serie):
+        return pd.to_numeric(serie, downcast="integer").dtype
+    valores = serie.dropna()
+    if len(valores) == len(serie) and len(valores) and (valores == np.round(valores)).all():
+        return pd.to_numeric(valores, downcast="integer").dtype
+    if (valores.astype(np.float32).astype(np.float64) == valores).all():
+        return np.dtype(np.float32)
+    return np.dtype(np.float64)
+
+
+def esquema_compacto(df, umbral_categorica=UMBRAL_CATEGORICA):
+    """Decide el tipo compacto de cada columna: {columna: dtype en texto}."""
+    texto_grande = "string[pyarrow]" if _hay_pyarrow() else "object"
+    esquema = {}
+    for col in df.columns:
+        serie = df[col]
+        if col in COLUMNAS_FECHA or pd.api.types.is_datetime64_any_dtype(serie):
+            esquema[col] = "datetime64[ns]"
+        elif pd.api.types.is_bool_dtype(serie):
+            esquema[col] = "bool"
+        elif pd.api.types.is_numeric_dtype(serie):
+            esquema[col] = str(_tipo_numerico(serie))
+        elif col in COLUMNAS_DICCIONARIO or serie.nunique(dropna=True) <= umbral_categorica * max(len(serie), 1):
+            esquema[col] = "category"
+        else:
+            esquema[col] = texto_grande
+    return esquema
+
+
+def aplicar_esquema(df, esquema):
+    """Convierte las columnas de df a los tipos del esquema (sin copiar las demás)."""
+    df = df.copy(deep=False)
+    for col, tipo in esquema.items():
+        if col not in df.columns:
+            continue
+        if tipo == "bool":
+            # Con nulos se usa el booleano nullable: un nulo no se vuelve False
+            df[col] = df[col].astype("boolean" if df[col].isna().any() else bool)
+        elif tipo.startswith("datetime"):
+            df[col] = pd.to_datetime(df[col], errors="coerce")
+        elif tipo == "string[pyarrow]" and not _hay_pyarrow():
+            df[col] = df[col].astype(object)
+        else:
+            df[col] = df[col].astype(tipo)
+    return df
+
+
+def compactar(df, umbral_categorica=UMBRAL_CATEGORICA):
+    """Devuelve (df_compacto, esquema)."""
+    esquema = esquema_compacto(df, umbral_categorica)
+    return aplicar_esquema(df, esquema), esquema
+
+
+def reporte_memoria(df_antes, df_despues):
+    """Memoria por columna (bytes, con deep=True) antes y después de compactar."""
+    antes = df_antes.memory_usage(deep=True, index=False)
+    despues = df_despues.memory_usage(deep=True, index=False)
+    reporte = pd.DataFrame({
+        "dtype_antes": df_antes.dtypes.astype(str),
+        "dtype_despues": df_despues.dtypes.astype(str),
+        "bytes_antes": antes,
+        "bytes_despues": despues,
+    })
+    reporte["factor"] = (reporte["bytes_antes"] / reporte["bytes_despues"].where(reporte["bytes_despues"] > 0)).round(1)
+    reporte.loc["TOTAL"] = ["", "", antes.sum(), despues.sum(), round(antes.sum() / max(despues.sum(), 1), 1)]
+    return reporte
+
+
+def archivo_esquema(carpeta=CARPETA_ENRIQ):
+    return os.path.join(carpeta, f"{TABLA_MAESTRO}.esquema.json")
+
+
+def compactar_maestro(carpeta=CARPETA_ENRIQ):
+    """
+    Paso posterior a build_dataset_maestro: calcula el esquema compacto, lo
+    guarda junto al maestro y escribe/imprime el reporte de memoria por columna.
+    El maestro que se carga con el CSV "tal cual" (object/float64/int64) es la
+    referencia del "antes". Las cifras son DataFrame.memory_usage(deep=True)
+    de ambas versiones, no el RSS del proceso (que incluye el intérprete, las
+    librerías y las copias temporales de la lectura).
+    """
+    referencia = pd.read_csv(os.path.join(carpeta, f"{TABLA_MAESTRO}.csv"), low_memory=False)
+    compacto, esquema = compactar(referencia)
+    with open(archivo_esquema(carpeta), "w", encoding="utf-8") as f:
+        json.dump(esquema, f, ensure_ascii=False, indent=2)
+
+    reporte = reporte_memoria(referencia, compacto)
+    reporte.to_csv(os.path.join(carpeta, f"{TABLA_MAESTRO}.memoria.csv"), encoding="utf-8-sig")
+    total = reporte.loc["TOTAL"]
+    print(f"Maestro compacto: {total['bytes_antes'] / 2**20:,.1f} MiB -> "
+          f"{total['bytes_despues'] / 2**20:,.1f} MiB según memory_usage(deep=True) ({total['factor']}x; "
+          f"no es RSS). "
+          f"Esquema en: {archivo_esquema(carpeta)}")
+    return esquema
+
+
+# -----------------------------------------------------------------------------
+# CARGA COMPACTA
+# -----------------------------------------------------------------------------
+
+def leer_compacto(rutas, ruta_esquema=None):
+    """
+    Lee uno o varios CSV del maestro directamente con los tipos compactos
+    (las categóricas se leen como tales, sin pasar por columnas object
+    completas). Sin esquema guardado se compacta después de leer.
+    """
+    rutas = [rutas] if isinstance(rutas, str) else list(rutas)
+    if not rutas:
+        return pd.DataFrame()
+    ruta_esquema = ruta_esquema or archivo_esquema(CARPETA_ENRIQ)
+    if not os.path.exists(ruta_esquema):
+        return compactar(leer_csvs(rutas, low_memory=False))[0]
+
+    with open(ruta_esquema, encoding="utf-8") as f:
+        esquema = json.load(f)
+    if not _hay_pyarrow():
+        esquema = {c: ("object" if t == "string[pyarrow]" else t) for c, t in esquema.items()}
+    # Booleanos, fechas y enteros (que en un subconjunto podrían traer nulos) se convierten tras leer
+    directos = {c: t for c, t in esquema.items()
+                if t == "category" or t.startswith("float") or t in ("object", "string[pyarrow]")}
+    fechas = [c for c, t in esquema.items() if t.startswith("datetime")]
+
+    partes = [pd.read_csv(r, dtype=directos, parse_dates=fechas, low_memory=False) for r in rutas]
+    if len(partes) > 1:
+        # Unificar las categorías para que concat conserve el tipo categórico
+        for col, tipo in directos.items():
+            if tipo == "category" and all(col in p.columns for p in partes):
+                categorias = pd.api.types.union_categoricals([p[col] for p in partes]).categories
+                for p in partes:
+                    p[col] = p[col].cat.set_categories(categorias)
+    df = pd.concat(partes, ignore_index=True) if len(partes) > 1 else partes[0]
+
+    resto = {c: t for c, t in esquema.items() if c in df.columns and c not in directos and c not in fechas}
+    for col, tipo in resto.items():
+        if tipo != "bool" and df[col].isna().any():
+            df[col] = df[col].astype(np.float64 if tipo.startswith("int64") else np.float32)
+    return aplicar_esquema(df, {c: t for c, t in resto.items() if t == "bool" or not df[c].isna().any()})
+
+
+def cargar_maestro(carpeta=CARPETA_ENRIQ, desde=None, hasta=None):
+    """Carga el maestro compacto (completo o solo las particiones del rango de fechas)."""
+    rutas = archivos_tabla(carpeta, TABLA_MAESTRO, desde, hasta)
+    return leer_compacto(rutas, archivo_esquema(carpeta))
@@ -0,0 +1,437 @@
+# motor_reglas.py
+
+import math
+from concurrent.futures import ProcessPoolExecutor
+from itertools import combinations
+
+import numpy as np
+import pandas as pd
+
+# -----------------------------------------------------------------------------
+# 1. DEFINICIONES
+# -----------------------------------------------------------------------------
+
+# Columnas de la tabla de reglas (mismo formato que reglas_asociacion.csv / mlxtend)
+COLUMNAS_REGLAS = [
+    'antecedents', 'consequents',
+    'antecedent support', 'consequent support', 'support',
+    'confidence', 'lift', 'representativity', 'leverage', 'conviction',
+    'zhangs_metric', 'jaccard', 'certainty', 'kulczynski',
+]
+
+# Columnas que se usan como ítems de cada factura en el análisis de asociación
+COLUMNAS_TRANSACCION = ['proveedor_principal', 'destino_ciudad', 'genero', 'rango_edades']
+
+
+class Transacciones:
+    """
+    Transacciones en formato vertical: para cada ítem frecuente se guarda el
+    conjunto de facturas que lo contienen como un bitset (int de Python).
+
+    - n: número de transacciones (filas del DataFrame original).
+    - etiquetas: nombre de cada ítem (valor de la celda).
+    - columnas_items: {etiqueta: columna de origen}.
+    - conteos: número de transacciones que contienen cada ítem.
+    """
+
+    def __init__(self, n, etiquetas, columnas, conteos, codigos, offsets):
+        self.n = n
+        self.etiquetas = etiquetas
+        self.columnas = columnas
+        self.columnas_items = dict(zip(etiquetas, columnas))
+        self.conteos = conteos
+        self.codigos = codigos
+        self.offsets = offsets
+        self._tidsets = {}
+
+    def tidset(self, item):
+        """Devuelve (y cachea) el bitset de facturas que contienen el ítem."""
+        if item not in self._tidsets:
+            j = int(np.searchsorted(self.offsets, item, side='right') - 1)
+            mascara = self.codigos[:, j] == (item - self.offsets[j])
+            bits = np.packbits(mascara, bitorder='little').tobytes()
+            self._tidsets[item] = int.from_bytes(bits, 'little')
+        return self._tidsets[item]
+
+
+# -----------------------------------------------------------------------------
+# 2. CODIFICACIÓN DE TRANSACCIONES
+# -----------------------------------------------------------------------------
+
+def codificar_transacciones(df, columnas=COLUMNAS_TRANSACCION):
+    """
+    Codifica cada columna categórica como enteros (pd.factorize) sin generar
+    el one-hot denso. Cada celda no nula es un ítem de la factura; los nulos
+    simplemente no aportan ítem, así que no hace falta descartar filas.
+    """
+    n = len(df)
+    codigos = np.empty((n, len(columnas)), dtype=np.int32)
+    etiquetas, columnas_items, conteos, offsets = [], [], [], []
+
+    for j, col in enumerate(columnas):
+        cod, valores = pd.factorize(df[col], sort=True)
+        codigos[:, j] = cod
+        offsets.append(len(etiquetas))
+        etiquetas.extend(str(v) for v in valores)
+        columnas_items.extend([col] * len(valores))
+        conteos.extend(np.bincount(cod[cod >= 0], minlength=len(valores)).tolist())
+
+    # Si un mismo valor aparece en dos columnas, se prefija con la columna
+    # (igual que get_dummies) para que las etiquetas sigan siendo únicas
+    vistos = pd.Series(etiquetas).duplicated(keep=False).to_numpy()
+    etiquetas = [f"{c}_{e}" if dup else e for e, c, dup in zip(etiquetas, columnas_items, vistos)]
+
+    return Transacciones(n, etiquetas, columnas_items, np.asarray(conteos, dtype=np.int64),
+                         codigos, np.asarray(offsets, dtype=np.int64))
+
+
+def _submuestra(transacciones, filas):
+    """Transacciones restringidas a las filas dadas (mismos ítems y etiquetas)."""
+    codigos = transacciones.codigos[filas]
+    validos = codigos >= 0
+    items = (codigos + transacciones.offsets[np.newaxis, :])[validos]
+    conteos = np.bincount(items, minlength=len(transacciones.etiquetas)).astype(np.int64)
+    return Transacciones(len(filas), transacciones.etiquetas, transacciones.columnas, conteos,
+                         codigos, transacciones.offsets)
+
+
+def _conteo_minimo(min_support, n):
+    """Menor conteo c tal que c / n >= min_support."""
+    c = max(math.ceil(min_support * n), 1)
+    while c > 1 and (c - 1) / n >= min_support:
+        c -= 1
+    while c / n < min_support:
+        c += 1
+    return c
+
+
+# -----------------------------------------------------------------------------
+# 3. ITEMSETS FRECUENTES (ECLAT SOBRE BITSETS)
+# -----------------------------------------------------------------------------
+
+def _eclat(prefijo, candidatos, columnas, min_count, max_len, resultado):
+    for i, (item, tid, cnt) in enumerate(candidatos):
+        nuevo = prefijo + (item,)
+        resultado.append((nuevo, cnt))
+        if max_len is not None and len(nuevo) >= max_len:
+            continue
+
+        usadas = {columnas[x] for x in nuevo}
+        extensiones = []
+        for item2, tid2, _ in candidatos[i + 1:]:
+            # Dos valores de la misma columna nunca coinciden en una factura
+            if columnas[item2] in usadas:
+                continue
+            inter = tid & tid2
+            c = inter.bit_count()
+            if c >= min_count:
+                extensiones.append((item2, inter, c))
+        if extensiones:
+            _eclat(nuevo, extensiones, columnas, min_count, max_len, resultado)
+
+
+def itemsets_frecuentes(transacciones, min_support=0.01, max_len=None):
+    """
+    Encuentra los itemsets frecuentes con Eclat (representación vertical con
+    bitsets). Devuelve un DataFrame con columnas 'support' e 'itemsets'
+    (frozensets de etiquetas), igual que mlxtend con use_colnames=True.
+    """
+    n = transacciones.n
+    if n == 0:
+        return pd.DataFrame(columns=['support', 'itemsets'])
+
+    min_count = _conteo_minimo(min_support, n)
+    frecuentes = np.flatnonzero(transacciones.conteos >= min_count)
+    candidatos = [(int(i), transacciones.tidset(int(i)), int(transacciones.conteos[i])) for i in frecuentes]
+
+    resultado = []
+    _eclat((), candidatos, transacciones.columnas, min_count, max_len, resultado)
+
+    etiquetas = transacciones.etiquetas
+    return pd.DataFrame({
+        'support': [cnt / n for _, cnt in resultado],
+        'itemsets': [frozenset(etiquetas[i] for i in items) for items, _ in resultado],
+    })
+
+
+# -----------------------------------------------------------------------------
+# 4. REGLAS DE ASOCIACIÓN
+# -----------------------------------------------------------------------------
+
+def _metricas(sAC, sA, sC):
+    """Calcula las métricas de mlxtend (sin valores nulos) de forma vectorizada."""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        confianza = sAC / sA
+        leverage = sAC - sA * sC
+        conviction = np.full(confianza.shape, np.inf)
+        no_seguras = confianza < 1.0
+        conviction[no_seguras] = (1.0 - sC[no_seguras]) / (1.0 - confianza[no_seguras])
+        denom_zhang = np.maximum(sAC * (1 - sA), sA * (sC - sAC))
+        zhang = np.where(denom_zhang == 0, 0, leverage / denom_zhang)
+        certeza = np.where(1 - sC == 0, 0, (confianza - sC) / (1 - sC))
+        return {
+            'antecedent support': sA,
+            'consequent support': sC,
+            'support': sAC,
+            'confidence': confianza,
+            'lift': confianza / sC,
+            'representativity': np.ones_like(sAC),
+            'leverage': leverage,
+            'conviction': conviction,
+            'zhangs_metric': zhang,
+            'jaccard': sAC / (sA + sC - sAC),
+            'certainty': certeza,
+            'kulczynski': (sAC / sA + sAC / sC) / 2,
+        }
+
+
+def reglas_asociacion(itemsets, metric='lift', min_threshold=1.5):
+    """
+    Genera las reglas A -> C de los itemsets frecuentes y se queda con las que
+    cumplen metric >= min_threshold. Devuelve la misma tabla de reglas que
+    mlxtend.association_rules (columnas COLUMNAS_REGLAS).
+    """
+    if metric not in COLUMNAS_REGLAS[2:]:
+        raise ValueError(f"Métrica desconocida: '{metric}'.")
+
+    soportes = dict(zip(itemsets['itemsets'], itemsets['support']))
+    antecedentes, consecuentes, sAC, sA, sC = [], [], [], [], []
+    for itemset, soporte in soportes.items():
+        if len(itemset) < 2:
+            continue
+        for r in range(len(itemset) - 1, 0, -1):
+            for combo in combinations(itemset, r):
+                a = frozenset(combo)
+                c = itemset - a
+                antecedentes.append(a)
+                consecuentes.append(c)
+                sAC.append(soporte)
+                sA.append(soportes[a])
+                sC.append(soportes[c])
+
+    if not antecedentes:
+        return pd.DataFrame(columns=COLUMNAS_REGLAS)
+
+    metricas = _metricas(np.asarray(sAC), np.asarray(sA), np.asarray(sC))
+    reglas = pd.DataFrame({'antecedents': antecedentes, 'consequents': consecuentes, **metricas})
+    return reglas[reglas[metric] >= min_threshold].reset_index(drop=True)[COLUMNAS_REGLAS]
+
+
+def minar_reglas(df, columnas=COLUMNAS_TRANSACCION, min_support=0.01,
+                 metric='lift', min_threshold=1.5, max_len=None):
+    """
+    Atajo: codifica las transacciones, encuentra los itemsets frecuentes y
+    genera las reglas de asociación sobre el 100% de las facturas.
+    """
+    transacciones = codificar_transacciones(df, columnas)
+    itemsets = itemsets_frecuentes(transacciones, min_support=min_support, max_len=max_len)
+    return reglas_asociacion(itemsets, metric=metric, min_threshold=min_threshold)
+
+
+def reglas_por_umbrales(transacciones, soportes=(0.01, 0.02), confianzas=(0.0,),
+                        lifts=(1.5,), max_len=None):
+    """
+    Mina una sola vez al soporte mínimo más bajo de la rejilla y deriva de ese
+    resultado todas las combinaciones (soporte, confianza, lift).
+
+    Los itemsets frecuentes a un soporte mayor son un subconjunto de los del
+    soporte más bajo, y sus reglas son exactamente las que tienen
+    'support' >= soporte, así que basta con filtrar. Todos los umbrales son
+    mínimos inclusivos (>=), igual que min_support/min_threshold.
+
+    Devuelve un dict {(soporte, confianza, lift): DataFrame de reglas}.
+    """
+    itemsets = itemsets_frecuentes(transacciones, min_support=min(soportes), max_len=max_len)
+    base = reglas_asociacion(itemsets, metric='lift', min_threshold=min(lifts))
+
+    resultado = {}
+    for soporte in sorted(soportes):
+        por_soporte = base[base['support'] >= soporte]
+        for confianza in sorted(confianzas):
+            for lift in sorted(lifts):
+                filtro = (por_soporte['confidence'] >= confianza) & (por_soporte['lift'] >= lift)
+                resultado[(soporte, confianza, lift)] = por_soporte[filtro].reset_index(drop=True)
+    return resultado
+
+
+# -----------------------------------------------------------------------------
+# 5. MINERÍA POR PARTICIÓN (AÑO, REGIÓN, CLUSTER...)
+# -----------------------------------------------------------------------------
+
+def _minar_particion(tarea):
+    """Trabajo de un proceso: mina las reglas de una partición."""
+    valor, transacciones, min_support, metric, min_threshold, max_len = tarea
+    itemsets = itemsets_frecuentes(transacciones, min_support=min_support, max_len=max_len)
+    reglas = reglas_asociacion(itemsets, metric=metric, min_threshold=min_threshold)
+    reglas.insert(0, 'particion', valor)
+    reglas.insert(1, 'n_transacciones', transacciones.n)
+    return reglas
+
+
+def minar_por_particion(df, columna_particion, columnas=COLUMNAS_TRANSACCION, min_support=0.01,
+                        metric='lift', min_threshold=1.5, max_len=None, n_procesos=None):
+    """
+    Divide las facturas según 'columna_particion' (p. ej. anio_factura,
+    region_colombia o cluster), mina cada partición en un pool de procesos y
+    devuelve todas las reglas juntas, etiquetadas con 'particion' y
+    'n_transacciones'. El soporte de cada regla es relativo a su partición.
+
+    Las transacciones se codifican una sola vez sobre todo el DataFrame y cada
+    proceso recibe solo los códigos de sus filas con las etiquetas comunes:
+    así un mismo ítem tiene la misma etiqueta en todas las particiones (un
+    valor repetido entre columnas se prefija aunque en alguna partición solo
+    aparezca en una de ellas) y comparar_particiones empareja bien las reglas.
+    """
+    completas = codificar_transacciones(df, columnas)
+    grupos = df.groupby(columna_particion, sort=True).indices
+    tareas = [
+        (valor, _submuestra(completas, filas), min_support, metric, min_threshold, max_len)
+        for valor, filas in grupos.items()
+    ]
+    print(f"Minando {len(tareas)} particiones de '{columna_particion}'...")
+
+    if n_procesos == 1 or len(tareas) <= 1:
+        resultados = [_minar_particion(t) for t in tareas]
+    else:
+        with ProcessPoolExecutor(max_workers=n_procesos) as executor:
+            resultados = list(executor.map(_minar_particion, tareas))
+
+    resultados = [r for r in resultados if not r.empty]
+    if not resultados:
+        return pd.DataFrame(columns=['particion', 'n_transacciones'] + COLUMNAS_REGLAS)
+    return pd.concat(resultados, ignore_index=True)
+
+
+def comparar_particiones(reglas_particionadas, metrica='lift'):
+    """
+    Tabla comparativa de una métrica entre particiones: una fila por regla
+    (antecedents, consequents), una columna por partición, y además
+    'n_particiones' (en cuántas aparece) y 'deriva' (máx - mín). Para
+    particiones ordenadas (años) añade 'delta_<a>_<b>' entre consecutivas.
+    """
+    tabla = reglas_particionadas.pivot_table(
+        index=['antecedents', 'consequents'], columns='particion', values=metrica, aggfunc='first'
+    )
+    particiones = list(tabla.columns)
+    tabla['n_particiones'] = tabla[particiones].notna().sum(axis=1)
+    tabla['deriva'] = tabla[particiones].max(axis=1) - tabla[particiones].min(axis=1)
+    for a, b in zip(particiones, particiones[1:]):
+        tabla[f'delta_{a}_{b}'] = tabla[b] - tabla[a]
+    tabla.columns.name = None
+    return tabla.sort_values('deriva', ascending=False).reset_index()
+
+
+# -----------------------------------------------------------------------------
+# 6. MUESTREO PROGRESIVO CON COTAS DE ERROR
+# -----------------------------------------------------------------------------
+
+def radio_hoeffding(n, delta, poblacion=None):
+    """
+    Semiancho e tal que |p_muestra - p| <= e con probabilidad >= 1 - delta
+    para una proporción estimada con n observaciones (cota de Hoeffding).
+    Con 'poblacion' se aplica la corrección de Serfling para muestreo sin
+    reemplazo; si la muestra es toda la población el radio es 0.
+    """
+    n = np.asarray(n, dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        radio = np.sqrt(np.log(2 / delta) / (2 * n))
+        if poblacion is not None:
+            poblacion = np.asarray(poblacion, dtype=float)
+            radio = np.where(n >= poblacion, 0.0, radio * np.sqrt(np.clip(1 - (n - 1) / poblacion, 0, 1)))
+    return np.where(n > 0, radio, 1.0)
+
+
+def intervalos_reglas(reglas, n, poblacion, delta):
+    """
+    Añade a la tabla de reglas (estimada con n de 'poblacion' transacciones)
+    los intervalos de Hoeffding de support y confidence, y el de lift que se
+    deriva de ellos: [conf_inf / sC_sup, conf_sup / sC_inf]. El radio de la
+    confianza usa las n_A facturas de la muestra que contienen el antecedente
+    (su población se estima con la fracción muestreada).
+    """
+    reglas = reglas.copy()
+    fraccion = n / poblacion
+    n_a = np.rint(reglas['antecedent support'].to_numpy(dtype=float) * n)
+    r_soporte = float(radio_hoeffding(n, delta, poblacion))
+    r_confianza = radio_hoeffding(n_a, delta, n_a / fraccion)
+
+    for col, radio in (('support', r_soporte), ('confidence', r_confianza)):
+        valores = reglas[col].to_numpy(dtype=float)
+        reglas[f'{col}_inf'] = np.clip(valores - radio, 0, 1)
+        reglas[f'{col}_sup'] = np.clip(valores + radio, 0, 1)
+    sc = reglas['consequent support'].to_numpy(dtype=float)
+    with np.errstate(divide='ignore'):
+        reglas['lift_inf'] = reglas['confidence_inf'] / np.clip(sc + r_soporte, 0, 1)
+        reglas['lift_sup'] = np.where(sc - r_soporte > 0, reglas['confidence_sup'] / (sc - r_soporte), np.inf)
+    return reglas
+
+
+def n_para_radio(tolerancia, delta):
+    """Observaciones necesarias para que el radio de Hoeffding (sin corrección) sea <= tolerancia."""
+    return math.ceil(math.log(2 / delta) / (2 * tolerancia ** 2))
+
+
+def minar_progresivo(df, columnas=COLUMNAS_TRANSACCION, min_support=0.01, metric='lift', min_threshold=1.5,
+                     max_len=None, tolerancia=0.02, delta=0.05, top=20, factor=2, semilla=42):
+    """
+    Mina las reglas sobre muestras crecientes de las facturas (prefijos de una
+    permutación aleatoria: cada muestra contiene a la anterior) en lugar de
+    fijar una fracción. Se detiene cuando, para las 'top' reglas con mayor
+    'metric', el radio de Hoeffding de support y confidence es <= tolerancia
+    (con probabilidad >= 1 - delta ninguna estimación se aleja más que eso
+    del valor exacto) y todas ya estaban entre las reglas de la muestra
+    anterior; en el peor caso llega al total (resultado exacto). El historial
+    registra además cuánto cambiaron sus estimaciones entre muestras.
+
+    'delta' es la probabilidad de error conjunta: cada intervalo usa
+    delta / (2 * top) (cota de la unión sobre las dos métricas de las reglas
+    principales). La primera muestra es la menor con radio de soporte <=
+    tolerancia; las siguientes crecen al menos 'factor' veces, o hasta el
+    tamaño en que el antecedente menos frecuente de las reglas principales
+    alcanzaría ese mismo radio para la confianza. Las reglas cuyo intervalo
+    de soporte cruza min_support son frontera: con otra muestra podrían no estar.
+
+    Devuelve (reglas con columnas *_inf/*_sup, historial por muestra).
+    """
+    total = len(df)
+    if total == 0:
+        return pd.DataFrame(columns=COLUMNAS_REGLAS), pd.DataFrame()
+
+    # Se codifica una sola vez; cada muestra es un subconjunto de filas de los códigos
+    completas = codificar_transacciones(df, columnas)
+    orden = np.random.default_rng(semilla).permutation(total)
+    delta_intervalo = delta / (2 * top)
+    n_requerido = n_para_radio(tolerancia, delta_intervalo)
+    n = min(n_requerido, total)
+    historial, previas = [], None
+    while True:
+        transacciones = _submuestra(completas, np.sort(orden[:n]))
+        r_soporte = float(radio_hoeffding(n, delta_intervalo, total))
+        itemsets = itemsets_frecuentes(transacciones, min_support=min_support, max_len=max_len)
+        reglas = reglas_asociacion(itemsets, metric=metric, min_threshold=min_threshold)
+        reglas = intervalos_reglas(reglas, n, total, delta_intervalo)
+        reglas = reglas.sort_values([metric, 'support'], ascending=False, kind='stable').reset_index(drop=True)
+
+        estimadas = reglas.set_index(['antecedents', 'consequents'])
+        principales = estimadas.head(top)
+        n_a = np.rint(principales['antecedent support'].to_numpy(dtype=float) * n)
+        radio = max([r_soporte] + list(radio_hoeffding(n_a, delta_intervalo, n_a * total / n)))
+        # Cambio de las reglas principales respecto a su estimación en la muestra anterior
+        # (si alguna no estaba entre las reglas anteriores, la muestra aún no es estable)
+        if previas is None or not principales.index.isin(previas.index).all():
+            cambio = np.inf
+        else:
+            dif = principales[['support', 'confidence']] - previas.loc[principales.index, ['support', 'confidence']]
+            cambio = float(dif.abs().to_numpy().max()) if len(principales) else 0.0
+        historial.append({'n_muestra': n, 'fraccion': n / total, 'n_reglas': len(reglas),
+                          'radio_max': radio, 'cambio_max': cambio})
+        print(f"Muestra de {n:,} facturas ({n / total:.1%}): {len(reglas)} reglas, "
+              f"radio máx. {radio:.4f}, cambio máx. {cambio:.4f}")
+
+        if n >= total or (radio <= tolerancia and np.isfinite(cambio)):
+            return reglas, pd.DataFrame(historial)
+        previas = estimadas
+        siguiente = n * factor
+        if len(n_a) and n_a.min() > 0:
+            siguiente = max(siguiente, n * n_requerido / n_a.min())
+        n = min(total, math.ceil(siguiente))
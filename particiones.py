@@ -0,0 +1,163 @@
+# particiones.py
+
+import os
+import shutil
+
+import pandas as pd
+
+# -----------------------------------------------------------------------------
+# Disposición particionada estilo Hive de las salidas del pipeline:
+#
+#     <carpeta>/<tabla>/anio=2017/mes=03/datos.csv
+#
+# Cada tabla se escribe además de su CSV plano (<carpeta>/<tabla>.csv), así
+# que los lectores sin rango de fechas siguen leyendo el archivo de siempre y
+# los que piden un rango solo abren las particiones de ese rango.
+# -----------------------------------------------------------------------------
+
+ARCHIVO_PARTICION = "datos.csv"
+SIN_FECHA = "sin_fecha"
+COLUMNA_FECHA = "fecha_factura"
+
+
+def claves_particion(fechas):
+    """Año y mes ('2017', '03') de cada fecha; las fechas nulas van a 'sin_fecha'."""
+    fechas = pd.to_datetime(pd.Series(fechas), errors="coerce")
+    anio = fechas.dt.strftime("%Y").fillna(SIN_FECHA)
+    mes = fechas.dt.strftime("%m").fillna(SIN_FECHA)
+    return anio, mes
+
+
+def fechas_por_clave(df, df_facturas, clave):
+    """
+    Fecha de factura de cada fila de 'df' buscada por 'clave' (no_factura o
+    id_cliente) en la tabla de facturas; sirve para particionar clientes y
+    proveedores, que no tienen fecha propia.
+    """
+    fechas = df_facturas.drop_duplicates(subset=[clave]).set_index(clave)[COLUMNA_FECHA]
+    return df[clave].map(fechas)
+
+
+def escribir_particionado(df, carpeta_tabla, fechas=None, modo="todo"):
+    """
+    Escribe 'df' particionado por año/mes de 'fechas' (por defecto su columna
+    fecha_factura). Modos:
+      - 'todo': reemplaza la tabla particionada completa.
+      - 'particiones': reemplaza solo las particiones presentes en 'df'.
+      - 'agregar': añade las filas al final de cada partición.
+    """
+    if modo not in ("todo", "particiones", "agregar"):
+        raise ValueError(f"Modo de escritura desconocido: '{modo}'.")
+    if fechas is None:
+        fechas = df[COLUMNA_FECHA]
+    anio, mes = claves_particion(fechas)
+
+    if modo == "todo" and os.path.isdir(carpeta_tabla):
+        shutil.rmtree(carpeta_tabla)
+
+    n_particiones = 0
+    for (a, m), sub in df.groupby([anio.to_numpy(), mes.to_numpy()], sort=True):
+        carpeta = os.path.join(carpeta_tabla, f"anio={a}", f"mes={m}")
+        os.makedirs(carpeta, exist_ok=True)
+        ruta = os.path.join(carpeta, ARCHIVO_PARTICION)
+        if modo == "agregar":
+            anexar_csv(sub, ruta)
+        else:
+            sub.to_csv(ruta, index=False, encoding="utf-8-sig")
+        n_particiones += 1
+    print(f"Tabla particionada por año/mes en: {carpeta_tabla} ({n_particiones} particiones)")
+    return n_particiones
+
+
+def anexar_csv(df, ruta):
+    """
+    Añade las filas de df al final de un CSV, alineando las columnas con su
+    cabecera; si el archivo no existe lo crea con cabecera.
+    """
+    if not os.path.exists(ruta) or os.path.getsize(ruta) == 0:
+        df.to_csv(ruta, index=False, encoding="utf-8-sig")
+        return
+    columnas = pd.read_csv(ruta, nrows=0, encoding="utf-8-sig").columns
+    df.reindex(columns=columnas).to_csv(ruta, mode="a", header=False, index=False, encoding="utf-8")
+
+
+def listar_particiones(carpeta_tabla):
+    """Lista [(anio, mes, ruta)] de las particiones existentes, ordenadas."""
+    particiones = []
+    if not os.path.isdir(carpeta_tabla):
+        return particiones
+    for dir_anio in sorted(os.listdir(carpeta_tabla)):
+        if not dir_anio.startswith("anio="):
+            continue
+        for dir_mes in sorted(os.listdir(os.path.join(carpeta_tabla, dir_anio))):
+            ruta = os.path.join(carpeta_tabla, dir_anio, dir_mes, ARCHIVO_PARTICION)
+            if dir_mes.startswith("mes=") and os.path.exists(ruta):
+                particiones.append((dir_anio[len("anio="):], dir_mes[len("mes="):], ruta))
+    return particiones
+
+
+def _limite(valor, fin):
+    """'2017', '2017-03' o '2017-03-15' -> (anio, mes); un año solo cubre el año completo."""
+    if valor is None:
+        return None
+    partes = str(valor).strip().split("-")
+    anio = int(partes[0])
+    mes = int(partes[1][:2]) if len(partes) > 1 else (12 if fin else 1)
+    return anio, mes
+
+
+def _en_rango(anio, mes, desde, hasta):
+    if SIN_FECHA in (anio, mes):
+        return False
+    periodo = (int(anio), int(mes))
+    return (desde is None or periodo >= desde) and (hasta is None or periodo <= hasta)
+
+
+def archivos_tabla(carpeta, nombre, desde=None, hasta=None):
+    """
+    Archivos a leer para la tabla 'nombre' en el rango [desde, hasta] (año o
+    año-mes, inclusivo). Sin rango devuelve el CSV plano si existe; con rango,
+    solo las particiones que caen dentro (las filas sin fecha quedan fuera).
+    """
+    ruta_plana = os.path.join(carpeta, f"{nombre}.csv")
+    carpeta_tabla = os.path.join(carpeta, nombre)
+    if desde is None and hasta is None:
+        if os.path.exists(ruta_plana):
+            return [ruta_plana]
+        return [ruta for _, _, ruta in listar_particiones(carpeta_tabla)]
+
+    if not os.path.isdir(carpeta_tabla):
+        raise FileNotFoundError(
+            f"No existe la tabla particionada '{carpeta_tabla}'. Vuelve a ejecutar el pipeline para generarla."
+        )
+    desde, hasta = _limite(desde, fin=False), _limite(hasta, fin=True)
+    return [ruta for a, m, ruta in listar_particiones(carpeta_tabla) if _en_rango(a, m, desde, hasta)]
+
+
+def leer_csvs(rutas, **kwargs):
+    """Lee y concatena una lista de CSV (p. ej. las particiones de un rango)."""
+    if not rutas:
+        return pd.DataFrame()
+    if len(rutas) == 1:
+        return pd.read_csv(rutas[0], **kwargs)
+    return pd.concat([pd.read_csv(ruta, **kwargs) for ruta in rutas], ignore_index=True)
+
+
+def leer_tabla(carpeta, nombre, desde=None, hasta=None, **kwargs):
+    """
+    Lee la tabla 'nombre' de 'carpeta' limitada al rango de fechas pedido,
+    abriendo solo las particiones necesarias. Si la tabla aún no está
+    particionada se lee el CSV plano y se filtra por fecha_factura.
+    """
+    ruta_plana = os.path.join(carpeta, f"{nombre}.csv")
+    en_rango = desde is not None or hasta is not None
+    if en_rango and not os.path.isdir(os.path.join(carpeta, nombre)) and os.path.exists(ruta_plana):
+        df = pd.read_csv(ruta_plana, **kwargs)
+        if COLUMNA_FECHA not in df.columns:
+            raise ValueError(f"'{ruta_plana}' no está particionada ni tiene '{COLUMNA_FECHA}' para filtrar.")
+        anio, mes = claves_particion(df[COLUMNA_FECHA])
+        li, ls = _limite(desde, fin=False), _limite(hasta, fin=True)
+        dentro = [_en_rango(a, m, li, ls) for a, m in zip(anio, mes)]
+        return df[dentro].reset_index(drop=True)
+
+    return leer_csvs(archivos_tabla(carpeta, nombre, desde, hasta), **kwargs)
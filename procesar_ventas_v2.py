@@ -1,7 +1,9 @@
-import pandas as pd
+import argparse
+import csv
 import glob
 import os
-import numpy as np
+import re
+import unicodedata
 
 # -----------------------------------------------------------------------------
 # 1. DEFINICIÓN DE COLUMNAS
@@ -15,6 +17,10 @@ COLUMNAS_DESEADAS = [
     'Rango Edades',
     'Genero',
     'Zonas Ciudades Cli',
+    'Anio Mes Compro 1ra Poliza',
+    'Rango Vlr Anticipos Polizas',
+    'Rango Vlr Disponible Polizas',
+    'Empresa Cvu Cv',
     'Fecha Factura',
     'Ciudad Destino', # <-- AÑADIDO
     'Nombre Proveedor',
@@ -33,6 +39,10 @@ MAPEO_NOMBRES = {
     'Rango Edades': 'rango_edades',
     'Genero': 'genero',
     'Zonas Ciudades Cli': 'zonas_ciudades_cli',
+    'Anio Mes Compro 1ra Poliza': 'anio_mes_1ra_poliza',
+    'Rango Vlr Anticipos Polizas': 'rango_vlr_anticipos',
+    'Rango Vlr Disponible Polizas': 'rango_vlr_disponible',
+    'Empresa Cvu Cv': 'empresa_cvu',
     'Fecha Factura': 'fecha_factura',
     'Ciudad Destino': 'ciudad_destino', # <-- AÑADIDO
     'Nombre Proveedor': 'nombre_proveedor',
@@ -43,8 +53,48 @@ MAPEO_NOMBRES = {
     'Valor Total Neto Item Factura': 'vlr_total_neto_item_factura'
 }
 
-# Columnas de atributos que definen a un cliente
-COLUMNAS_ATRIBUTOS_CLIENTE = ['estado_civil', 'pais_residencia', 'cant_polizas', 'rango_edades', 'genero', 'zonas_ciudades_cli']
+# Orden canónico de las columnas ya renombradas
+COLUMNAS_LIMPIAS = [MAPEO_NOMBRES[c] for c in COLUMNAS_DESEADAS]
+
+# Otros nombres con que aparecen las columnas en versiones anteriores/posteriores
+# de la exportación. La comparación ignora mayúsculas, tildes y puntuación, así
+# que basta con registrar las variantes que cambian palabras.
+ALIAS_COLUMNAS = {
+    'Estado Civil': ['Estado Civil Cliente'],
+    'Pais Residencia': ['Pais de Residencia', 'Pais Residencia Cliente'],
+    'Cant Polizas': ['Cantidad Polizas', 'Cant. de Polizas', 'Numero Polizas'],
+    'Rango Edades': ['Rango Edad', 'Rango de Edad'],
+    'Genero': ['Sexo', 'Genero Cliente'],
+    'Zonas Ciudades Cli': ['Zona Ciudad Cli', 'Zona Ciudad Cliente', 'Zonas Ciudades Cliente'],
+    'Anio Mes Compro 1ra Poliza': ['Anio Mes Compra 1ra Poliza', 'Anio Mes Primera Poliza'],
+    'Rango Vlr Anticipos Polizas': ['Rango Valor Anticipos Polizas'],
+    'Rango Vlr Disponible Polizas': ['Rango Valor Disponible Polizas'],
+    'Empresa Cvu Cv': ['Empresa Cvu'],
+    'Fecha Factura': ['Fecha de Factura', 'Fecha Fact'],
+    'Ciudad Destino': ['Destino', 'Ciudad de Destino'],
+    'Nombre Proveedor': ['Proveedor', 'Razon Social Proveedor'],
+    'Valor Presupuesto Servicios Ppto': ['Valor Presupuesto Servicios', 'Vlr Presupuesto Servicios Ppto'],
+    'No. Factura': ['Numero Factura', 'Nro Factura', 'No Fact'],
+    'Valor Total Neto Factura': ['Vlr Total Neto Factura'],
+    'Valor Total Item Factura': ['Vlr Total Item Factura'],
+    'Valor Total Neto Item Factura': ['Vlr Total Neto Item Factura'],
+}
+
+# Columnas de texto que se leen como tales (el resto se deja a la inferencia y
+# limpiar_datos las convierte con errors='coerce')
+COLUMNAS_TEXTO = ['estado_civil', 'pais_residencia', 'rango_edades', 'genero',
+                  'zonas_ciudades_cli', 'anio_mes_1ra_poliza', 'rango_vlr_anticipos',
+                  'rango_vlr_disponible', 'empresa_cvu', 'ciudad_destino', 'nombre_proveedor']
+
+# Columnas de atributos que definen a un cliente (las de COLUMNAS_BLOQUEO de la
+# resolución, para poder sembrarla desde clientes.csv)
+COLUMNAS_ATRIBUTOS_CLIENTE = ['estado_civil', 'pais_residencia', 'cant_polizas', 'rango_edades', 'genero', 'zonas_ciudades_cli',
+                              'anio_mes_1ra_poliza', 'rango_vlr_anticipos', 'rango_vlr_disponible', 'empresa_cvu']
+# Cómo se asignan los clientes a las facturas: 'factura' (OPCIÓN 1: un cliente
+# por factura) o 'resolucion' (clientes reales por atributos + cercanía de
+# fechas, ver resolucion_clientes.py; opcional mientras se valida el cruce)
+MODOS_CLIENTES = ('resolucion', 'factura')
+MODO_CLIENTES = 'factura'
 # Columnas para la tabla final de Factura
 # NOTA: 'id_cliente' se añadirá durante el procesamiento
 COLUMNAS_FACTURA_FINAL = [
@@ -59,13 +109,119 @@ COLUMNAS_FACTURA_FINAL = [
 # Columnas para la tabla de Proveedores
 COLUMNAS_PROVEEDOR_FACTURA = ['no_factura', 'nombre_proveedor', 'vlr_presupuesto_ppto']
 
+def crear_parser():
+    parser = argparse.ArgumentParser(description="Consolida, limpia y normaliza las exportaciones de ventas.")
+    parser.add_argument("--clientes", choices=MODOS_CLIENTES, default=MODO_CLIENTES,
+                        help="'resolucion' agrupa facturas en clientes reales; 'factura' = un cliente por factura (OPCIÓN 1).")
+    parser.add_argument("--max-dias", type=int, default=None,
+                        help="Días máximos desde la primera factura de un cliente a cualquier otra suya "
+                             "(resolución; por defecto MAX_DIAS de resolucion_clientes.py).")
+    return parser
+
+if __name__ == "__main__":
+    # Los argumentos se leen antes de importar pandas: --help responde al instante
+    args = crear_parser().parse_args()
+
+import numpy as np
+import pandas as pd
+
+from particiones import escribir_particionado, fechas_por_clave
+from instrumentacion import etapa
+from indice_duplicados import IndiceDuplicados
+from resolucion_clientes import ResolucionClientes, MAX_DIAS
+
 # -----------------------------------------------------------------------------
 # 2. FUNCIONES DE PROCESAMIENTO
 # -----------------------------------------------------------------------------
 
-def cargar_y_consolidar(carpeta_entrada):
+def _clave_encabezado(texto):
+    """Forma comparable de un encabezado: minúsculas, sin tildes ni puntuación."""
+    texto = unicodedata.normalize('NFKD', str(texto)).encode('ascii', 'ignore').decode('ascii')
+    return re.sub(r'[^a-z0-9]+', ' ', texto.lower()).strip()
+
+# Encabezado normalizado -> nombre limpio (MAPEO_NOMBRES), incluidos los propios nombres limpios
+_REGISTRO_ENCABEZADOS = {}
+for _original in COLUMNAS_DESEADAS:
+    _limpio = MAPEO_NOMBRES[_original]
+    for _variante in [_original, _limpio] + ALIAS_COLUMNAS.get(_original, []):
+        _REGISTRO_ENCABEZADOS.setdefault(_clave_encabezado(_variante), _limpio)
+
+def leer_cabecera(archivo):
+    """Lee solo la primera línea del CSV (la cabecera) como lista de nombres."""
+    with open(archivo, newline='', encoding='utf-8-sig', errors='replace') as f:
+        return next(csv.reader(f), [])
+
+def plan_lectura(cabecera):
+    """
+    Plan de lectura para una versión de cabecera: posiciones a leer, nombre
+    limpio de cada una, tipos y columnas canónicas que faltan. Si dos columnas
+    corresponden al mismo nombre limpio se usa la primera.
+    """
+    posiciones = {}
+    for i, nombre in enumerate(cabecera):
+        limpio = _REGISTRO_ENCABEZADOS.get(_clave_encabezado(nombre))
+        if limpio is not None and limpio not in posiciones:
+            posiciones[limpio] = i
+    return {
+        'usecols': sorted(posiciones.values()),
+        'nombres': {cabecera[i]: limpio for limpio, i in posiciones.items()},
+        'dtype': {cabecera[i]: str for limpio, i in posiciones.items() if limpio in COLUMNAS_TEXTO},
+        'faltantes': [c for c in COLUMNAS_LIMPIAS if c not in posiciones],
+    }
+
+def registrar_esquemas(archivos):
+    """
+    Registro de esquemas: lee la cabecera de cada archivo una sola vez y arma
+    un plan por versión de cabecera (los archivos con la misma cabecera lo comparten).
+    Devuelve {archivo: plan}.
+    """
+    planes_por_version = {}
+    planes = {}
+    for archivo in archivos:
+        try:
+            cabecera = tuple(leer_cabecera(archivo))
+        except OSError as e:
+            print(f"Error al leer la cabecera de {archivo}: {e}")
+            continue
+        if cabecera not in planes_por_version:
+            planes_por_version[cabecera] = plan_lectura(list(cabecera))
+        planes[archivo] = planes_por_version[cabecera]
+
+    print(f"Registro de esquemas: {len(planes)} archivos, {len(planes_por_version)} versiones de cabecera.")
+    for cabecera, plan in planes_por_version.items():
+        if plan['faltantes']:
+            print(f"Advertencia: una versión de cabecera no trae {plan['faltantes']} (se rellenan con Nulo). "
+                  f"Columnas encontradas: {list(cabecera)}")
+    return planes
+
+def leer_exportacion(archivo, plan=None):
+    """
+    Lee un CSV exportado según su plan de lectura (solo las columnas
+    deseadas, ya con los nombres limpios y en el orden canónico). Devuelve
+    None si el archivo no se pudo leer o no trae ninguna columna conocida.
+    """
+    if plan is None:
+        plan = registrar_esquemas([archivo]).get(archivo)
+    if plan is None:
+        return None
+    if not plan['usecols']:
+        print(f"Advertencia: {archivo} no tiene ninguna de las columnas esperadas; se omite.")
+        return None
+    try:
+        print(f"Cargando archivo: {archivo}...")
+        # Usamos 'on_bad_lines='skip'' por si alguna fila tiene más comas de las esperadas
+        df = pd.read_csv(archivo, usecols=plan['usecols'], dtype=plan['dtype'], on_bad_lines='skip')
+        # Un solo renombrado + reindex: ordena y añade como Nulo las columnas que falten
+        return df.rename(columns=plan['nombres']).reindex(columns=COLUMNAS_LIMPIAS)
+    except Exception as e:
+        print(f"Error al leer el archivo {archivo}: {e}")
+        return None
+
+def cargar_y_consolidar(carpeta_entrada, indice_duplicados=None):
     """
     Carga y une todos los CSV de la carpeta de entrada, leyendo solo las columnas deseadas.
+    Con 'indice_duplicados' (IndiceDuplicados) se descartan, archivo por archivo,
+    las filas repetidas y las facturas+proveedor que ya llegaron en otro archivo.
     """
     print(f"Iniciando el procesamiento de la carpeta: {carpeta_entrada}")
     patron_archivos = os.path.join(carpeta_entrada, "*.csv")
@@ -77,35 +233,18 @@ def cargar_y_consolidar(carpeta_entrada):
 
     print(f"Se encontraron {len(lista_archivos_csv)} archivos CSV.")
     
+    planes = registrar_esquemas(lista_archivos_csv)
     lista_dfs = []
-    for archivo in lista_archivos_csv:
-        try:
-            print(f"Cargando archivo: {archivo}...")
-            # Lee solo las columnas que nos interesan
-            # Usamos 'on_bad_lines='skip'' por si alguna fila tiene más comas de las esperadas
-            df = pd.read_csv(archivo, usecols=lambda c: c in COLUMNAS_DESEADAS, on_bad_lines='skip')
-            
-            # Asegurarse de que todas las columnas deseadas existan, rellenando con NaN si faltan
-            for col in COLUMNAS_DESEADAS:
-                if col not in df.columns:
-                    df[col] = np.nan
-            
-            # Reordenar las columnas para que coincidan con COLUMNAS_DESEADAS
-            df = df[COLUMNAS_DESEADAS]
+    for archivo, plan in planes.items():
+        df = leer_exportacion(archivo, plan)
+        if df is not None:
+            if indice_duplicados is not None:
+                df = indice_duplicados.filtrar(df, archivo)
             lista_dfs.append(df)
             
-        except ValueError as ve:
-            print(f"Advertencia: Posible error de columnas en {archivo}. {ve}")
-            # Intentar leer de nuevo sin la restricción de 'usecols' para ver qué está pasando
-            try:
-                df_test = pd.read_csv(archivo, nrows=1)
-                print(f"Columnas encontradas en el archivo: {df_test.columns.tolist()}")
-            except Exception as e_test:
-                print(f"No se pudo ni siquiera leer la cabecera: {e_test}")
-                
-        except Exception as e:
-            print(f"Error al leer el archivo {archivo}: {e}")
-            
+    if indice_duplicados is not None:
+        indice_duplicados.confirmar()
+
     if not lista_dfs:
         print("No se pudo cargar ningún archivo. Abortando.")
         return None
@@ -140,60 +279,90 @@ def limpiar_datos(df):
     print("Limpieza de tipos completada.")
     return df
 
-def crear_tablas_normalizadas(df_limpio, carpeta_salida):
+def normalizar_tablas(df_limpio, primer_cliente=1, resolucion=None):
     """
-    Crea las 3 tablas normalizadas (Clientes, Facturas, Proveedores_Factura) y las guarda como CSV.
-    OPCIÓN 1: Un ID de Cliente ÚNICO por cada Factura ÚNICA.
+    Separa el DataFrame limpio en las 3 tablas normalizadas
+    (Clientes, Facturas, Proveedores_Factura) sin escribirlas.
+    - Con 'resolucion' (ResolucionClientes) las facturas se agrupan en clientes
+      reales por bloqueo de atributos + cercanía de fechas; la tabla de clientes
+      trae una fila por cada cliente referenciado en df_limpio.
+    - Sin ella, OPCIÓN 1: Un ID de Cliente ÚNICO por cada Factura ÚNICA;
+      'primer_cliente' permite continuar la numeración al anexar lotes.
     """
-    print("\nIniciando normalización de tablas (OPCIÓN 1)...")
-    
     # --- 1. Obtener Facturas Únicas ---
     # Tomamos la primera aparición de cada 'no_factura' para definir al cliente
     print("Identificando facturas únicas para crear clientes...")
     df_facturas_unicas = df_limpio.drop_duplicates(subset=['no_factura'], keep='first').reset_index(drop=True)
     
-    # Crear el ID de Cliente Sintético (cliente_1, cliente_2...)
-    # Habrá un cliente por cada factura única
-    df_facturas_unicas['id_cliente'] = [f'cliente_{i+1}' for i in range(len(df_facturas_unicas))]
+    if resolucion is not None:
+        df_facturas_unicas['id_cliente'] = resolucion.asignar(df_facturas_unicas)
+        print(f"Resolución de clientes: {len(df_facturas_unicas)} facturas agrupadas en "
+              f"{df_facturas_unicas['id_cliente'].nunique()} clientes ({len(resolucion.nuevos)} nuevos).")
+    else:
+        # Crear el ID de Cliente Sintético (cliente_1, cliente_2...)
+        # Habrá un cliente por cada factura única
+        df_facturas_unicas['id_cliente'] = [f'cliente_{i+primer_cliente}' for i in range(len(df_facturas_unicas))]
     
-    # --- 2. Crear Tabla CLIENTE ---
-    # Contiene una fila por cada cliente único (que es uno por factura)
-    print("Creando tabla 'clientes'...")
+    # --- 2. Tabla CLIENTE ---
+    # Una fila por cliente, con los atributos de su primera factura
     # Asegurarse de que todas las columnas de atributos existan
     columnas_cliente_presentes = ['id_cliente'] + [col for col in COLUMNAS_ATRIBUTOS_CLIENTE if col in df_facturas_unicas.columns]
-    df_clientes = df_facturas_unicas[columnas_cliente_presentes]
-    
-    ruta_clientes = os.path.join(carpeta_salida, 'clientes.csv')
-    df_clientes.to_csv(ruta_clientes, index=False, encoding='utf-8-sig')
-    print(f"Tabla 'clientes.csv' guardada con {len(df_clientes)} clientes únicos (uno por factura).")
+    df_clientes = df_facturas_unicas[columnas_cliente_presentes].drop_duplicates(subset=['id_cliente'])
 
-    # --- 3. Crear Tabla FACTURA ---
+    # --- 3. Tabla FACTURA ---
     # Contiene una fila única por factura, con el 'id_cliente' correspondiente
-    print("Creando tabla 'facturas'...")
-    # Asegurarse de que todas las columnas de factura existan
     columnas_factura_presentes = [col for col in COLUMNAS_FACTURA_FINAL if col in df_facturas_unicas.columns]
     df_facturas = df_facturas_unicas[columnas_factura_presentes]
-    
-    ruta_facturas = os.path.join(carpeta_salida, 'facturas.csv')
-    df_facturas.to_csv(ruta_facturas, index=False, encoding='utf-8-sig')
-    print(f"Tabla 'facturas.csv' guardada con {len(df_facturas)} facturas únicas.")
 
-    # --- 4. Crear Tabla PROVEEDOR_FACTURA ---
+    # --- 4. Tabla PROVEEDOR_FACTURA ---
     # Esta tabla usa el df_limpio COMPLETO para encontrar todas las relaciones proveedor-factura
-    print("Creando tabla 'proveedores_por_factura'...")
-     # Asegurarse de que todas las columnas de proveedor existan
     columnas_proveedor_presentes = [col for col in COLUMNAS_PROVEEDOR_FACTURA if col in df_limpio.columns]
     df_proveedores_factura = df_limpio[columnas_proveedor_presentes].drop_duplicates().dropna(subset=['no_factura', 'nombre_proveedor'])
+
+    return df_clientes, df_facturas, df_proveedores_factura
+
+def crear_tablas_normalizadas(df_limpio, carpeta_salida, modo_clientes=MODO_CLIENTES, max_dias=MAX_DIAS):
+    """
+    Crea las 3 tablas normalizadas (Clientes, Facturas, Proveedores_Factura) y las guarda como CSV.
+    modo_clientes='resolucion' agrupa las facturas en clientes reales (ver
+    resolucion_clientes.py); 'factura' es la OPCIÓN 1: Un ID de Cliente ÚNICO
+    por cada Factura ÚNICA.
+    """
+    if modo_clientes not in MODOS_CLIENTES:
+        raise ValueError(f"Modo de clientes desconocido: '{modo_clientes}'. Opciones: {MODOS_CLIENTES}")
+    resolucion = ResolucionClientes(max_dias) if modo_clientes == 'resolucion' else None
+    print(f"\nIniciando normalización de tablas ({'resolución de clientes' if resolucion else 'OPCIÓN 1'})...")
+    df_clientes, df_facturas, df_proveedores_factura = normalizar_tablas(df_limpio, resolucion=resolucion)
     
+    ruta_clientes = os.path.join(carpeta_salida, 'clientes.csv')
+    df_clientes.to_csv(ruta_clientes, index=False, encoding='utf-8-sig')
+    detalle = "resueltos por atributos y fechas" if resolucion else "uno por factura"
+    print(f"Tabla 'clientes.csv' guardada con {len(df_clientes)} clientes únicos ({detalle}).")
+
+    ruta_facturas = os.path.join(carpeta_salida, 'facturas.csv')
+    df_facturas.to_csv(ruta_facturas, index=False, encoding='utf-8-sig')
+    print(f"Tabla 'facturas.csv' guardada con {len(df_facturas)} facturas únicas.")
+
     ruta_proveedores = os.path.join(carpeta_salida, 'proveedores_por_factura.csv')
     df_proveedores_factura.to_csv(ruta_proveedores, index=False, encoding='utf-8-sig')
     print(f"Tabla 'proveedores_por_factura.csv' guardada con {len(df_proveedores_factura)} registros de proveedores.")
+
+    # --- 5. Copia particionada por año/mes de factura (anio=AAAA/mes=MM) ---
+    # Clientes y proveedores no tienen fecha propia: se ubican por la de su factura
+    escribir_particionado(df_clientes, os.path.join(carpeta_salida, 'clientes'),
+                          fechas_por_clave(df_clientes, df_facturas, 'id_cliente'))
+    escribir_particionado(df_facturas, os.path.join(carpeta_salida, 'facturas'))
+    escribir_particionado(df_proveedores_factura, os.path.join(carpeta_salida, 'proveedores_por_factura'),
+                          fechas_por_clave(df_proveedores_factura, df_facturas, 'no_factura'))
     
 # -----------------------------------------------------------------------------
 # 3. EJECUCIÓN PRINCIPAL
 # -----------------------------------------------------------------------------
 
 if __name__ == "__main__":
+    if args.max_dias is None:
+        args.max_dias = MAX_DIAS
+
     # Define la carpeta donde están tus CSVs brutos
     CARPETA_DATOS_ENTRADA = 'datos_csv'
     
@@ -204,17 +373,25 @@ if __name__ == "__main__":
     os.makedirs(CARPETA_DATOS_SALIDA, exist_ok=True)
     
     # --- PASO 1: Cargar y Consolidar ---
-    df_bruto = cargar_y_consolidar(CARPETA_DATOS_ENTRADA)
+    # La corrida completa reingiere todos los archivos: el índice de duplicados
+    # se reinicia y queda sembrado para el servicio de ingesta
+    with etapa("cargar_y_consolidar") as e:
+        indice_duplicados = IndiceDuplicados(os.path.join(CARPETA_DATOS_SALIDA, '.duplicados'), reiniciar=True)
+        df_bruto = cargar_y_consolidar(CARPETA_DATOS_ENTRADA, indice_duplicados)
+        e.filas(salida=0 if df_bruto is None else len(df_bruto))
     
     if df_bruto is not None:
         # --- PASO 2: Limpiar Datos ---
-        df_limpio = limpiar_datos(df_bruto)
+        with etapa("limpiar_datos", filas_entrada=len(df_bruto)) as e:
+            df_limpio = limpiar_datos(df_bruto)
+            e.filas(salida=len(df_limpio))
         
         # --- PASO 3: Crear Tablas Normalizadas ---
-        crear_tablas_normalizadas(df_limpio, CARPETA_DATOS_SALIDA)
+        with etapa("crear_tablas_normalizadas", filas_entrada=len(df_limpio)):
+            crear_tablas_normalizadas(df_limpio, CARPETA_DATOS_SALIDA, args.clientes, args.max_dias)
         
         print("\n" + "="*30)
-        print("¡PROCESO DE NORMALIZACIÓN (OPCIÓN 1) COMPLETADO!")
+        print("¡PROCESO DE NORMALIZACIÓN COMPLETADO!")
         print(f"Tus 3 archivos CSV limpios están en la carpeta: '{CARPETA_DATOS_SALIDA}'")
         print("="*30)
     else:
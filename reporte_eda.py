@@ -0,0 +1,386 @@
+# reporte_eda.py
+
+import hashlib
+import html
+import json
+import os
+import pickle
+import time
+
+import numpy as np
+import pandas as pd
+
+import estadisticas_streaming
+import memoria_maestro
+import resumen_cajas as modulo_cajas
+import sketches
+import top_k_maestro
+from estadisticas_streaming import resumir_csv
+from memoria_maestro import archivo_esquema, leer_compacto
+from resumen_cajas import resumen_cajas, resumen_cajas_sketch, dibujar_cajas
+from top_k_maestro import top_k
+
+# -----------------------------------------------------------------------------
+# 1. DEFINICIONES
+# -----------------------------------------------------------------------------
+
+# Subir esta versión cuando cambie lo que calcula calcular_agregados(),
+# para invalidar los agregados cacheados con el formato anterior
+VERSION_AGREGADOS = 5
+
+CARPETA_CACHE = os.path.join("datos_enriquecidos", ".cache_eda")
+CARPETA_REPORTE = os.path.join("datos_enriquecidos", "reporte_eda")
+
+COLS_NUMERICAS_CLAVE = [
+    "vlr_total_neto_factura",
+    "vlr_total_item_factura",
+    "vlr_total_neto_item_factura",
+    "suma_vlr_presupuesto_ppto",
+    "prom_vlr_presupuesto_ppto",
+    "n_proveedores",
+]
+CAT_COLS_BASICAS = ["genero", "estado_civil", "rango_edades", "region_colombia"]
+COLS_CAJAS = ["destino_continente", "rango_edades"]
+VALOR_CAJAS = "vlr_total_neto_factura"
+# Secciones top-10 del EDA y columna de cada una
+COLS_TOP = {"top_destinos": "destino_ciudad", "top_proveedores": "proveedor_principal"}
+
+
+def _huella_configuracion():
+    """
+    Huella de lo que determina los agregados además de los datos: la versión,
+    las columnas configuradas, el código de los módulos que los calculan y el
+    esquema compacto con que se carga el maestro (cambia los dtypes).
+    """
+    partes = [f"v{VERSION_AGREGADOS}",
+              json.dumps([COLS_NUMERICAS_CLAVE, CAT_COLS_BASICAS, COLS_CAJAS, VALOR_CAJAS, COLS_TOP])]
+    for ruta in [__file__, estadisticas_streaming.__file__, memoria_maestro.__file__, modulo_cajas.__file__,
+                 sketches.__file__, top_k_maestro.__file__, archivo_esquema()]:
+        if os.path.exists(ruta):
+            with open(ruta, "rb") as f:
+                partes.append(hashlib.sha1(f.read()).hexdigest())
+        else:
+            partes.append("-")
+    return "|".join(partes)
+
+
+def ruta_sketches(ruta_dataset):
+    """
+    Sketches top-k del maestro (top_k_maestro.json) con que se responden las
+    secciones top-10, o None. Solo valen para el CSV plano completo (no para
+    un rango de particiones) y si no son anteriores a él.
+    """
+    rutas = [ruta_dataset] if isinstance(ruta_dataset, str) else list(ruta_dataset)
+    if len(rutas) != 1 or os.path.basename(rutas[0]) != "dataset_maestro_facturas.csv":
+        return None
+    ruta = os.path.join(os.path.dirname(rutas[0]), "top_k_maestro.json")
+    if not os.path.exists(ruta) or os.path.getmtime(ruta) < os.path.getmtime(rutas[0]):
+        return None
+    return ruta
+
+
+def tops_sketches(ruta_dataset, k=10):
+    """
+    Top-k de destinos y proveedores leídos de los sketches persistidos, sin
+    recorrer el dataset ({seccion: Serie 'count'} como value_counts().head(k)),
+    o None si no hay sketches vigentes.
+    """
+    ruta = ruta_sketches(ruta_dataset)
+    if ruta is None:
+        return None
+    guardados = top_k_maestro.cargar_sketches(ruta)
+    return {seccion: top_k(col, k, sketches=guardados)["count"] for seccion, col in COLS_TOP.items()}
+
+
+def huella_dataset(ruta):
+    """
+    Huella del dataset basada en ruta, tamaño y fecha de modificación (no lee
+    el archivo, así que comprobarla cuesta milisegundos) más la de la
+    configuración de los agregados. Acepta también una lista de archivos,
+    p. ej. las particiones de un rango de fechas; incluye los sketches top-k
+    si las secciones top-10 salen de ellos.
+    """
+    partes = []
+    sketches_top = ruta_sketches(ruta)
+    for r in ([ruta] if isinstance(ruta, str) else list(ruta)) + ([sketches_top] if sketches_top else []):
+        stat = os.stat(r)
+        partes.append(f"{os.path.abspath(r)}|{stat.st_size}|{stat.st_mtime_ns}")
+    clave = "|".join(partes) + "|" + _huella_configuracion()
+    return hashlib.sha1(clave.encode("utf-8")).hexdigest()[:16]
+
+
+# -----------------------------------------------------------------------------
+# 2. AGREGADOS
+# -----------------------------------------------------------------------------
+
+def calcular_agregados(df, tops=None):
+    """
+    Calcula de una vez todos los resúmenes que muestra el EDA: info, describe,
+    nulos, frecuencias, top destinos/proveedores, histogramas, cajas por grupo
+    y correlaciones. El resultado es pequeño y se puede cachear en disco.
+    'tops' (de tops_sketches) reemplaza los value_counts de las secciones top-10.
+    """
+    numericas = df.select_dtypes(include=[np.number])
+    cols_clave = [c for c in COLS_NUMERICAS_CLAVE if c in df.columns]
+
+    histogramas = {}
+    for col in cols_clave:
+        valores = df[col].dropna().to_numpy()
+        if len(valores):
+            histogramas[col] = np.histogram(valores, bins=50)
+
+    return {
+        "streaming": False,
+        "n_filas": len(df),
+        "info": pd.DataFrame({
+            "no_nulos": df.notna().sum(),
+            "dtype": df.dtypes.astype(str),
+        }),
+        "memoria_bytes": int(df.memory_usage(deep=True).sum()),
+        "describe": numericas.describe().T,
+        "nulos_pct": (df.isna().mean() * 100).round(2).sort_values(ascending=False),
+        "frecuencias": {col: df[col].value_counts(dropna=False) for col in CAT_COLS_BASICAS if col in df.columns},
+        "internacional": df["es_internacional"].value_counts().sort_index(),
+        "proporcion_internacional": float(df["es_internacional"].mean()),
+        **(tops or {seccion: df[col].value_counts().head(10) for seccion, col in COLS_TOP.items()}),
+        "top_sketches": tops is not None,
+        "histogramas": histogramas,
+        "cajas": {col: resumen_cajas(df, col, VALOR_CAJAS) for col in COLS_CAJAS if col in df.columns},
+        "correlacion": df[cols_clave].corr(),
+    }
+
+
+def agregados_streaming(ruta_dataset, chunksize, tops=None):
+    """
+    Mismos agregados que calcular_agregados() pero leyendo el CSV por lotes en
+    una sola pasada (estadisticas_streaming), sin cargarlo entero en memoria.
+    Cuantiles, histogramas y cajas son aproximados (sketch KLL).
+    """
+    resumen = resumir_csv(
+        ruta_dataset, chunksize=chunksize,
+        columnas_correlacion=COLS_NUMERICAS_CLAVE,
+        cuantiles_por_grupo=[(col, VALOR_CAJAS) for col in COLS_CAJAS],
+    )
+
+    histogramas = {}
+    for col in COLS_NUMERICAS_CLAVE:
+        mom = resumen.momentos.get(col)
+        if mom is not None and mom.n:
+            bordes = np.linspace(mom.minimo, mom.maximo, 51)
+            acumulado = resumen.kll[col].cdf(bordes) * mom.n
+            acumulado[0] = 0
+            histogramas[col] = (np.diff(acumulado), bordes)
+
+    cajas = {
+        col: resumen_cajas_sketch(resumen.grupos[(col, VALOR_CAJAS)])
+        for col in COLS_CAJAS if (col, VALOR_CAJAS) in resumen.grupos
+    }
+
+    info = resumen.info()
+    return {
+        "streaming": True,
+        "n_filas": resumen.n_filas,
+        "info": pd.DataFrame({"no_nulos": info["Non-Null Count"], "dtype": info["Dtype"]}),
+        "memoria_bytes": 0,
+        "describe": resumen.describe(),
+        "nulos_pct": resumen.nulos_pct(),
+        "frecuencias": {col: resumen.value_counts(col, dropna=False)
+                        for col in CAT_COLS_BASICAS if col in resumen.frecuencias},
+        "internacional": resumen.value_counts("es_internacional").sort_index(),
+        "proporcion_internacional": float(resumen.media("es_internacional")),
+        **(tops or {seccion: resumen.value_counts(col, 10) for seccion, col in COLS_TOP.items()}),
+        "top_sketches": tops is not None,
+        "histogramas": histogramas,
+        "cajas": cajas,
+        "correlacion": resumen.corr(),
+    }
+
+
+def limpiar_cache(carpeta_cache=CARPETA_CACHE):
+    """
+    Borra los agregados cacheados cuya huella ya no es la actual: sus archivos
+    cambiaron o ya no existen, o cambió el esquema o el código de los agregados.
+    Cada pickle lleva al lado un JSON con los archivos de los que salió.
+    """
+    if not os.path.isdir(carpeta_cache):
+        return 0
+    borrados = 0
+    for nombre in os.listdir(carpeta_cache):
+        if not (nombre.startswith("agregados_") and nombre.endswith(".pkl")):
+            continue
+        ruta_cache = os.path.join(carpeta_cache, nombre)
+        ruta_meta = ruta_cache[:-len(".pkl")] + ".json"
+        try:
+            with open(ruta_meta, encoding="utf-8") as f:
+                meta = json.load(f)
+            vigente = meta["huella"] == huella_dataset(meta["rutas"])
+        except (OSError, ValueError, KeyError):
+            vigente = False
+        if not vigente:
+            for ruta in (ruta_cache, ruta_meta):
+                if os.path.exists(ruta):
+                    os.remove(ruta)
+            borrados += 1
+    return borrados
+
+
+def cargar_agregados(ruta_dataset, carpeta_cache=CARPETA_CACHE, forzar=False, chunksize=None):
+    """
+    Devuelve (huella, agregados). Si ya existen agregados cacheados para la
+    huella actual del dataset se leen del disco; si no, se calculan y guardan
+    (y se borran las entradas que ya no son vigentes).
+    Con 'chunksize' se calculan en streaming, sin cargar el maestro completo.
+    """
+    huella = huella_dataset(ruta_dataset)
+    sufijo = "_streaming" if chunksize else ""
+    ruta_cache = os.path.join(carpeta_cache, f"agregados_{huella}{sufijo}.pkl")
+    if not forzar and os.path.exists(ruta_cache):
+        with open(ruta_cache, "rb") as f:
+            return huella, pickle.load(f)
+
+    print(f"Calculando agregados del EDA para '{ruta_dataset}'...")
+    tops = tops_sketches(ruta_dataset)
+    if chunksize:
+        agregados = agregados_streaming(ruta_dataset, chunksize, tops)
+    else:
+        df = leer_compacto(ruta_dataset)
+        agregados = calcular_agregados(df, tops)
+
+    borrados = limpiar_cache(carpeta_cache)
+    if borrados:
+        print(f"Caché del EDA: {borrados} agregados obsoletos borrados.")
+    os.makedirs(carpeta_cache, exist_ok=True)
+    with open(ruta_cache, "wb") as f:
+        pickle.dump(agregados, f, protocol=pickle.HIGHEST_PROTOCOL)
+    rutas = [ruta_dataset] if isinstance(ruta_dataset, str) else list(ruta_dataset)
+    with open(ruta_cache[:-len(".pkl")] + ".json", "w", encoding="utf-8") as f:
+        json.dump({"huella": huella, "rutas": rutas}, f, ensure_ascii=False)
+    return huella, agregados
+
+
+# -----------------------------------------------------------------------------
+# 3. RENDERIZADO (PNG + HTML, SIN VENTANAS)
+# -----------------------------------------------------------------------------
+
+def _guardar_figuras(agregados, carpeta):
+    """Dibuja los gráficos del EDA a partir de los agregados y los guarda como PNG."""
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    sns.set(style="whitegrid")
+    figuras = []
+
+    def guardar(fig, nombre, titulo):
+        fig.tight_layout()
+        fig.savefig(os.path.join(carpeta, nombre), dpi=100)
+        plt.close(fig)
+        figuras.append((nombre, titulo))
+
+    # Histogramas de las variables numéricas claves
+    hist = agregados["histogramas"]
+    if hist:
+        filas = int(np.ceil(len(hist) / 3))
+        fig, axes = plt.subplots(filas, 3, figsize=(14, 4 * filas), squeeze=False)
+        for ax in axes.flat[len(hist):]:
+            ax.set_visible(False)
+        for ax, (col, (conteos, bordes)) in zip(axes.flat, hist.items()):
+            ax.stairs(conteos, bordes, fill=True)
+            ax.set_title(col)
+        guardar(fig, "histogramas.png", "Histogramas de variables numéricas")
+
+    # Barras de variables categóricas
+    frec = agregados["frecuencias"]
+    if frec:
+        fig, axes = plt.subplots(2, 2, figsize=(14, 10))
+        for ax, (col, conteos) in zip(axes.flatten(), frec.items()):
+            conteos.plot(kind="bar", ax=ax)
+            ax.set_title(f"Distribución de {col}")
+            ax.set_xlabel("")
+            ax.set_ylabel("Frecuencia")
+        guardar(fig, "categoricas.png", "Variables categóricas")
+
+    # Nacional vs Internacional
+    fig, ax = plt.subplots(figsize=(5, 4))
+    inter = agregados["internacional"]
+    ax.bar([{0: "Nacional (0)", 1: "Internacional (1)"}.get(k, str(k)) for k in inter.index], inter.values)
+    ax.set_title("Distribución de viajes nacionales vs internacionales")
+    ax.set_ylabel("Número de facturas")
+    guardar(fig, "internacional.png", "Nacional vs Internacional")
+
+    # Cajas por grupo (dibujadas desde las estadísticas precalculadas)
+    for col, cajas in agregados["cajas"].items():
+        if cajas.empty:
+            continue
+        fig, ax = plt.subplots(figsize=(10, 6))
+        dibujar_cajas(ax, cajas)
+        ax.set_title(f"Distribución de valores por {col}")
+        ax.tick_params(axis="x", rotation=45)
+        guardar(fig, f"cajas_{col}.png", f"Valores por {col}")
+
+    # Correlaciones
+    fig, ax = plt.subplots(figsize=(10, 6))
+    sns.heatmap(agregados["correlacion"], annot=True, cmap="coolwarm", vmin=-1, vmax=1, ax=ax)
+    ax.set_title("Matriz de correlación")
+    guardar(fig, "correlacion.png", "Matriz de correlación")
+
+    return figuras
+
+
+def renderizar_reporte(agregados, carpeta_salida, huella):
+    """Genera un reporte estático (index.html + PNG) a partir de los agregados."""
+    os.makedirs(carpeta_salida, exist_ok=True)
+    figuras = _guardar_figuras(agregados, carpeta_salida)
+
+    origen_top = " (sketches top-k)" if agregados["top_sketches"] else ""
+    tablas = [
+        ("Información del DataFrame", agregados["info"]),
+        ("Descripción de variables numéricas", agregados["describe"]),
+        ("Porcentaje de nulos por columna", agregados["nulos_pct"].to_frame("pct_nulos")),
+        ("Top 10 destinos más frecuentes" + origen_top, agregados["top_destinos"].to_frame()),
+        ("Top 10 proveedores más frecuentes" + origen_top, agregados["top_proveedores"].to_frame()),
+        ("Matriz de correlación", agregados["correlacion"].round(3)),
+    ]
+    partes = [
+        "<html><head><meta charset='utf-8'><title>EDA facturas</title></head><body>",
+        "<h1>EDA dataset maestro de facturas</h1>",
+        f"<p>{agregados['n_filas']:,} filas · {agregados['memoria_bytes'] / 1e6:.1f} MB en memoria · "
+        f"proporción internacional: {agregados['proporcion_internacional']:.4f} · huella {huella}</p>",
+    ]
+    for titulo, tabla in tablas:
+        partes.append(f"<h2>{html.escape(titulo)}</h2>")
+        partes.append(tabla.to_html())
+    for nombre, titulo in figuras:
+        partes.append(f"<h2>{html.escape(titulo)}</h2><img src='{nombre}'>")
+    partes.append("</body></html>")
+
+    with open(os.path.join(carpeta_salida, "index.html"), "w", encoding="utf-8") as f:
+        f.write("\n".join(partes))
+    with open(os.path.join(carpeta_salida, "huella.json"), "w", encoding="utf-8") as f:
+        json.dump({"huella": huella, "streaming": agregados["streaming"]}, f)
+
+
+def generar_reporte(ruta_dataset, carpeta_salida=CARPETA_REPORTE, carpeta_cache=CARPETA_CACHE, forzar=False,
+                    chunksize=None):
+    """
+    EDA no interactivo: si el reporte ya existe para la huella actual del
+    dataset no se hace nada; si no, usa (o calcula) los agregados cacheados y
+    renderiza el reporte. Devuelve la ruta del index.html.
+    """
+    inicio = time.time()
+    ruta_html = os.path.join(carpeta_salida, "index.html")
+    ruta_huella = os.path.join(carpeta_salida, "huella.json")
+    huella = huella_dataset(ruta_dataset)
+
+    if not forzar and os.path.exists(ruta_html) and os.path.exists(ruta_huella):
+        with open(ruta_huella, encoding="utf-8") as f:
+            previa = json.load(f)
+            if previa.get("huella") == huella and previa.get("streaming", False) == bool(chunksize):
+                print(f"Reporte EDA al día ({time.time() - inicio:.3f} s): {ruta_html}")
+                return ruta_html
+
+    huella, agregados = cargar_agregados(ruta_dataset, carpeta_cache, forzar=forzar, chunksize=chunksize)
+    renderizar_reporte(agregados, carpeta_salida, huella)
+    print(f"Reporte EDA generado en {time.time() - inicio:.2f} segundos: {ruta_html}")
+    return ruta_html
@@ -0,0 +1,223 @@
+# resolucion_clientes.py
+
+import numpy as np
+import pandas as pd
+
+from indice_duplicados import texto_canonico
+
+# -----------------------------------------------------------------------------
+# Resolución de entidades de clientes: agrupa las facturas en clientes reales
+# en lugar de crear un cliente por factura (OPCIÓN 1).
+#
+#   1. Bloqueo: solo se comparan facturas con los mismos atributos de cliente.
+#      Los demográficos (estado civil, país, pólizas, edad, género, zona) son
+#      gruesos: en la exportación de 2017 cientos de facturas comparten todos.
+#      Por eso la clave incluye además el mes de compra de la primera póliza,
+#      los rangos de anticipos y disponible de las pólizas y la empresa, y una
+#      factura solo es resoluble si trae el mes de la primera póliza. La clave
+#      de bloque es un hash de 64 bits de esas columnas.
+#   2. Vecindario ordenado: dentro de cada bloque las facturas se ordenan por
+#      fecha. Cada cliente se ancla en su primera factura y solo recibe las
+#      facturas a como mucho MAX_DIAS días del ancla; la siguiente abre un
+#      cliente nuevo. No hay enlace transitivo: un bloque con mucho movimiento
+#      no termina en un único cliente por encadenar facturas cercanas.
+#
+# El bloqueo es un ordenamiento (lexsort) y el anclaje una búsqueda binaria
+# (searchsorted) por factura más una ronda vectorizada por cliente del bloque
+# con más clientes, sin comparar pares de facturas ni recorrerlas en Python.
+# Las facturas sin la evidencia mínima (o sin fecha) no se pueden resolver y
+# quedan como cliente propio.
+#
+# El estado (ancla del cliente más reciente de cada bloque y siguiente número
+# de cliente) permite resolver lotes nuevos contra los clientes ya existentes:
+# con lotes en orden cronológico el resultado es el mismo que el de una
+# corrida completa.
+# -----------------------------------------------------------------------------
+
+COLUMNAS_DEMOGRAFICAS = ['estado_civil', 'pais_residencia', 'cant_polizas', 'rango_edades', 'genero',
+                         'zonas_ciudades_cli']
+# Evidencia de la relación del cliente con la CVU; el mes de la primera póliza es obligatorio
+COLUMNAS_EVIDENCIA = ['anio_mes_1ra_poliza', 'rango_vlr_anticipos', 'rango_vlr_disponible', 'empresa_cvu']
+COLUMNA_OBLIGATORIA = 'anio_mes_1ra_poliza'
+COLUMNAS_BLOQUEO = COLUMNAS_DEMOGRAFICAS + COLUMNAS_EVIDENCIA
+
+# Días máximos entre la primera factura de un cliente (ancla) y cualquier otra suya
+MAX_DIAS = 30
+# Atributos demográficos informados (no nulos) necesarios para intentar resolver una factura
+MIN_ATRIBUTOS = 4
+
+
+def claves_bloque(df, columnas=COLUMNAS_BLOQUEO):
+    """(clave uint64 de bloque, máscara de facturas con evidencia suficiente)."""
+    presentes = [c for c in columnas if c in df.columns]
+    canon = pd.DataFrame({c: texto_canonico(df[c]) for c in presentes}, index=df.index)
+    clave = pd.util.hash_pandas_object(canon, index=False).to_numpy()
+    demograficas = [c for c in COLUMNAS_DEMOGRAFICAS if c in presentes]
+    informados = (canon[demograficas] != "").sum(axis=1).to_numpy()
+    resoluble = informados >= min(MIN_ATRIBUTOS, len(demograficas))
+    if COLUMNA_OBLIGATORIA in presentes:
+        resoluble &= (canon[COLUMNA_OBLIGATORIA] != "").to_numpy()
+    else:
+        resoluble[:] = False
+    return clave, resoluble
+
+
+def _dias(fechas):
+    """Fechas como número de día (int64); NaT queda como None en la máscara devuelta."""
+    fechas = pd.to_datetime(fechas, errors='coerce')
+    validas = fechas.notna().to_numpy()
+    dias = np.zeros(len(fechas), dtype=np.int64)
+    dias[validas] = fechas[validas].to_numpy().astype('datetime64[D]').astype(np.int64)
+    return dias, validas
+
+
+def _numero(id_cliente):
+    try:
+        return int(str(id_cliente).rsplit('_', 1)[1])
+    except (IndexError, ValueError):
+        return 0
+
+
+class ResolucionClientes:
+    """
+    Asigna id_cliente a facturas únicas por bloqueo + vecindario ordenado.
+
+        resolucion = ResolucionClientes(max_dias=30)
+        df_facturas_unicas['id_cliente'] = resolucion.asignar(df_facturas_unicas)
+    """
+
+    def __init__(self, max_dias=MAX_DIAS, primer_cliente=1):
+        self.max_dias = max_dias
+        self.siguiente = primer_cliente
+        # Cliente más reciente de cada bloque: índice = clave, columnas ancla (día
+        # de su primera factura) / id_cliente
+        self.ultimos = pd.DataFrame({'ancla': pd.Series(dtype=np.int64), 'id_cliente': pd.Series(dtype=object)},
+                                    index=pd.Index([], dtype=np.uint64))
+        self.nuevos = set()
+
+    @classmethod
+    def desde_tablas(cls, df_clientes, df_facturas, max_dias=MAX_DIAS):
+        """Estado a partir de tablas ya escritas (clientes + facturas con id_cliente y fecha)."""
+        resolucion = cls(max_dias)
+        if df_facturas is None or df_facturas.empty:
+            return resolucion
+        # El ancla de cada cliente es su primera factura
+        anclas = df_facturas[['id_cliente', 'fecha_factura']].assign(
+            fecha_factura=lambda d: pd.to_datetime(d['fecha_factura'], errors='coerce'))
+        anclas = anclas.groupby('id_cliente', as_index=False)['fecha_factura'].min()
+        unidas = anclas.merge(df_clientes, on='id_cliente', how='left')
+        clave, resoluble = claves_bloque(unidas)
+        dias, validas = _dias(unidas['fecha_factura'])
+        resolucion._actualizar_ultimos(clave[resoluble & validas], dias[resoluble & validas],
+                                       unidas['id_cliente'].to_numpy()[resoluble & validas])
+        numeros = df_clientes['id_cliente'].map(_numero)
+        resolucion.siguiente = int(numeros.max()) + 1 if len(numeros) else 1
+        return resolucion
+
+    def _actualizar_ultimos(self, clave, anclas, ids):
+        nuevos = pd.DataFrame({'ancla': anclas, 'id_cliente': ids}, index=pd.Index(clave, dtype=np.uint64))
+        todos = pd.concat([self.ultimos, nuevos])
+        # Por bloque se queda el cliente con el ancla más reciente (ante empate, el último añadido)
+        todos = todos.reset_index().rename(columns={'index': 'clave'})
+        todos = todos.sort_values('ancla', kind='stable').drop_duplicates('clave', keep='last')
+        self.ultimos = todos.set_index('clave')[['ancla', 'id_cliente']]
+
+    def _anclar(self, c, d):
+        """
+        Anclaje sobre las facturas ordenadas por (clave, día): devuelve el número
+        de cliente de cada una, el ancla de cada cliente y el id existente con que
+        continúa (None si es nuevo).
+
+        Con una clave ordenable bloque-día, searchsorted da para cada factura la
+        primera del bloque fuera de su ventana de max_dias; las anclas se obtienen
+        saltando de ancla en ancla, en todos los bloques a la vez (una ronda por
+        cliente del bloque con más clientes).
+        """
+        n = len(c)
+        if n == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), []
+        inicio_bloque = np.r_[True, c[1:] != c[:-1]]
+        inicios = np.flatnonzero(inicio_bloque)
+        bloque = np.cumsum(inicio_bloque) - 1
+        fin_bloque = np.r_[inicios[1:], n][bloque]
+
+        # Clave monótona: los bloques no se solapan aunque se sume max_dias a un día
+        base = int(d.min()) - self.max_dias
+        ancho = int(d.max()) - base + self.max_dias + 1
+        orden_dia = bloque * ancho + (d - base)
+        siguiente = np.searchsorted(orden_dia, orden_dia + self.max_dias, side='right')
+
+        # Bloques que continúan el cliente más reciente de un lote anterior
+        previos = self.ultimos.reindex(pd.Index(c[inicios], dtype=np.uint64))
+        ancla_previa = previos['ancla'].to_numpy(dtype=float)
+        continua = ~np.isnan(ancla_previa)
+        continua[continua] = (d[inicios[continua]] - ancla_previa[continua] >= 0) & \
+                             (d[inicios[continua]] - ancla_previa[continua] <= self.max_dias)
+
+        # Primera ancla nueva de cada bloque: su primera factura, o la primera fuera
+        # de la ventana del cliente que continúa
+        frontera = inicios.copy()
+        ancla_cont = ancla_previa[continua].astype(np.int64)
+        frontera[continua] = np.searchsorted(
+            orden_dia, np.flatnonzero(continua) * ancho + (ancla_cont - base) + self.max_dias, side='right')
+        frontera = frontera[frontera < np.r_[inicios[1:], n]]
+
+        es_ancla = np.zeros(n, dtype=bool)
+        while len(frontera):
+            es_ancla[frontera] = True
+            proxima = siguiente[frontera]
+            frontera = proxima[proxima < fin_bloque[frontera]]
+
+        inicio_cliente = es_ancla.copy()
+        inicio_cliente[inicios[continua]] = True
+        cliente = np.cumsum(inicio_cliente) - 1
+        posiciones = np.flatnonzero(inicio_cliente)
+        anclas = d[posiciones].copy()
+        existentes = np.full(len(posiciones), None, dtype=object)
+        de_previo = ~es_ancla[posiciones]
+        anclas[de_previo] = ancla_cont
+        existentes[de_previo] = previos['id_cliente'].to_numpy()[continua]
+        return cliente, anclas, list(existentes)
+
+    def asignar(self, df_facturas):
+        """
+        Devuelve una Serie id_cliente (mismo índice que df_facturas) y deja en
+        self.nuevos los ids creados en esta llamada. Los clientes nuevos se
+        numeran en el orden de su primera factura en df_facturas.
+        """
+        n = len(df_facturas)
+        clave, resoluble = claves_bloque(df_facturas)
+        dias, validas = _dias(df_facturas['fecha_factura'])
+        resoluble &= validas
+
+        # --- Vecindario ordenado y anclaje dentro de cada bloque ---
+        filas = np.flatnonzero(resoluble)
+        orden = filas[np.lexsort((dias[filas], clave[filas]))]
+        c, d = clave[orden], dias[orden]
+        cadena, anclas, existentes = self._anclar(c, d)
+
+        cadena_de = np.full(n, -1, dtype=np.int64)
+        cadena_de[orden] = cadena
+        n_cadenas = len(anclas)
+        # Las facturas no resolubles son clientes de una sola factura
+        sueltas = np.flatnonzero(~resoluble)
+        cadena_de[sueltas] = n_cadenas + np.arange(len(sueltas))
+        n_cadenas += len(sueltas)
+
+        id_cadena = np.empty(n_cadenas, dtype=object)
+        id_cadena[:len(existentes)] = existentes
+
+        # --- Ids nuevos en orden de primera aparición ---
+        primera_fila = np.full(n_cadenas, n, dtype=np.int64)
+        np.minimum.at(primera_fila, cadena_de, np.arange(n))
+        sin_id = np.flatnonzero(pd.isna(id_cadena))
+        sin_id = sin_id[np.argsort(primera_fila[sin_id], kind='stable')]
+        nuevos_ids = [f'cliente_{self.siguiente + i}' for i in range(len(sin_id))]
+        id_cadena[sin_id] = nuevos_ids
+        self.siguiente += len(sin_id)
+        self.nuevos = set(nuevos_ids)
+
+        # Ancla y clave de cada cliente resoluble (su primera factura ordenada)
+        primeras = np.flatnonzero(np.r_[True, cadena[1:] != cadena[:-1]]) if len(cadena) else cadena
+        self._actualizar_ultimos(c[primeras], anclas, id_cadena[:len(anclas)])
+        return pd.Series(id_cadena[cadena_de], index=df_facturas.index, name='id_cliente')
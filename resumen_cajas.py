@@ -0,0 +1,82 @@
+# resumen_cajas.py
+
+import numpy as np
+import pandas as pd
+
+# -----------------------------------------------------------------------------
+# Estadísticas de diagrama de caja por grupo (cuartiles, bigotes de Tukey y
+# una muestra acotada de outliers), calculadas con un solo groupby o desde
+# sketches KLL, para dibujar los boxplots sin pasarle a seaborn cada fila.
+# -----------------------------------------------------------------------------
+
+COLUMNAS_CAJA = ["n", "q1", "mediana", "q3", "whislo", "whishi", "n_outliers", "outliers"]
+
+
+def resumen_cajas(df, grupo, valor, max_outliers=50, whis=1.5):
+    """
+    Calcula por cada valor de 'grupo' los cuartiles de 'valor', los bigotes
+    (dato más extremo dentro de Q1 - whis*IQR y Q3 + whis*IQR, como
+    seaborn/matplotlib), el número de outliers y una muestra de como mucho
+    'max_outliers' de ellos (los más extremos por cada lado).
+    """
+    datos = df[[grupo, valor]].dropna()
+    if datos.empty:
+        return pd.DataFrame(columns=COLUMNAS_CAJA)
+
+    por_grupo = datos.groupby(grupo)[valor]
+    cuartiles = por_grupo.quantile([0.25, 0.5, 0.75]).unstack()
+    cuartiles.columns = ["q1", "mediana", "q3"]
+    iqr = cuartiles["q3"] - cuartiles["q1"]
+    limites = pd.DataFrame({"lim_inf": cuartiles["q1"] - whis * iqr, "lim_sup": cuartiles["q3"] + whis * iqr})
+
+    datos = datos.join(limites, on=grupo)
+    dentro = datos[valor].between(datos["lim_inf"], datos["lim_sup"])
+    bigotes = datos[dentro].groupby(grupo)[valor].agg(whislo="min", whishi="max")
+
+    fuera = datos.loc[~dentro, [grupo, valor]].sort_values(valor)
+    mitad = max(max_outliers // 2, 1)
+    muestra = pd.concat([fuera.groupby(grupo).head(mitad), fuera.groupby(grupo).tail(mitad)]).drop_duplicates()
+
+    resumen = cuartiles.join(bigotes)
+    resumen.insert(0, "n", por_grupo.size())
+    resumen["n_outliers"] = fuera.groupby(grupo).size().reindex(resumen.index, fill_value=0)
+    resumen["outliers"] = (
+        muestra.groupby(grupo)[valor].agg(lambda s: np.sort(s.to_numpy()).tolist())
+        .reindex(resumen.index)
+        .apply(lambda v: v if isinstance(v, list) else [])
+    )
+    return resumen[COLUMNAS_CAJA]
+
+
+def resumen_cajas_sketch(sketches, whis=1.5):
+    """
+    Versión aproximada de resumen_cajas() a partir de un sketch KLL por grupo
+    ({grupo: SketchKLL}), para el EDA en streaming. Los bigotes se recortan
+    al rango de los datos y no se guarda muestra de outliers, solo su conteo.
+    """
+    filas = {}
+    for g, sketch in sketches.items():
+        if not sketch.n:
+            continue
+        minimo, q1, mediana, q3, maximo = sketch.cuantiles([0.0, 0.25, 0.5, 0.75, 1.0])
+        lim_inf, lim_sup = q1 - whis * (q3 - q1), q3 + whis * (q3 - q1)
+        bajo, alto = sketch.cdf([np.nextafter(lim_inf, -np.inf), lim_sup])
+        filas[g] = {
+            "n": sketch.n, "q1": q1, "mediana": mediana, "q3": q3,
+            "whislo": max(minimo, lim_inf), "whishi": min(maximo, lim_sup),
+            "n_outliers": int(round(sketch.n * (bajo + 1 - alto))), "outliers": [],
+        }
+    return pd.DataFrame.from_dict(filas, orient="index", columns=COLUMNAS_CAJA).sort_index()
+
+
+def dibujar_cajas(ax, resumen, mostrar_outliers=True):
+    """Dibuja los boxplots en 'ax' con Axes.bxp a partir del resumen precalculado."""
+    if resumen.empty:
+        return ax
+    stats = [
+        {"label": str(g), "q1": r["q1"], "med": r["mediana"], "q3": r["q3"],
+         "whislo": r["whislo"], "whishi": r["whishi"], "fliers": r["outliers"]}
+        for g, r in resumen.iterrows()
+    ]
+    ax.bxp(stats, showfliers=mostrar_outliers)
+    return ax
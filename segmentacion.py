@@ -0,0 +1,207 @@
+# segmentacion.py
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+# -----------------------------------------------------------------------------
+# Matriz de características para la segmentación K-Means. Las columnas
+# numéricas se estandarizan como antes; las categóricas (proveedor, destino,
+# continente, género, rango de edad...) se codifican directamente en una
+# matriz CSR, sin pasar por un one-hot denso:
+#
+#   - 'onehot': una columna por valor distinto (pd.factorize por columna).
+#   - 'hashing': truco del hashing, cada "columna=valor" cae en una de
+#     n_caracteristicas columnas con signo ±1. El ancho no depende de la
+#     cardinalidad y valores nuevos no cambian la matriz.
+#
+# Cada factura aporta como mucho un no nulo por columna categórica, así que
+# la memoria es proporcional a los no nulos: filas x (numéricas + categóricas
+# informadas). KMeans/MiniBatchKMeans y TruncatedSVD de sklearn trabajan
+# directamente sobre la CSR.
+#
+# ajustar_codificador guarda lo aprendido de un DataFrame (media y escala de
+# las numéricas, vocabulario one-hot de las categóricas) en un dict JSON, y
+# codificar lo aplica a filas nuevas con las mismas columnas que la matriz
+# original (p. ej. para consultar el índice de vecinos con una factura que no
+# está indexada).
+# -----------------------------------------------------------------------------
+
+COLUMNAS_CATEGORICAS = ['proveedor_principal', 'destino_ciudad', 'destino_pais', 'destino_continente',
+                        'genero', 'rango_edades']
+# Identificadores y códigos numéricos que no describen la factura. El mes de la
+# primera póliza (AAAAMM) solo sirve para la resolución de clientes: como número
+# no es una magnitud y cambiaría los clusters por defecto
+COLUMNAS_EXCLUIDAS = ['no_factura', 'anio_mes_1ra_poliza']
+
+CODIFICACIONES = ('onehot', 'hashing', 'ninguna')
+N_CARACTERISTICAS_HASH = 2 ** 18
+# A partir de este número de filas se usa MiniBatchKMeans
+UMBRAL_MINIBATCH = 200_000
+
+
+def _columnas_numericas(df, excluir=COLUMNAS_EXCLUIDAS):
+    """Columnas numéricas/booleanas como float64, sin las que no tienen ningún valor."""
+    df_numeric = df.drop(columns=[c for c in excluir if c in df.columns])
+    df_numeric = df_numeric.select_dtypes(include=[np.number, 'bool']).astype('float64')
+    return df_numeric.dropna(axis=1, how='all')
+
+
+def matriz_numerica(df, excluir=COLUMNAS_EXCLUIDAS):
+    """
+    Columnas numéricas/booleanas estandarizadas (float64 denso). Las columnas
+    sin ningún valor se descartan y los nulos se imputan con la media.
+    Devuelve (matriz, nombres de columna).
+    """
+    from sklearn.preprocessing import StandardScaler
+
+    df_numeric = _columnas_numericas(df, excluir)
+    df_numeric = df_numeric.fillna(df_numeric.mean())
+    return StandardScaler().fit_transform(df_numeric), list(df_numeric.columns)
+
+
+def _codigos(serie):
+    """(códigos int64 con -1 para nulos, valores distintos) sin copiar las categóricas."""
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        return serie.cat.codes.to_numpy().astype(np.int64), serie.cat.categories
+    codigos, valores = pd.factorize(serie, sort=True)
+    return codigos.astype(np.int64), valores
+
+
+def one_hot_disperso(df, columnas=COLUMNAS_CATEGORICAS, peso=1.0):
+    """One-hot CSR de las columnas categóricas. Devuelve (matriz, nombres 'columna=valor')."""
+    filas, indices, nombres = [], [], []
+    for col in columnas:
+        codigos, valores = _codigos(df[col])
+        informadas = np.flatnonzero(codigos >= 0)
+        filas.append(informadas)
+        indices.append(codigos[informadas] + len(nombres))
+        nombres.extend(f"{col}={v}" for v in valores)
+    filas = np.concatenate(filas) if filas else np.empty(0, dtype=np.int64)
+    indices = np.concatenate(indices) if indices else np.empty(0, dtype=np.int64)
+    datos = np.full(len(filas), peso, dtype=np.float64)
+    matriz = sparse.csr_matrix((datos, (filas, indices)), shape=(len(df), len(nombres)))
+    return matriz, nombres
+
+
+def hashing_disperso(df, columnas=COLUMNAS_CATEGORICAS, n_caracteristicas=N_CARACTERISTICAS_HASH, peso=1.0):
+    """
+    Truco del hashing sobre "columna=valor" (hash de 64 bits de pandas; un
+    bit del hash da el signo para que las colisiones tiendan a cancelarse).
+    Solo se hashean los valores distintos de cada columna.
+    """
+    filas, indices, signos = [], [], []
+    for col in columnas:
+        codigos, valores = _codigos(df[col])
+        claves = np.array([f"{col}={v}" for v in valores], dtype=object)
+        hashes = pd.util.hash_array(claves) if len(claves) else np.empty(0, dtype=np.uint64)
+        columna_hash = (hashes % np.uint64(n_caracteristicas)).astype(np.int64)
+        signo = np.where((hashes >> np.uint64(63)) == 1, -1.0, 1.0)
+        informadas = np.flatnonzero(codigos >= 0)
+        filas.append(informadas)
+        indices.append(columna_hash[codigos[informadas]])
+        signos.append(signo[codigos[informadas]])
+    filas = np.concatenate(filas) if filas else np.empty(0, dtype=np.int64)
+    indices = np.concatenate(indices) if indices else np.empty(0, dtype=np.int64)
+    datos = peso * np.concatenate(signos) if signos else np.empty(0)
+    # Las colisiones dentro de una misma fila se suman (coo -> csr)
+    return sparse.csr_matrix((datos, (filas, indices)), shape=(len(df), n_caracteristicas))
+
+
+def matriz_caracteristicas(df, codificacion='onehot', columnas=COLUMNAS_CATEGORICAS,
+                           n_caracteristicas=N_CARACTERISTICAS_HASH, peso_categoricas=1.0):
+    """
+    Matriz CSR de segmentación: numéricas estandarizadas + categóricas
+    codificadas ('onehot', 'hashing' o 'ninguna'). Devuelve (matriz, columnas
+    numéricas usadas).
+    """
+    if codificacion not in CODIFICACIONES:
+        raise ValueError(f"Codificación desconocida: '{codificacion}'. Opciones: {CODIFICACIONES}.")
+    numericas, columnas_numericas = matriz_numerica(df)
+    bloques = [sparse.csr_matrix(numericas)]
+    columnas = [c for c in columnas if c in df.columns]
+    if codificacion == 'onehot':
+        bloques.append(one_hot_disperso(df, columnas, peso_categoricas)[0])
+    elif codificacion == 'hashing':
+        bloques.append(hashing_disperso(df, columnas, n_caracteristicas, peso_categoricas))
+    return sparse.hstack(bloques, format='csr'), columnas_numericas
+
+
+def ajustar_codificador(df, codificacion='onehot', columnas=COLUMNAS_CATEGORICAS,
+                        n_caracteristicas=N_CARACTERISTICAS_HASH, peso_categoricas=1.0):
+    """
+    Parámetros de matriz_caracteristicas(df, ...) para codificar filas nuevas
+    con codificar(): columnas numéricas con su media (imputación) y escala
+    (desviación típica, 1 si es constante, como StandardScaler) y, en
+    'onehot', los valores de cada categórica. Dict serializable a JSON.
+    """
+    if codificacion not in CODIFICACIONES:
+        raise ValueError(f"Codificación desconocida: '{codificacion}'. Opciones: {CODIFICACIONES}.")
+    df_numeric = _columnas_numericas(df)
+    media = df_numeric.mean()
+    escala = df_numeric.fillna(media).std(ddof=0)
+    escala = escala.where(escala > 0, 1.0)
+    columnas = [c for c in columnas if c in df.columns]
+    return {
+        "codificacion": codificacion,
+        "numericas": list(df_numeric.columns),
+        "media": [float(v) for v in media],
+        "escala": [float(v) for v in escala],
+        "categoricas": columnas,
+        "vocabulario": ({c: [str(v) for v in _codigos(df[c])[1]] for c in columnas}
+                        if codificacion == 'onehot' else None),
+        "n_caracteristicas": n_caracteristicas,
+        "peso_categoricas": peso_categoricas,
+    }
+
+
+def codificar(df, codificador):
+    """
+    Matriz CSR de 'df' con las columnas y parámetros de ajustar_codificador.
+    Las numéricas que falten o vengan nulas toman la media; un valor
+    categórico que no estaba en el vocabulario no aporta ninguna columna.
+    """
+    media = np.asarray(codificador["media"], dtype=np.float64)
+    escala = np.asarray(codificador["escala"], dtype=np.float64)
+    numericas = df.reindex(columns=codificador["numericas"]).astype('float64').to_numpy()
+    numericas = np.where(np.isnan(numericas), media, numericas)
+    bloques = [sparse.csr_matrix((numericas - media) / escala)]
+    columnas, peso = codificador["categoricas"], codificador["peso_categoricas"]
+    faltantes = {c: pd.Series(np.nan, index=df.index, dtype=object) for c in columnas if c not in df.columns}
+    df = df.assign(**faltantes) if faltantes else df
+    if codificador["codificacion"] == 'onehot':
+        # Cada columna como categórica sobre su vocabulario: one_hot_disperso reutiliza sus códigos
+        fijas = pd.DataFrame({c: pd.Categorical(df[c].astype(str).where(df[c].notna()),
+                                                categories=codificador["vocabulario"][c])
+                              for c in columnas}, index=df.index)
+        bloques.append(one_hot_disperso(fijas, columnas, peso)[0])
+    elif codificador["codificacion"] == 'hashing':
+        bloques.append(hashing_disperso(df, columnas, codificador["n_caracteristicas"], peso))
+    return sparse.hstack(bloques, format='csr')
+
+
+def modelo_kmeans(n_clusters, n_filas, random_state=42):
+    """KMeans (Lloyd, acepta CSR) o MiniBatchKMeans para muchas filas."""
+    from sklearn.cluster import KMeans, MiniBatchKMeans
+
+    if n_filas >= UMBRAL_MINIBATCH:
+        return MiniBatchKMeans(n_clusters=n_clusters, random_state=random_state, batch_size=4096, n_init=3)
+    return KMeans(n_clusters=n_clusters, random_state=random_state)
+
+
+def proyeccion_2d(matriz, random_state=42):
+    """Proyección 2D para graficar (TruncatedSVD: como PCA pero sin centrar, válido para CSR)."""
+    from sklearn.decomposition import TruncatedSVD
+
+    return TruncatedSVD(n_components=2, random_state=random_state).fit_transform(matriz)
+
+
+def resumen_categoricas(df, etiquetas, columnas=COLUMNAS_CATEGORICAS):
+    """Valor más frecuente de cada columna categórica por cluster (y su proporción)."""
+    resumen = {}
+    for col in [c for c in columnas if c in df.columns]:
+        conteos = pd.crosstab(etiquetas, df[col])
+        moda = conteos.idxmax(axis=1)
+        proporcion = conteos.max(axis=1) / conteos.sum(axis=1).where(lambda s: s > 0)
+        resumen[col] = moda.astype(str) + " (" + (proporcion * 100).round(0).astype('Int64').astype(str) + "%)"
+    return pd.DataFrame(resumen)
@@ -0,0 +1,584 @@
+# servicio_ingesta.py
+
+import argparse
+import glob
+import io
+import json
+import os
+import queue
+import shutil
+import signal
+import threading
+import time
+from datetime import datetime
+
+# -----------------------------------------------------------------------------
+# Servicio de ingesta por micro-lotes: vigila la carpeta de exportaciones y
+# pasa cada archivo nuevo por limpieza, normalización, enriquecimiento GEO y
+# maestro, AÑADIENDO sus filas a las salidas (CSV planos, particiones
+# anio=/mes=, sketches top-k y cubo). El proceso es de larga duración: el
+# índice geográfico (cargado en el primer lote) y la caché de clasificación
+# de destinos quedan en memoria entre lotes.
+#
+#   - Un hilo vigía sondea la carpeta y encola los archivos nuevos una vez que
+#     su tamaño deja de cambiar (copia terminada).
+#   - Un hilo trabajador procesa la cola de a un archivo.
+#   - La cola es acotada: si llegan archivos más rápido de lo que se procesan,
+#     el vigía se bloquea (contrapresión) y los archivos esperan en disco.
+#
+# Los archivos ya ingeridos (nombre, tamaño, mtime) y el último id de cliente
+# se guardan en ARCHIVO_ESTADO para retomar tras un reinicio. Las filas ya
+# ingeridas (en esta u otras corridas) se descartan con el índice de duplicados.
+#
+# Una factura ya ingerida que vuelve a llegar con un proveedor nuevo no crea
+# otra factura ni otro cliente: sus filas de proveedores se anexan y su fila
+# del maestro (n_proveedores, presupuesto, proveedor principal) se recalcula
+# y se reemplaza, restando su versión anterior del cubo y los sketches, igual
+# que si se reconstruyera todo con procesar_ventas_v2.py.
+#
+# La escritura de un lote es una transacción: antes de anexar se anota en el
+# estado el tamaño de cada CSV plano y partición, y se respalda el JSON top-k
+# y el cubo (que se reescriben). Si el lote falla a medias, o el servicio se
+# cae, los CSV se truncan a su tamaño anterior y se restauran los respaldos,
+# así que reintentar el archivo no duplica filas. El lote queda confirmado al
+# guardar el estado con el archivo registrado.
+#
+#     python servicio_ingesta.py --intervalo 5 --cola 4
+# -----------------------------------------------------------------------------
+
+CARPETA_ENTRADA = "datos_csv"
+CARPETA_LIMPIOS = "datos_limpios"
+CARPETA_ENRIQ = "datos_enriquecidos"
+ARCHIVO_ESTADO = ".ingesta_estado.json"
+
+INTERVALO_SONDEO = 5.0
+TAMANO_COLA = 4
+
+# (nombre en datos_limpios, nombre en datos_enriquecidos) de cada tabla
+TABLAS = {
+    "clientes": ("clientes", "clientes_enriquecido"),
+    "facturas": ("facturas", "facturas_enriquecido"),
+    "proveedores": ("proveedores_por_factura", "proveedores_por_factura_enriquecido"),
+}
+TABLA_MAESTRO = "dataset_maestro_facturas"
+# Salidas que cada lote reescribe completas (en datos_enriquecidos) y sufijo de su respaldo
+ARCHIVOS_REESCRITOS = ("top_k_maestro.json", "cubo_facturas.parquet")
+SUFIJO_RESPALDO = ".anterior"
+
+
+def crear_parser():
+    parser = argparse.ArgumentParser(description="Servicio de ingesta por micro-lotes de datos_csv.")
+    parser.add_argument("--entrada", default=CARPETA_ENTRADA, help="Carpeta vigilada de exportaciones CSV.")
+    parser.add_argument("--limpios", default=CARPETA_LIMPIOS, help="Carpeta de tablas normalizadas.")
+    parser.add_argument("--enriquecidos", default=CARPETA_ENRIQ, help="Carpeta de tablas enriquecidas y maestro.")
+    parser.add_argument("--intervalo", type=float, default=INTERVALO_SONDEO, help="Segundos entre sondeos.")
+    parser.add_argument("--cola", type=int, default=TAMANO_COLA, help="Máximo de archivos en cola (contrapresión).")
+    parser.add_argument("--una-pasada", action="store_true",
+                        help="Procesa los archivos nuevos presentes y termina.")
+    parser.add_argument("--incluir-existentes", action="store_true",
+                        help="En la primera ejecución, procesa también los archivos ya presentes.")
+    parser.add_argument("--clientes", default=None,
+                        help="Asignación de clientes, 'factura' o 'resolucion' (igual que en procesar_ventas_v2.py).")
+    parser.add_argument("--max-dias", type=int, default=None,
+                        help="Días máximos desde la primera factura de un cliente a cualquier otra suya.")
+    parser.add_argument("--procesos", type=int, default=1,
+                        help="Procesos para clasificar destinos GEO de cada lote (por defecto 1).")
+    return parser
+
+
+if __name__ == "__main__":
+    # Los argumentos se leen antes de importar pandas y el pipeline: --help responde al instante
+    parser = crear_parser()
+    args = parser.parse_args()
+
+import pandas as pd
+
+from procesar_ventas_v2 import (leer_exportacion, limpiar_datos, normalizar_tablas, COLUMNAS_PROVEEDOR_FACTURA,
+                                MODOS_CLIENTES, MODO_CLIENTES)
+from enriquecer_datos import enriquecer_clientes, enriquecer_facturas
+from build_dataset_maestro import agregar_por_factura, construir_maestro
+from particiones import (ARCHIVO_PARTICION, anexar_csv, claves_particion, escribir_particionado, fechas_por_clave,
+                         leer_csvs, listar_particiones)
+from instrumentacion import etapa, iniciar_ejecucion
+from indice_duplicados import IndiceDuplicados, texto_canonico
+from resolucion_clientes import ResolucionClientes, MAX_DIAS
+import cubo_facturas
+import top_k_maestro
+
+
+def _huella(ruta):
+    info = os.stat(ruta)
+    return info.st_size, info.st_mtime_ns
+
+
+def _claves(serie):
+    """Forma canónica de no_factura para comparar entre lotes ('123', 123 y 123.0 iguales)."""
+    return texto_canonico(serie, numerica=True)
+
+
+def _facturas_ingeridas(carpeta_limpios):
+    """{no_factura canónico: fecha_factura} de las facturas ya escritas."""
+    ruta = os.path.join(carpeta_limpios, "facturas.csv")
+    if not os.path.exists(ruta):
+        return {}
+    df = pd.read_csv(ruta, usecols=["no_factura", "fecha_factura"], encoding="utf-8-sig")
+    return dict(zip(_claves(df["no_factura"]), pd.to_datetime(df["fecha_factura"], errors="coerce")))
+
+
+def _ultimo_cliente(carpeta_limpios):
+    """Mayor N de los id 'cliente_N' ya escritos (0 si no hay clientes)."""
+    ruta = os.path.join(carpeta_limpios, "clientes.csv")
+    if not os.path.exists(ruta):
+        return 0
+    ids = pd.read_csv(ruta, usecols=["id_cliente"], encoding="utf-8-sig")["id_cliente"].astype(str)
+    numeros = ids.str.extract(r"^cliente_(\d+)$", expand=False).dropna()
+    return int(numeros.astype(int).max()) if len(numeros) else 0
+
+
+# -----------------------------------------------------------------------------
+# SERVICIO
+# -----------------------------------------------------------------------------
+
+class ServicioIngesta:
+    """Vigía + trabajador sobre una cola acotada; ver el encabezado del módulo."""
+
+    def __init__(self, carpeta_entrada=CARPETA_ENTRADA, carpeta_limpios=CARPETA_LIMPIOS,
+                 carpeta_enriq=CARPETA_ENRIQ, intervalo=INTERVALO_SONDEO, tamano_cola=TAMANO_COLA,
+                 incluir_existentes=False, modo_clientes=MODO_CLIENTES, max_dias=MAX_DIAS, procesos=1):
+        self.carpeta_entrada = carpeta_entrada
+        self.carpeta_limpios = carpeta_limpios
+        self.carpeta_enriq = carpeta_enriq
+        self.intervalo = intervalo
+        # Procesos para clasificar destinos GEO; el servicio corre en hilos, así que
+        # con más de uno el pool usa 'forkserver'/'spawn' en lugar de 'fork'
+        self.procesos = procesos
+        self.cola = queue.Queue(maxsize=tamano_cola)
+        self.detener = threading.Event()
+        self.ruta_estado = os.path.join(carpeta_enriq, ARCHIVO_ESTADO)
+
+        # Estado caliente que se conserva entre lotes
+        self.cache_destinos = {}
+        self.duplicados = IndiceDuplicados(os.path.join(carpeta_limpios, ".duplicados"))
+        self._vistos = {}       # ruta -> huella de la última vuelta del vigía
+        self._encolados = set()
+
+        self.estado = self._cargar_estado(incluir_existentes)
+        if "transaccion" in self.estado:
+            # El servicio se detuvo a mitad de un lote: se deshacen sus escrituras
+            print(f"[ingesta] Lote sin confirmar: {self.estado['transaccion']['archivo']}; se deshace.")
+            self._deshacer_transaccion()
+        self.resolucion = self._cargar_resolucion(modo_clientes, max_dias)
+        # Facturas ya escritas y su fecha (ubica sus particiones si vuelven a llegar)
+        self.facturas = _facturas_ingeridas(carpeta_limpios)
+
+    # --- Estado persistido ---
+    def _cargar_estado(self, incluir_existentes):
+        if os.path.exists(self.ruta_estado):
+            with open(self.ruta_estado, encoding="utf-8") as f:
+                return json.load(f)
+
+        estado = {"archivos": {}, "ultimo_cliente": _ultimo_cliente(self.carpeta_limpios)}
+        ya_procesados = os.path.exists(os.path.join(self.carpeta_limpios, "facturas.csv"))
+        if ya_procesados and not incluir_existentes:
+            # Primera ejecución sobre salidas de una corrida completa: esos archivos ya están incluidos
+            for ruta in sorted(glob.glob(os.path.join(self.carpeta_entrada, "*.csv"))):
+                tamano, mtime = _huella(ruta)
+                estado["archivos"][os.path.basename(ruta)] = {
+                    "tamano": tamano, "mtime_ns": mtime, "origen": "corrida_completa"}
+            print(f"Estado nuevo: {len(estado['archivos'])} archivos existentes se dan por ingeridos "
+                  f"(usa --incluir-existentes para procesarlos).")
+        self._guardar_estado(estado)
+        return estado
+
+    def _cargar_resolucion(self, modo_clientes, max_dias):
+        """Resolución de clientes sembrada con las tablas ya escritas (None en modo 'factura')."""
+        if modo_clientes not in MODOS_CLIENTES:
+            raise ValueError(f"Modo de clientes desconocido: '{modo_clientes}'. Opciones: {MODOS_CLIENTES}")
+        if modo_clientes == "factura":
+            return None
+        ruta_clientes = os.path.join(self.carpeta_limpios, "clientes.csv")
+        ruta_facturas = os.path.join(self.carpeta_limpios, "facturas.csv")
+        if not (os.path.exists(ruta_clientes) and os.path.exists(ruta_facturas)):
+            return ResolucionClientes(max_dias, self.estado["ultimo_cliente"] + 1)
+        resolucion = ResolucionClientes.desde_tablas(
+            pd.read_csv(ruta_clientes, low_memory=False, encoding="utf-8-sig"),
+            pd.read_csv(ruta_facturas, usecols=["id_cliente", "fecha_factura"], encoding="utf-8-sig"),
+            max_dias)
+        resolucion.siguiente = max(resolucion.siguiente, self.estado["ultimo_cliente"] + 1)
+        print(f"[ingesta] Resolución de clientes: {len(resolucion.ultimos):,} bloques conocidos.")
+        return resolucion
+
+    def _guardar_estado(self, estado=None):
+        estado = self.estado if estado is None else estado
+        os.makedirs(self.carpeta_enriq, exist_ok=True)
+        temporal = self.ruta_estado + ".tmp"
+        with open(temporal, "w", encoding="utf-8") as f:
+            json.dump(estado, f, ensure_ascii=False, indent=2)
+        os.replace(temporal, self.ruta_estado)
+
+    def _ya_ingerido(self, ruta, huella):
+        registro = self.estado["archivos"].get(os.path.basename(ruta))
+        return registro is not None and (registro["tamano"], registro["mtime_ns"]) == huella
+
+    # --- Vigía (productor) ---
+    def buscar_nuevos(self):
+        """Archivos nuevos o modificados cuyo tamaño no cambió desde la vuelta anterior."""
+        listos = []
+        actuales = {}
+        for ruta in sorted(glob.glob(os.path.join(self.carpeta_entrada, "*.csv"))):
+            try:
+                huella = _huella(ruta)
+            except OSError:
+                continue
+            actuales[ruta] = huella
+            if ruta in self._encolados or self._ya_ingerido(ruta, huella):
+                continue
+            if self._vistos.get(ruta) == huella:
+                listos.append(ruta)
+        self._vistos = actuales
+        return listos
+
+    def _pendientes(self):
+        """Archivos vistos que aún no se ingirieron ni están en cola."""
+        return [r for r, h in self._vistos.items() if r not in self._encolados and not self._ya_ingerido(r, h)]
+
+    def vigilar(self, una_pasada=False):
+        while not self.detener.is_set():
+            for ruta in self.buscar_nuevos():
+                self._encolar(ruta)
+            if una_pasada and not self._pendientes():
+                break
+            self.detener.wait(self.intervalo)
+
+    def _encolar(self, ruta):
+        aviso = False
+        self._encolados.add(ruta)
+        while not self.detener.is_set():
+            try:
+                # Contrapresión: con la cola llena el vigía espera y deja de sondear
+                self.cola.put((ruta, time.time()), timeout=self.intervalo)
+                print(f"[ingesta] En cola: {os.path.basename(ruta)} ({self.cola.qsize()}/{self.cola.maxsize})")
+                return
+            except queue.Full:
+                if not aviso:
+                    print(f"[ingesta] Cola llena ({self.cola.maxsize}); esperando al trabajador...")
+                    aviso = True
+        self._encolados.discard(ruta)
+
+    # --- Trabajador (consumidor) ---
+    def trabajar(self):
+        while not (self.detener.is_set() and self.cola.empty()):
+            try:
+                ruta, detectado = self.cola.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            respaldo = (self.resolucion.siguiente, self.resolucion.ultimos) if self.resolucion is not None else None
+            try:
+                self.procesar_archivo(ruta, detectado)
+            except Exception as e:
+                # Se registra el fallo para no reintentar en bucle; si el archivo cambia se reintenta
+                print(f"[ingesta] Error procesando {os.path.basename(ruta)}: {e!r}")
+                self.duplicados.descartar()
+                if self.resolucion is not None:
+                    self.resolucion.siguiente, self.resolucion.ultimos = respaldo
+                try:
+                    self._deshacer_transaccion()
+                except OSError as error:
+                    # La transacción sigue en el estado y se deshace al reiniciar
+                    print(f"[ingesta] No se pudo deshacer el lote: {error!r}")
+                try:
+                    tamano, mtime = _huella(ruta)
+                except OSError:
+                    # El archivo ya no está; si vuelve a aparecer se reintenta
+                    tamano, mtime = None, None
+                self.estado["archivos"][os.path.basename(ruta)] = {
+                    "tamano": tamano, "mtime_ns": mtime, "error": repr(e),
+                    "procesado": datetime.now().isoformat(timespec="seconds")}
+                self._guardar_estado()
+            finally:
+                self._encolados.discard(ruta)
+                self.cola.task_done()
+
+    def procesar_archivo(self, ruta, detectado=None):
+        """Un micro-lote: un archivo de exportación completo de punta a punta."""
+        nombre = os.path.basename(ruta)
+        huella = _huella(ruta)
+        print(f"\n[ingesta] Procesando lote: {nombre}")
+        with etapa("lote_ingesta") as total:
+            with etapa("cargar_lote") as e:
+                df_bruto = leer_exportacion(ruta)
+                if df_bruto is None:
+                    raise ValueError(f"No se pudo leer '{nombre}'.")
+                filas_archivo = len(df_bruto)
+                df_bruto = self.duplicados.filtrar(df_bruto, ruta)
+                e.filas(entrada=filas_archivo, salida=len(df_bruto))
+            total.filas(entrada=filas_archivo)
+            if df_bruto.empty:
+                self.duplicados.confirmar()
+                self._registrar(nombre, huella, filas_archivo, 0, detectado)
+                print(f"[ingesta] Lote {nombre}: todas sus filas ya estaban ingeridas; no se añade nada.")
+                return
+
+            with etapa("limpiar_lote", filas_entrada=len(df_bruto)):
+                df_limpio = limpiar_datos(df_bruto)
+                # Filas de facturas de lotes anteriores (un proveedor nuevo de una factura reenviada)
+                reenviadas = _claves(df_limpio["no_factura"]).isin(self.facturas)
+                df_reenviadas, df_limpio = df_limpio[reenviadas], df_limpio[~reenviadas]
+
+            lote = self._preparar_nuevas(df_limpio) if not df_limpio.empty else None
+            reenvio = self._preparar_reenviadas(df_reenviadas) if not df_reenviadas.empty else None
+
+            maestros = [t["maestro"] for t in (lote, reenvio) if t is not None]
+            df_maestro = pd.concat(maestros, ignore_index=True) if len(maestros) > 1 else maestros[0]
+            df_retirar = reenvio["maestro_anterior"] if reenvio is not None else None
+            with etapa("anexar_lote", filas_entrada=len(df_maestro)):
+                self._abrir_transaccion(nombre, reenvio["rutas_maestro"] if reenvio is not None else ())
+                if reenvio is not None:
+                    self._reemplazar_maestro(reenvio["rutas_maestro"], reenvio["maestro"])
+                    for carpeta, posicion in ((self.carpeta_limpios, 0), (self.carpeta_enriq, 1)):
+                        self._anexar_tabla(reenvio["proveedores"], carpeta, TABLAS["proveedores"][posicion],
+                                           reenvio["fechas_proveedores"])
+                if lote is not None:
+                    nuevos = lote["clientes_nuevos"]
+                    self._anexar(lote["clientes"][nuevos], lote["facturas"], lote["proveedores"],
+                                 self.carpeta_limpios, 0)
+                    self._anexar(lote["clientes_enr"][nuevos.to_numpy()], lote["facturas_enr"], lote["proveedores"],
+                                 self.carpeta_enriq, 1)
+                    self._anexar_tabla(lote["maestro"], self.carpeta_enriq, TABLA_MAESTRO)
+                top_k_maestro.agregar_lote(df_maestro, os.path.join(self.carpeta_enriq, "top_k_maestro.json"),
+                                           df_retirar=df_retirar)
+                cubo_facturas.agregar_lote(df_maestro, os.path.join(self.carpeta_enriq, "cubo_facturas.parquet"),
+                                           df_retirar=df_retirar)
+            total.filas(salida=len(df_maestro))
+
+        # Guardar el estado con el archivo registrado y sin transacción confirma el lote
+        n_nuevas = len(lote["facturas"]) if lote is not None else 0
+        n_reenviadas = len(reenvio["maestro"]) if reenvio is not None else 0
+        if lote is not None:
+            self.estado["ultimo_cliente"] = (self.resolucion.siguiente - 1 if self.resolucion is not None
+                                             else self.estado["ultimo_cliente"] + len(lote["clientes"]))
+        transaccion = self.estado.pop("transaccion")
+        latencia = self._registrar(nombre, huella, filas_archivo, n_nuevas, detectado, n_reenviadas)
+        self._cerrar_transaccion(transaccion)
+        # Los hashes del lote solo se dan por vistos una vez escritas sus filas
+        self.duplicados.confirmar()
+        if lote is not None:
+            fechas = pd.to_datetime(lote["facturas"]["fecha_factura"], errors="coerce")
+            self.facturas.update(zip(_claves(lote["facturas"]["no_factura"]), fechas))
+        texto_latencia = "" if latencia is None else f", latencia {latencia:.1f} s desde la detección"
+        texto_reenvio = f", {n_reenviadas:,} ya ingeridas recalculadas" if n_reenviadas else ""
+        print(f"[ingesta] Lote {nombre}: {n_nuevas:,} facturas añadidas{texto_reenvio}{texto_latencia}.")
+
+    def _preparar_nuevas(self, df_limpio):
+        """Normaliza, enriquece y arma el maestro de las facturas nuevas del lote (sin escribir)."""
+        with etapa("normalizar_lote", filas_entrada=len(df_limpio)):
+            df_clientes, df_facturas, df_prov = normalizar_tablas(
+                df_limpio, primer_cliente=self.estado["ultimo_cliente"] + 1, resolucion=self.resolucion)
+            # Facturas de clientes ya existentes: solo se anexan los clientes nuevos
+            nuevos = (df_clientes["id_cliente"].isin(self.resolucion.nuevos) if self.resolucion is not None
+                      else pd.Series(True, index=df_clientes.index))
+
+        with etapa("enriquecer_lote", filas_entrada=len(df_facturas)):
+            df_clientes_enr = enriquecer_clientes(df_clientes)
+            df_facturas_enr = enriquecer_facturas(df_facturas, self.cache_destinos, self.procesos)
+
+        with etapa("maestro_lote", filas_entrada=len(df_facturas_enr)):
+            df_maestro = construir_maestro(df_clientes_enr, df_facturas_enr, df_prov.copy())
+
+        return {"clientes": df_clientes, "clientes_enr": df_clientes_enr, "clientes_nuevos": nuevos,
+                "facturas": df_facturas, "facturas_enr": df_facturas_enr, "proveedores": df_prov,
+                "maestro": df_maestro}
+
+    def _preparar_reenviadas(self, df_reenviadas):
+        """
+        Proveedores nuevos de facturas ya ingeridas: sus filas de proveedores y la
+        fila del maestro de cada factura antes y después de sumarlos (la misma que
+        daría construir_maestro con todas sus filas). Solo se leen las particiones
+        de esas facturas.
+        """
+        with etapa("recalcular_reenviadas", filas_entrada=len(df_reenviadas)) as e:
+            df_prov = df_reenviadas[COLUMNAS_PROVEEDOR_FACTURA].drop_duplicates().dropna(
+                subset=["no_factura", "nombre_proveedor"])
+            claves = set(_claves(df_reenviadas["no_factura"]))
+            fechas = pd.Series([self.facturas[c] for c in claves], dtype="datetime64[ns]")
+
+            prov_previos, _ = self._filas_de_facturas(TABLAS["proveedores"][1], claves, fechas)
+            maestro_anterior, rutas_maestro = self._filas_de_facturas(TABLA_MAESTRO, claves, fechas)
+            if "anio_factura" in maestro_anterior.columns:
+                maestro_anterior["anio_factura"] = maestro_anterior["anio_factura"].astype("Int64")
+
+            proveedores = pd.concat([prov_previos, df_prov], ignore_index=True)
+            proveedores["no_factura"] = _claves(proveedores["no_factura"])
+            proveedores["vlr_presupuesto_ppto"] = pd.to_numeric(proveedores["vlr_presupuesto_ppto"], errors="coerce")
+            agregados = agregar_por_factura(proveedores)
+
+            columnas_agregadas = [c for c in agregados.columns if c != "no_factura"]
+            maestro = maestro_anterior.drop(columns=columnas_agregadas, errors="ignore")
+            maestro = maestro.assign(_clave=_claves(maestro["no_factura"])).merge(
+                agregados.rename(columns={"no_factura": "_clave"}), on="_clave", how="left")
+            # Mismos tipos que la versión leída, para escribir los valores con el mismo formato
+            maestro = maestro.reindex(columns=maestro_anterior.columns).astype(
+                {c: maestro_anterior[c].dtype for c in columnas_agregadas if c in maestro_anterior.columns})
+            e.filas(salida=len(maestro))
+
+        fechas_proveedores = _claves(df_prov["no_factura"]).map(self.facturas)
+        return {"proveedores": df_prov, "fechas_proveedores": fechas_proveedores,
+                "maestro_anterior": maestro_anterior, "maestro": maestro, "rutas_maestro": rutas_maestro}
+
+    def _filas_de_facturas(self, nombre, claves, fechas):
+        """
+        Filas de la tabla enriquecida 'nombre' de las facturas 'claves', leyendo
+        solo las particiones de sus 'fechas' (o el CSV plano si no están). Devuelve
+        (filas, rutas donde se buscaron, incluido el CSV plano).
+        """
+        ruta_plana = os.path.join(self.carpeta_enriq, f"{nombre}.csv")
+        anio, mes = claves_particion(fechas)
+        rutas = sorted({os.path.join(self.carpeta_enriq, nombre, f"anio={a}", f"mes={m}", ARCHIVO_PARTICION)
+                        for a, m in zip(anio, mes)})
+        if not all(os.path.exists(r) for r in rutas):
+            rutas = []
+        df = leer_csvs(rutas or [ruta_plana], low_memory=False, encoding="utf-8-sig")
+        filas = df[_claves(df["no_factura"]).isin(claves)].reset_index(drop=True)
+        return filas, [ruta_plana] + rutas
+
+    @staticmethod
+    def _reemplazar_maestro(rutas, df_maestro):
+        """
+        Reescribe las filas de las facturas de 'df_maestro' en cada CSV de 'rutas'
+        (en su misma posición). Las demás filas se copian como texto, sin reinterpretar.
+        """
+        nuevas = df_maestro.assign(_clave=_claves(df_maestro["no_factura"])).set_index("_clave")
+        for ruta in rutas:
+            actual = pd.read_csv(ruta, dtype=str, keep_default_na=False, encoding="utf-8-sig")
+            claves = _claves(actual["no_factura"])
+            filas = claves.isin(nuevas.index)
+            if not filas.any():
+                continue
+            texto = pd.read_csv(io.StringIO(nuevas.reindex(columns=actual.columns).to_csv()),
+                                index_col=0, dtype=str, keep_default_na=False)
+            texto.index = texto.index.astype(str)
+            actual.loc[filas, :] = texto.loc[claves[filas]].to_numpy()
+            actual.to_csv(ruta, index=False, encoding="utf-8-sig")
+
+    def _registrar(self, nombre, huella, filas, facturas, detectado, reenviadas=0):
+        latencia = time.time() - detectado if detectado is not None else None
+        self.estado["archivos"][nombre] = {
+            "tamano": huella[0], "mtime_ns": huella[1], "filas": filas,
+            "facturas": facturas, "facturas_reenviadas": reenviadas,
+            "procesado": datetime.now().isoformat(timespec="seconds"),
+            "latencia_s": None if latencia is None else round(latencia, 2)}
+        self._guardar_estado()
+        return latencia
+
+    def _anexar(self, df_clientes, df_facturas, df_prov, carpeta, posicion):
+        """Añade las 3 tablas (CSV plano + particiones) con los nombres de esa carpeta."""
+        fechas = {
+            "clientes": fechas_por_clave(df_clientes, df_facturas, "id_cliente"),
+            "facturas": None,
+            "proveedores": fechas_por_clave(df_prov, df_facturas, "no_factura"),
+        }
+        tablas = {"clientes": df_clientes, "facturas": df_facturas, "proveedores": df_prov}
+        for clave, df in tablas.items():
+            self._anexar_tabla(df, carpeta, TABLAS[clave][posicion], fechas[clave])
+
+    @staticmethod
+    def _anexar_tabla(df, carpeta, nombre, fechas=None):
+        os.makedirs(carpeta, exist_ok=True)
+        anexar_csv(df, os.path.join(carpeta, f"{nombre}.csv"))
+        escribir_particionado(df, os.path.join(carpeta, nombre), fechas, modo="agregar")
+
+    # --- Transacción de escritura del lote ---
+    def _archivos_anexados(self):
+        """CSV planos y particiones existentes de las tablas a las que se anexan filas."""
+        rutas = []
+        for carpeta, posicion in ((self.carpeta_limpios, 0), (self.carpeta_enriq, 1)):
+            for nombres in TABLAS.values():
+                base = os.path.join(carpeta, nombres[posicion])
+                rutas += [base + ".csv"] + [ruta for _, _, ruta in listar_particiones(base)]
+        base = os.path.join(self.carpeta_enriq, TABLA_MAESTRO)
+        return rutas + [base + ".csv"] + [ruta for _, _, ruta in listar_particiones(base)]
+
+    def _abrir_transaccion(self, nombre, otros_reescritos=()):
+        """
+        Anota los tamaños actuales y respalda los archivos que el lote reescribe
+        (ARCHIVOS_REESCRITOS más 'otros_reescritos', p. ej. el maestro de facturas reenviadas).
+        """
+        tamanos = {ruta: os.path.getsize(ruta) if os.path.exists(ruta) else None
+                   for ruta in self._archivos_anexados()}
+        reescritos = {}
+        for ruta in [os.path.join(self.carpeta_enriq, a) for a in ARCHIVOS_REESCRITOS] + list(otros_reescritos):
+            reescritos[ruta] = os.path.exists(ruta)
+            if reescritos[ruta]:
+                shutil.copy2(ruta, ruta + SUFIJO_RESPALDO)
+        self.estado["transaccion"] = {"archivo": nombre, "tamanos": tamanos, "reescritos": reescritos}
+        self._guardar_estado()
+
+    def _deshacer_transaccion(self):
+        """Devuelve las salidas al estado anotado por _abrir_transaccion (si hay transacción abierta)."""
+        transaccion = self.estado.get("transaccion")
+        if transaccion is None:
+            return
+        tamanos = transaccion["tamanos"]
+        for ruta in self._archivos_anexados():
+            if not os.path.exists(ruta):
+                continue
+            previo = tamanos.get(ruta)
+            if previo is None:
+                # Archivo o partición creada por el lote
+                os.remove(ruta)
+            elif os.path.getsize(ruta) > previo:
+                with open(ruta, "r+b") as f:
+                    f.truncate(previo)
+        for ruta, existia in transaccion["reescritos"].items():
+            if existia and os.path.exists(ruta + SUFIJO_RESPALDO):
+                os.replace(ruta + SUFIJO_RESPALDO, ruta)
+            elif not existia and os.path.exists(ruta):
+                os.remove(ruta)
+        del self.estado["transaccion"]
+        self._guardar_estado()
+        print(f"[ingesta] Escrituras del lote {transaccion['archivo']} deshechas.")
+
+    @staticmethod
+    def _cerrar_transaccion(transaccion):
+        for ruta, existia in transaccion["reescritos"].items():
+            if existia and os.path.exists(ruta + SUFIJO_RESPALDO):
+                os.remove(ruta + SUFIJO_RESPALDO)
+
+    # --- Ciclo de vida ---
+    def ejecutar(self, una_pasada=False):
+        """Arranca vigía y trabajador; vuelve al detenerse (Ctrl+C / SIGTERM) o, con una_pasada, al vaciar la cola."""
+        trabajador = threading.Thread(target=self.trabajar, name="ingesta-trabajador", daemon=True)
+        vigia = threading.Thread(target=self.vigilar, args=(una_pasada,), name="ingesta-vigia", daemon=True)
+        trabajador.start()
+        vigia.start()
+        print(f"[ingesta] Vigilando '{self.carpeta_entrada}' cada {self.intervalo:g} s "
+              f"(cola máx. {self.cola.maxsize}). Ctrl+C para detener.")
+        try:
+            while vigia.is_alive():
+                vigia.join(timeout=0.5)
+        except KeyboardInterrupt:
+            print("\n[ingesta] Deteniendo: se termina el lote en curso...")
+        # El trabajador vacía lo que ya está en cola antes de salir
+        self.detener.set()
+        trabajador.join()
+        print("[ingesta] Servicio detenido.")
+
+
+# -----------------------------------------------------------------------------
+# EJECUCIÓN PRINCIPAL
+# -----------------------------------------------------------------------------
+
+if __name__ == "__main__":
+    if args.clientes is None:
+        args.clientes = MODO_CLIENTES
+    elif args.clientes not in MODOS_CLIENTES:
+        parser.error(f"--clientes debe ser uno de {MODOS_CLIENTES}, no '{args.clientes}'.")
+    if args.max_dias is None:
+        args.max_dias = MAX_DIAS
+
+    iniciar_ejecucion("servicio_ingesta")
+    servicio = ServicioIngesta(args.entrada, args.limpios, args.enriquecidos,
+                               args.intervalo, args.cola, args.incluir_existentes,
+                               args.clientes, args.max_dias, args.procesos)
+    signal.signal(signal.SIGTERM, lambda *_: servicio.detener.set())
+    servicio.ejecutar(una_pasada=args.una_pasada)
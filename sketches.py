@@ -0,0 +1,289 @@
+# sketches.py
+
+import numpy as np
+import pandas as pd
+
+# -----------------------------------------------------------------------------
+# Resúmenes aproximados (sketches) de memoria acotada y combinables: se pueden
+# actualizar por lotes (chunks) y unir los de distintos archivos o años.
+# -----------------------------------------------------------------------------
+
+
+class SketchKLL:
+    """
+    Sketch KLL de cuantiles aproximados. Los valores se acumulan en niveles
+    (compactadores); el nivel i guarda ítems de peso 2**i y, cuando se llena,
+    se ordena y pasa la mitad de sus ítems al nivel siguiente. Mientras no se
+    haya compactado nada los cuantiles son exactos.
+    """
+
+    def __init__(self, k=200, semilla=42):
+        self.k = k
+        self.n = 0
+        self.niveles = [np.empty(0)]
+        self._rng = np.random.default_rng(semilla)
+
+    def _capacidad(self, nivel):
+        altura = len(self.niveles)
+        return max(int(np.ceil(self.k * (2 / 3) ** (altura - 1 - nivel))), 2)
+
+    def _compactar(self):
+        nivel = 0
+        while nivel < len(self.niveles):
+            if len(self.niveles[nivel]) > self._capacidad(nivel):
+                if nivel + 1 == len(self.niveles):
+                    self.niveles.append(np.empty(0))
+                datos = np.sort(self.niveles[nivel])
+                resto = datos[:0]
+                if len(datos) % 2:
+                    resto, datos = datos[-1:], datos[:-1]
+                desplazamiento = int(self._rng.integers(2))
+                self.niveles[nivel + 1] = np.concatenate([self.niveles[nivel + 1], datos[desplazamiento::2]])
+                self.niveles[nivel] = resto
+            nivel += 1
+
+    def actualizar(self, valores):
+        """Añade un lote de valores (se ignoran los NaN)."""
+        valores = np.asarray(valores, dtype=float)
+        valores = valores[~np.isnan(valores)]
+        if len(valores) == 0:
+            return
+        self.n += len(valores)
+        self.niveles[0] = np.concatenate([self.niveles[0], valores])
+        self._compactar()
+
+    def combinar(self, otro):
+        """Une otro sketch KLL a este (in-place)."""
+        while len(self.niveles) < len(otro.niveles):
+            self.niveles.append(np.empty(0))
+        for i, valores in enumerate(otro.niveles):
+            self.niveles[i] = np.concatenate([self.niveles[i], valores])
+        self.n += otro.n
+        self._compactar()
+        return self
+
+    def _ponderados(self):
+        valores = np.concatenate(self.niveles)
+        pesos = np.concatenate([np.full(len(v), 2.0 ** i) for i, v in enumerate(self.niveles)])
+        orden = np.argsort(valores, kind='stable')
+        return valores[orden], pesos[orden]
+
+    def cuantiles(self, qs):
+        """Cuantiles aproximados para la lista qs (en [0, 1])."""
+        qs = np.atleast_1d(np.asarray(qs, dtype=float))
+        if self.n == 0:
+            return np.full(len(qs), np.nan)
+        if len(self.niveles) == 1:
+            # Sin compactar: cuantiles exactos con interpolación lineal (como pandas)
+            return np.quantile(self.niveles[0], qs)
+        valores, pesos = self._ponderados()
+        acumulado = np.cumsum(pesos) / pesos.sum()
+        idx = np.searchsorted(acumulado, qs, side='left')
+        return valores[np.clip(idx, 0, len(valores) - 1)]
+
+    def cdf(self, puntos):
+        """Fracción aproximada de valores <= cada punto."""
+        puntos = np.atleast_1d(np.asarray(puntos, dtype=float))
+        if self.n == 0:
+            return np.full(len(puntos), np.nan)
+        valores, pesos = self._ponderados()
+        acumulado = np.concatenate([[0.0], np.cumsum(pesos)]) / pesos.sum()
+        return acumulado[np.searchsorted(valores, puntos, side='right')]
+
+    def a_dict(self):
+        return {'k': self.k, 'n': self.n, 'niveles': [v.tolist() for v in self.niveles]}
+
+    @classmethod
+    def desde_dict(cls, datos):
+        sketch = cls(k=datos['k'])
+        sketch.n = datos['n']
+        sketch.niveles = [np.asarray(v, dtype=float) for v in datos['niveles']]
+        return sketch
+
+
+class SpaceSaving:
+    """
+    Top-k aproximado (heavy hitters) con Space-Saving: guarda como máximo
+    'capacidad' contadores. El conteo estimado de cada ítem nunca es menor al
+    real y lo supera como mucho en 'errores[item]'. Si hay menos valores
+    distintos que 'capacidad', los conteos son exactos.
+    """
+
+    def __init__(self, capacidad=1000):
+        self.capacidad = capacidad
+        self.n = 0
+        self.conteos = pd.Series(dtype='int64')
+        self.errores = pd.Series(dtype='int64')
+
+    def _minimo(self):
+        """Conteo que se le puede atribuir a un ítem no vigilado."""
+        if len(self.conteos) < self.capacidad:
+            return 0
+        return int(self.conteos.min())
+
+    def _unir(self, conteos, errores, minimo, n):
+        indice = self.conteos.index.union(conteos.index)
+        minimo_propio = self._minimo()
+        total = (self.conteos.reindex(indice, fill_value=minimo_propio)
+                 + conteos.reindex(indice, fill_value=minimo))
+        error = (self.errores.reindex(indice, fill_value=minimo_propio)
+                 + errores.reindex(indice, fill_value=minimo))
+        total = total.sort_values(ascending=False, kind='stable').head(self.capacidad)
+        self.conteos = total.astype('int64')
+        self.errores = error.reindex(total.index).astype('int64')
+        self.n += n
+
+    def actualizar(self, valores):
+        """Añade un lote de valores (Series o iterable); se ignoran los nulos."""
+        conteos = pd.Series(valores).value_counts(dropna=True)
+        self.actualizar_conteos(conteos)
+
+    def actualizar_conteos(self, conteos):
+        """Añade conteos exactos de un lote ({item: conteo} o Series)."""
+        conteos = pd.Series(conteos, dtype='int64')
+        self._unir(conteos, pd.Series(0, index=conteos.index, dtype='int64'), 0, int(conteos.sum()))
+
+    def retirar_conteos(self, conteos):
+        """
+        Descuenta conteos exactos de ítems que ya se habían añadido (p. ej. filas
+        reemplazadas). Solo cambian los ítems vigilados: para los demás el mínimo
+        sigue siendo una cota superior de su conteo.
+        """
+        conteos = pd.Series(conteos, dtype='int64')
+        total = (self.conteos - conteos.reindex(self.conteos.index, fill_value=0)).clip(lower=0)
+        if len(total) < self.capacidad:
+            # Sin llenar la capacidad los conteos son exactos: un ítem en 0 ya no está
+            total = total[total > 0]
+        self.conteos = total.sort_values(ascending=False, kind='stable').astype('int64')
+        self.errores = self.errores.reindex(self.conteos.index).clip(upper=self.conteos).astype('int64')
+        self.n -= int(conteos.sum())
+
+    def combinar(self, otro):
+        """Une otro Space-Saving a este (in-place)."""
+        self._unir(otro.conteos, otro.errores, otro._minimo(), otro.n)
+        return self
+
+    def top(self, k=10):
+        """Los k ítems más frecuentes con su conteo estimado."""
+        return self.conteos.head(k)
+
+    def a_dict(self):
+        return {
+            'capacidad': self.capacidad, 'n': self.n,
+            'items': [str(i) for i in self.conteos.index],
+            'conteos': self.conteos.tolist(), 'errores': self.errores.tolist(),
+        }
+
+    @classmethod
+    def desde_dict(cls, datos):
+        sketch = cls(capacidad=datos['capacidad'])
+        sketch.n = datos['n']
+        sketch.conteos = pd.Series(datos['conteos'], index=datos['items'], dtype='int64')
+        sketch.errores = pd.Series(datos['errores'], index=datos['items'], dtype='int64')
+        return sketch
+
+
+class CountMin:
+    """
+    Sketch Count-Min: matriz de 'profundidad' x 'ancho' contadores. Estima el
+    conteo de cualquier ítem (no solo los del top-k) con sobreestimación
+    acotada por ~ n * e / ancho. Dos sketches con igual forma se combinan sumando.
+    """
+
+    def __init__(self, ancho=2048, profundidad=4):
+        self.ancho = ancho
+        self.profundidad = profundidad
+        self.n = 0
+        self.tabla = np.zeros((profundidad, ancho), dtype=np.int64)
+
+    def _columnas(self, items):
+        items = np.asarray([str(i) for i in items], dtype=object)
+        return [
+            (pd.util.hash_array(items, hash_key=f"countmin{fila:08d}") % self.ancho).astype(np.int64)
+            for fila in range(self.profundidad)
+        ]
+
+    def actualizar(self, valores):
+        """Añade un lote de valores (Series o iterable); se ignoran los nulos."""
+        self.actualizar_conteos(pd.Series(valores).value_counts(dropna=True))
+
+    def actualizar_conteos(self, conteos):
+        conteos = pd.Series(conteos, dtype='int64')
+        if conteos.empty:
+            return
+        for fila, cols in enumerate(self._columnas(conteos.index)):
+            np.add.at(self.tabla[fila], cols, conteos.to_numpy())
+        self.n += int(conteos.sum())
+
+    def combinar(self, otro):
+        if (otro.ancho, otro.profundidad) != (self.ancho, self.profundidad):
+            raise ValueError("Solo se pueden combinar sketches Count-Min con el mismo ancho y profundidad.")
+        self.tabla += otro.tabla
+        self.n += otro.n
+        return self
+
+    def estimar(self, items):
+        """Conteo estimado (cota superior) de cada ítem."""
+        cols = self._columnas(items)
+        return pd.Series(
+            np.min([self.tabla[fila, c] for fila, c in enumerate(cols)], axis=0),
+            index=list(items), dtype='int64',
+        )
+
+    def a_dict(self):
+        return {'ancho': self.ancho, 'profundidad': self.profundidad, 'n': self.n, 'tabla': self.tabla.tolist()}
+
+    @classmethod
+    def desde_dict(cls, datos):
+        sketch = cls(ancho=datos['ancho'], profundidad=datos['profundidad'])
+        sketch.n = datos['n']
+        sketch.tabla = np.asarray(datos['tabla'], dtype=np.int64)
+        return sketch
+
+
+class FiltroBloom:
+    """
+    Filtro de Bloom sobre hashes de 64 bits ya calculados (p. ej. con
+    pd.util.hash_pandas_object). Las k posiciones salen por doble hashing de
+    las dos mitades del hash. Sin falsos negativos; los falsos positivos
+    rondan 'tasa_fp' mientras no se superen los 'capacidad' elementos.
+    """
+
+    def __init__(self, capacidad=1_000_000, tasa_fp=0.01):
+        capacidad = max(int(capacidad), 1)
+        self.capacidad = capacidad
+        self.n_bits = max(int(np.ceil(-capacidad * np.log(tasa_fp) / np.log(2) ** 2)), 64)
+        self.k = max(int(round(self.n_bits / capacidad * np.log(2))), 1)
+        self.bits = np.zeros((self.n_bits + 7) // 8, dtype=np.uint8)
+        self.n = 0
+
+    def _posiciones(self, hashes):
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        h1 = hashes & np.uint64(0xFFFFFFFF)
+        h2 = (hashes >> np.uint64(32)) | np.uint64(1)
+        i = np.arange(self.k, dtype=np.uint64)[:, None]
+        return (h1[None, :] + i * h2[None, :]) % np.uint64(self.n_bits)
+
+    def agregar(self, hashes):
+        pos = self._posiciones(hashes).ravel()
+        np.bitwise_or.at(self.bits, pos >> np.uint64(3), (1 << (pos & np.uint64(7))).astype(np.uint8))
+        self.n += len(hashes)
+
+    def contiene(self, hashes):
+        """True donde el hash puede estar (posible falso positivo); False = seguro que no está."""
+        pos = self._posiciones(hashes)
+        marcados = (self.bits[pos >> np.uint64(3)] >> (pos & np.uint64(7)).astype(np.uint8)) & 1
+        return marcados.all(axis=0).astype(bool)
+
+    def a_dict(self):
+        return {'capacidad': self.capacidad, 'n_bits': self.n_bits, 'k': self.k, 'n': self.n, 'bits': self.bits}
+
+    @classmethod
+    def desde_dict(cls, datos):
+        filtro = cls.__new__(cls)
+        filtro.capacidad = int(datos['capacidad'])
+        filtro.n_bits = int(datos['n_bits'])
+        filtro.k = int(datos['k'])
+        filtro.n = int(datos['n'])
+        filtro.bits = np.asarray(datos['bits'], dtype=np.uint8)
+        return filtro
@@ -0,0 +1,67 @@
+import os
+import subprocess
+import sys
+import time
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Presupuesto de arranque de 'cvu --help' (segundos, incluye el arranque del intérprete)
+PRESUPUESTO_ARRANQUE_S = float(os.environ.get("CVU_PRESUPUESTO_ARRANQUE_S", "1.0"))
+DEPENDENCIAS_PESADAS = ["pandas", "numpy", "sklearn", "matplotlib", "seaborn", "mlxtend",
+                        "pycountry", "geonamescache", "pyarrow"]
+
+
+def _python(codigo):
+    return subprocess.run([sys.executable, "-c", codigo], cwd=RAIZ, capture_output=True, text=True, check=True)
+
+
+def test_importar_cvu_no_carga_dependencias_pesadas():
+    salida = _python(
+        "import sys, cvu\n"
+        "cvu.crear_parser().parse_known_args(['eda', '--reporte'])\n"
+        f"print(','.join(m for m in {DEPENDENCIAS_PESADAS!r} if m in sys.modules))\n")
+    assert salida.stdout.strip() == ""
+
+
+def test_ayuda_dentro_del_presupuesto():
+    # Mejor de tres corridas para no depender de un arranque en frío del disco
+    tiempos = []
+    for _ in range(3):
+        inicio = time.perf_counter()
+        resultado = subprocess.run([sys.executable, "-m", "cvu", "--help"], cwd=RAIZ, capture_output=True, text=True)
+        tiempos.append(time.perf_counter() - inicio)
+        assert resultado.returncode == 0
+        assert "maestro" in resultado.stdout
+    assert min(tiempos) < PRESUPUESTO_ARRANQUE_S, f"cvu --help tardó {min(tiempos):.2f} s"
+
+
+def test_ayuda_de_subcomandos_no_carga_dependencias_pesadas():
+    # 'cvu <sub> --help' lo resuelve el argparse del script antes de sus imports pesados
+    cvu = _importar_cvu()
+    for nombre in cvu.SUBCOMANDOS:
+        salida = _python(
+            "import sys, cvu\n"
+            "try:\n"
+            f"    cvu.main([{nombre!r}, '--help'])\n"
+            "except SystemExit as e:\n"
+            "    assert e.code in (0, None), e.code\n"
+            f"print('CARGADAS:' + ','.join(m for m in {DEPENDENCIAS_PESADAS!r} if m in sys.modules))\n")
+        assert "usage:" in salida.stdout, nombre
+        assert salida.stdout.strip().splitlines()[-1] == "CARGADAS:", f"cvu {nombre} --help: {salida.stdout.splitlines()[-1]}"
+
+
+def _importar_cvu():
+    import importlib
+    sys.path.insert(0, RAIZ)
+    try:
+        return importlib.import_module("cvu")
+    finally:
+        sys.path.remove(RAIZ)
+
+
+def test_alias_y_subcomando_desconocido():
+    cvu = _importar_cvu()
+    assert cvu._nombre_canonico("reglas") == "rules"
+    assert cvu._nombre_canonico("ingest") == "ingest"
+    assert cvu._nombre_canonico(None) is None
+    assert all(os.path.exists(os.path.join(RAIZ, script)) for script, _, _ in cvu.SUBCOMANDOS.values())
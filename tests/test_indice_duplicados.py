@@ -0,0 +1,57 @@
+import os
+import sys
+
+import pandas as pd
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+from indice_duplicados import IndiceDuplicados, hash_filas, texto_canonico  # noqa: E402
+
+
+def _lote(filas):
+    """filas: (no_factura, proveedor, valor del ítem)."""
+    return pd.DataFrame(filas, columns=["no_factura", "nombre_proveedor", "vlr_total_item_factura"])
+
+
+def test_texto_canonico_iguala_enteros_textos_y_flotantes():
+    assert texto_canonico(pd.Series([123])).tolist() == ["123"]
+    assert texto_canonico(pd.Series(["123"]), numerica=True).tolist() == ["123"]
+    assert texto_canonico(pd.Series([123.0])).tolist() == ["123"]
+    assert texto_canonico(pd.Series([None, " Avianca "])).tolist() == ["", "Avianca"]
+
+    como_texto = pd.DataFrame({"no_factura": ["123"], "nombre_proveedor": ["Avianca"]})
+    como_numero = pd.DataFrame({"no_factura": [123.0], "nombre_proveedor": ["Avianca"]})
+    assert (hash_filas(como_texto) == hash_filas(como_numero)).all()
+
+
+def test_filtrar_dentro_y_entre_archivos(tmp_path):
+    indice = IndiceDuplicados(str(tmp_path), usar_bloom=False)
+    primero = _lote([(1, "Avianca", 100), (1, "Avianca", 250), (1, "Avianca", 100), (2, "Decameron", 80)])
+    conservadas = indice.filtrar(primero, "enero.csv")
+    # Ítems distintos de la misma factura+proveedor en un archivo se conservan; la fila idéntica no
+    assert conservadas.index.tolist() == [0, 1, 3]
+
+    segundo = _lote([(1, "Avianca", 999), (2, "Decameron", 80), (3, "Avianca", 50)])
+    conservadas = indice.filtrar(segundo, "febrero.csv")
+    # La factura+proveedor 1/Avianca ya llegó en otro archivo y 2/Decameron es una fila repetida
+    assert conservadas["no_factura"].tolist() == [3]
+    assert indice._reporte_pendiente["febrero.csv"] == {
+        "filas": 3, "filas_repetidas": 1, "factura_proveedor_vista": 1, "conservadas": 1}
+
+
+def test_confirmar_persiste_y_descartar_olvida(tmp_path):
+    for usar_bloom in (True, False):
+        carpeta = str(tmp_path / str(usar_bloom))
+        indice = IndiceDuplicados(carpeta, usar_bloom=usar_bloom)
+        indice.filtrar(_lote([(1, "Avianca", 100)]), "enero.csv")
+        indice.confirmar()
+        indice.filtrar(_lote([(2, "Decameron", 80)]), "febrero.csv")
+        indice.descartar()
+
+        reabierto = IndiceDuplicados(carpeta, usar_bloom=usar_bloom)
+        assert list(reabierto.reporte) == ["enero.csv"]
+        assert reabierto.filtrar(_lote([(1, "Avianca", 100)]), "marzo.csv").empty
+        assert len(reabierto.filtrar(_lote([(2, "Decameron", 80)]), "marzo.csv")) == 1
+
+        assert IndiceDuplicados(carpeta, usar_bloom=usar_bloom, reiniciar=True).reporte == {}
@@ -0,0 +1,97 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+from indice_vecinos import IndiceVecinos, vectores_maestro  # noqa: E402
+
+pytest.importorskip("sklearn")
+
+
+def _vectores_agrupados(n=3000, dimensiones=16, grupos=40, semilla=5):
+    """Vectores alrededor de 'grupos' centros, normalizados (L2 entre unitarios ordena igual que el coseno)."""
+    rng = np.random.default_rng(semilla)
+    centros = rng.normal(size=(grupos, dimensiones))
+    vectores = centros[rng.integers(grupos, size=n)] + rng.normal(scale=0.3, size=(n, dimensiones))
+    return (vectores / np.linalg.norm(vectores, axis=1, keepdims=True)).astype(np.float32)
+
+
+def _maestro(n=500, semilla=7):
+    rng = np.random.default_rng(semilla)
+    return pd.DataFrame({
+        'no_factura': np.arange(1000, 1000 + n),
+        'n_proveedores': rng.integers(1, 4, n),
+        'suma_vlr_presupuesto_ppto': rng.gamma(2.0, 500.0, n).round(2),
+        'proveedor_principal': rng.choice(['Avianca', 'Decameron', 'Hoteles Estelar', 'Latam', None], n),
+        'destino_ciudad': rng.choice(['Cartagena', 'Miami', 'Madrid', 'Cancun', 'Lima', 'Cusco'], n),
+        'genero': rng.choice(['Hombre', 'Mujer'], n),
+        'rango_edades': rng.choice(['21 - 30', '31 - 40', '41 - 50', '51 - 60'], n),
+    })
+
+
+def test_recall_ivf_contra_fuerza_bruta():
+    vectores = _vectores_agrupados()
+    claves = np.arange(len(vectores)) * 3
+    indice = IndiceVecinos.construir(vectores, claves, semilla=1)
+    assert len(indice.centroides) == round(np.sqrt(len(vectores)))
+
+    k, aciertos = 10, 0
+    consultas = np.random.default_rng(2).choice(len(vectores), 100, replace=False)
+    for i in consultas:
+        # Vecinos exactos por coseno (sin la propia consulta)
+        similitud = vectores @ vectores[i]
+        similitud[i] = -np.inf
+        exactos = set(claves[np.argsort(-similitud, kind='stable')[:k]])
+        encontrados, distancias = indice.vecinos_de(claves[i], k=k, n_sondeos=8)
+        assert len(encontrados) == k and np.all(np.diff(distancias) >= 0)
+        assert claves[i] not in encontrados
+        aciertos += len(exactos & set(encontrados))
+    assert aciertos / (k * len(consultas)) >= 0.9
+
+    # Sondeando todas las listas la búsqueda es exacta (L2)
+    i = consultas[0]
+    encontrados, distancias = indice.vecinos_de(claves[i], k=k, n_sondeos=len(indice.centroides))
+    d = np.linalg.norm(vectores - vectores[i], axis=1)
+    d[i] = np.inf
+    np.testing.assert_array_equal(encontrados, claves[np.argsort(d, kind='stable')[:k]])
+    np.testing.assert_allclose(distancias, np.sort(d)[:k], rtol=1e-4, atol=1e-5)
+
+
+def test_guardar_cargar_y_vectorizar(tmp_path):
+    df = _maestro()
+    vectores, codificador, componentes = vectores_maestro(df, dimensiones=6)
+    assert componentes is not None and vectores.shape == (len(df), 6)
+    claves = df['no_factura'].to_numpy(dtype=np.int64)
+    construido = IndiceVecinos.construir(vectores, claves, codificador=codificador, componentes=componentes)
+    construido.guardar(str(tmp_path / "indice"))
+
+    indice = IndiceVecinos.cargar(str(tmp_path / "indice"))
+    assert isinstance(indice.vectores, np.memmap) and isinstance(indice.claves, np.memmap)
+    for nombre in ("centroides", "vectores", "claves", "inicios", "orden_claves"):
+        np.testing.assert_array_equal(getattr(indice, nombre), getattr(construido, nombre))
+    np.testing.assert_array_equal(indice.componentes, componentes)
+
+    # El codificador y la SVD guardados reproducen el vector de construcción
+    filas = [0, 17, 250, len(df) - 1]
+    np.testing.assert_allclose(indice.vectorizar(df.iloc[filas]), vectores[filas], rtol=1e-4, atol=1e-5)
+    for fila in filas:
+        pos = indice.posicion(claves[fila])
+        np.testing.assert_allclose(indice.vectores[pos], vectores[fila], rtol=1e-6)
+    assert indice.vecinos_de(claves[17], k=5)[0].tolist() == construido.vecinos_de(claves[17], k=5)[0].tolist()
+
+    # Factura no indexada: copia de la 17 con otro número, valores sin vocabulario incluidos
+    nueva = df.iloc[[17]].assign(no_factura=99999)
+    assert indice.posicion(99999) is None
+    with pytest.raises(KeyError):
+        indice.vecinos_de(99999)
+    encontrados, distancias = indice.buscar(indice.vectorizar(nueva)[0], k=3, n_sondeos=len(indice.centroides))
+    iguales = df[(df.drop(columns='no_factura').fillna('') == nueva.drop(columns='no_factura').fillna('').iloc[0])
+                 .all(axis=1)]['no_factura']
+    assert encontrados[0] in set(iguales) and distancias[0] < 1e-3
+    desconocida = nueva.assign(destino_ciudad='Tokio', proveedor_principal='Otro')
+    assert indice.vectorizar(desconocida).shape == (1, 6)
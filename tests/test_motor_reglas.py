@@ -0,0 +1,114 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+from motor_reglas import (COLUMNAS_REGLAS, codificar_transacciones, comparar_particiones,  # noqa: E402
+                          itemsets_frecuentes, minar_por_particion, reglas_asociacion)
+
+frequent_patterns = pytest.importorskip("mlxtend.frequent_patterns")
+
+COLUMNAS = ['proveedor_principal', 'destino_ciudad', 'genero', 'rango_edades']
+METRICAS = COLUMNAS_REGLAS[2:]
+
+
+def _fixture(n=400, semilla=3):
+    """Facturas con nulos en todas las columnas y 'Cartagena' como proveedor y como destino."""
+    rng = np.random.default_rng(semilla)
+    df = pd.DataFrame({
+        'proveedor_principal': rng.choice(['Avianca', 'Decameron', 'Cartagena', None], n, p=[.4, .3, .2, .1]),
+        'destino_ciudad': rng.choice(['Cartagena', 'Miami', 'Madrid', None], n, p=[.35, .3, .25, .1]),
+        'genero': rng.choice(['Hombre', 'Mujer', None], n, p=[.45, .45, .1]),
+        'rango_edades': rng.choice(['31 - 40', '41 - 50', None], n, p=[.5, .4, .1]),
+    })
+    # Asociación fuerte para que haya reglas por encima de cualquier umbral
+    df.loc[df['proveedor_principal'] == 'Decameron', 'destino_ciudad'] = 'Cartagena'
+    return df
+
+
+def _one_hot(df):
+    """One-hot booleano de referencia: un valor repetido en dos columnas se prefija con la columna; nulos = sin ítem."""
+    valores = {col: df[col].dropna().unique() for col in COLUMNAS}
+    repetidos = pd.Series(np.concatenate(list(valores.values()))).value_counts()
+    return pd.DataFrame({(f"{col}_{v}" if repetidos[v] > 1 else v): (df[col] == v).to_numpy()
+                         for col in COLUMNAS for v in valores[col]})
+
+
+def _por_itemset(tabla):
+    return tabla.set_index(tabla['itemsets'])['support'].sort_index(key=lambda s: s.map(sorted).map(str))
+
+
+def _por_regla(tabla):
+    tabla = tabla.copy()
+    tabla.index = [(tuple(sorted(a)), tuple(sorted(c))) for a, c in zip(tabla['antecedents'], tabla['consequents'])]
+    return tabla.sort_index()[METRICAS].astype(float)
+
+
+def test_etiquetas_que_colisionan_se_prefijan():
+    transacciones = codificar_transacciones(_fixture(), COLUMNAS)
+    assert 'proveedor_principal_Cartagena' in transacciones.etiquetas
+    assert 'destino_ciudad_Cartagena' in transacciones.etiquetas
+    assert 'Cartagena' not in transacciones.etiquetas
+    assert 'None' not in transacciones.etiquetas and 'nan' not in transacciones.etiquetas
+
+
+@pytest.mark.parametrize("min_support, max_len", [(0.02, None), (0.05, 2)])
+def test_itemsets_iguales_a_mlxtend(min_support, max_len):
+    df = _fixture()
+    transacciones = codificar_transacciones(df, COLUMNAS)
+    propios = itemsets_frecuentes(transacciones, min_support=min_support, max_len=max_len)
+    esperados = frequent_patterns.apriori(_one_hot(df), min_support=min_support,
+                                          use_colnames=True, max_len=max_len)
+    propios, esperados = _por_itemset(propios), _por_itemset(esperados)
+    assert list(propios.index) == list(esperados.index)
+    np.testing.assert_allclose(propios.to_numpy(), esperados.to_numpy())
+
+
+@pytest.mark.parametrize("metric, min_threshold", [('lift', 1.1), ('confidence', 0.3), ('leverage', 0.0)])
+def test_reglas_y_metricas_iguales_a_mlxtend(metric, min_threshold):
+    df = _fixture()
+    transacciones = codificar_transacciones(df, COLUMNAS)
+    itemsets = itemsets_frecuentes(transacciones, min_support=0.02)
+    propias = reglas_asociacion(itemsets, metric=metric, min_threshold=min_threshold)
+    assert list(propias.columns) == COLUMNAS_REGLAS
+
+    one_hot = _one_hot(df)
+    esperadas = frequent_patterns.association_rules(
+        frequent_patterns.apriori(one_hot, min_support=0.02, use_colnames=True),
+        num_itemsets=len(one_hot), metric=metric, min_threshold=min_threshold)
+    propias, esperadas = _por_regla(propias), _por_regla(esperadas)
+    assert len(propias) > 0
+    assert list(propias.index) == list(esperadas.index)
+    for metrica in METRICAS:
+        np.testing.assert_allclose(propias[metrica].to_numpy(), esperadas[metrica].to_numpy(),
+                                   rtol=1e-9, atol=1e-12, err_msg=metrica)
+
+
+def test_particiones_comparten_etiquetas():
+    # 'Madrid' es proveedor y destino solo en la partición A; en B es solo destino
+    a = pd.DataFrame({'proveedor_principal': ['Madrid', 'Avianca'] * 20,
+                      'destino_ciudad': ['Madrid', 'Miami'] * 20})
+    b = pd.DataFrame({'proveedor_principal': ['Decameron', 'Avianca'] * 20,
+                      'destino_ciudad': ['Madrid', 'Miami'] * 20})
+    df = pd.concat([a.assign(particion='A'), b.assign(particion='B')], ignore_index=True)
+    columnas = ['proveedor_principal', 'destino_ciudad']
+
+    reglas = minar_por_particion(df, 'particion', columnas=columnas, min_support=0.1,
+                                 metric='lift', min_threshold=0.0, n_procesos=1)
+    etiquetas = set().union(*reglas['antecedents'], *reglas['consequents'])
+    assert 'Madrid' not in etiquetas
+    assert etiquetas <= set(codificar_transacciones(df, columnas).columnas_items)
+
+    # Madrid como destino lleva la misma etiqueta en ambas particiones
+    por_particion = reglas.groupby('particion')['antecedents'].agg(lambda s: set().union(*s))
+    assert all('destino_ciudad_Madrid' in items for items in por_particion)
+    comparacion = comparar_particiones(reglas)
+    misma = comparacion[(comparacion['antecedents'] == frozenset({'Miami'}))
+                        & (comparacion['consequents'] == frozenset({'Avianca'}))]
+    assert misma['n_particiones'].tolist() == [2]
+    assert misma['deriva'].tolist() == [0.0]
@@ -0,0 +1,94 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+from resolucion_clientes import ResolucionClientes  # noqa: E402
+
+CLIENTE = {
+    'estado_civil': 'Casado', 'pais_residencia': 'Colombia', 'cant_polizas': 1, 'rango_edades': '41 - 50',
+    'genero': 'Mujer', 'zonas_ciudades_cli': 'Bogota', 'anio_mes_1ra_poliza': '201207',
+    'rango_vlr_anticipos': '14M - 20M', 'rango_vlr_disponible': '0 - 5M', 'empresa_cvu': 'Circular',
+}
+
+
+def _facturas(filas):
+    """filas: (fecha, cambios sobre CLIENTE)."""
+    return pd.DataFrame([{**CLIENTE, **cambios, 'no_factura': 1000 + i, 'fecha_factura': pd.Timestamp(fecha)}
+                         for i, (fecha, cambios) in enumerate(filas)])
+
+
+def test_enlaza_facturas_cercanas_del_mismo_cliente():
+    df = _facturas([('2017-12-01', {}), ('2017-12-10', {}), ('2017-12-20', {})])
+    ids = ResolucionClientes(max_dias=30).asignar(df)
+    assert ids.nunique() == 1
+    assert ids.iloc[0] == 'cliente_1'
+
+
+def test_separa_por_evidencia_y_sin_encadenar():
+    df = _facturas([
+        ('2017-12-01', {}),
+        ('2017-12-02', {'anio_mes_1ra_poliza': '201809'}),
+        ('2017-12-03', {'rango_vlr_anticipos': '0 - 5M'}),
+        # A 20 días del ancla: mismo cliente
+        ('2017-12-21', {}),
+        # A 40 días del ancla aunque a 20 de la anterior: cliente nuevo (no transitivo)
+        ('2018-01-10', {}),
+    ])
+    ids = ResolucionClientes(max_dias=30).asignar(df).tolist()
+    assert ids == ['cliente_1', 'cliente_2', 'cliente_3', 'cliente_1', 'cliente_4']
+
+
+def test_facturas_no_resolubles_quedan_como_cliente_propio():
+    df = _facturas([
+        ('2017-12-01', {}),
+        # Sin mes de primera póliza
+        ('2017-12-01', {'anio_mes_1ra_poliza': None}),
+        ('2017-12-02', {'anio_mes_1ra_poliza': None}),
+        # Pocos demográficos informados
+        ('2017-12-03', {'estado_civil': None, 'pais_residencia': None, 'genero': None}),
+        ('2017-12-04', {'estado_civil': None, 'pais_residencia': None, 'genero': None}),
+        # Sin fecha
+        (None, {}),
+    ])
+    ids = ResolucionClientes().asignar(df)
+    assert ids.nunique() == len(df)
+
+
+def _aleatorias(n, semilla=7):
+    rng = np.random.default_rng(semilla)
+    df = pd.DataFrame({
+        **{c: v for c, v in CLIENTE.items()},
+        'genero': rng.choice(['Hombre', 'Mujer'], n),
+        'anio_mes_1ra_poliza': rng.choice(['201207', '201502', '201809', None], n),
+        'rango_vlr_anticipos': rng.choice(['0 - 5M', '14M - 20M'], n),
+        'no_factura': np.arange(n),
+        'fecha_factura': pd.Timestamp('2017-10-01') + pd.to_timedelta(rng.integers(0, 120, n), unit='D'),
+    })
+    return df.sort_values('fecha_factura', kind='stable').reset_index(drop=True)
+
+
+def test_lotes_cronologicos_igual_que_corrida_completa():
+    df = _aleatorias(400)
+    completa = ResolucionClientes(max_dias=15).asignar(df)
+    assert completa.nunique() < len(df)
+
+    por_lotes = ResolucionClientes(max_dias=15)
+    lotes = [por_lotes.asignar(df.iloc[i:i + 100]) for i in range(0, len(df), 100)]
+    pd.testing.assert_series_equal(pd.concat(lotes), completa)
+
+
+def test_sembrada_desde_tablas_igual_que_corrida_completa():
+    df = _aleatorias(400, semilla=11)
+    completa = ResolucionClientes(max_dias=15).asignar(df)
+
+    mitad = len(df) // 2
+    primera = df.iloc[:mitad].assign(id_cliente=ResolucionClientes(max_dias=15).asignar(df.iloc[:mitad]))
+    df_clientes = primera.drop_duplicates('id_cliente')[['id_cliente'] + list(CLIENTE)]
+    sembrada = ResolucionClientes.desde_tablas(df_clientes, primera[['id_cliente', 'fecha_factura']], max_dias=15)
+    segunda = sembrada.asignar(df.iloc[mitad:])
+    pd.testing.assert_series_equal(pd.concat([primera['id_cliente'], segunda]), completa)
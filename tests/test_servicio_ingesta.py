@@ -0,0 +1,160 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+os.environ.setdefault("CVU_METRICAS", "0")
+
+from procesar_ventas_v2 import COLUMNAS_DESEADAS, leer_exportacion, limpiar_datos, normalizar_tablas  # noqa: E402
+from enriquecer_datos import enriquecer_clientes, enriquecer_facturas  # noqa: E402
+from build_dataset_maestro import construir_maestro  # noqa: E402
+from indice_duplicados import IndiceDuplicados  # noqa: E402
+from servicio_ingesta import ServicioIngesta  # noqa: E402
+import cubo_facturas  # noqa: E402
+import top_k_maestro  # noqa: E402
+
+pytest.importorskip("pyarrow")
+
+CLIENTE = {
+    'Estado Civil': 'Casado', 'Pais Residencia': 'Colombia', 'Cant Polizas': 1, 'Rango Edades': '41 - 50',
+    'Genero': 'Mujer', 'Zonas Ciudades Cli': 'Bogota', 'Anio Mes Compro 1ra Poliza': '201207',
+    'Rango Vlr Anticipos Polizas': '0 - 5M', 'Rango Vlr Disponible Polizas': '0 - 5M', 'Empresa Cvu Cv': 'Circular',
+}
+
+
+def _exportacion(filas):
+    """filas: (no_factura, fecha, destino, proveedor, presupuesto)."""
+    return pd.DataFrame([{**CLIENTE, 'No. Factura': f, 'Fecha Factura': fecha, 'Ciudad Destino': destino,
+                          'Nombre Proveedor': proveedor, 'Valor Presupuesto Servicios Ppto': ppto,
+                          'Valor Total Neto Factura': 1000, 'Valor Total Item Factura': ppto,
+                          'Valor Total Neto Item Factura': ppto}
+                         for f, fecha, destino, proveedor, ppto in filas])[COLUMNAS_DESEADAS]
+
+
+ENERO = [
+    (1, '2017-01-05', 'Cartagena', 'Avianca', 100),
+    (1, '2017-01-05', 'Cartagena', 'Avianca', 40),
+    (2, '2017-01-10', 'Miami', 'Decameron', 300),
+    (3, '2017-01-20', 'Madrid', 'Avianca', 250),
+]
+FEBRERO = [
+    # Factura 1 reenviada con un proveedor nuevo que pasa a ser el principal
+    (1, '2017-01-05', 'Cartagena', 'Hoteles Estelar', 500),
+    # Fila idéntica a una ya ingerida
+    (2, '2017-01-10', 'Miami', 'Decameron', 300),
+    (4, '2017-02-02', 'Cartagena', 'Decameron', 80),
+    (5, '2017-02-14', 'Miami', 'Avianca', 120),
+]
+
+
+def _corrida_completa(rutas, carpeta_duplicados):
+    """Lo mismo que procesar_ventas_v2 + enriquecer_datos + build_dataset_maestro sobre todos los archivos."""
+    indice = IndiceDuplicados(carpeta_duplicados, reiniciar=True)
+    df_bruto = pd.concat([indice.filtrar(leer_exportacion(r), r) for r in rutas], ignore_index=True)
+    df_clientes, df_facturas, df_prov = normalizar_tablas(limpiar_datos(df_bruto))
+    df_maestro = construir_maestro(enriquecer_clientes(df_clientes), enriquecer_facturas(df_facturas, {}, 1),
+                                   df_prov.copy())
+    return df_facturas, df_prov, df_maestro
+
+
+def _ordenar(df, columnas):
+    return df[columnas].fillna("").astype(str).sort_values(columnas).reset_index(drop=True)
+
+
+def test_lotes_en_orden_igual_que_corrida_completa(tmp_path):
+    entrada, limpios, enriq = (str(tmp_path / c) for c in ("datos_csv", "datos_limpios", "datos_enriquecidos"))
+    os.makedirs(entrada)
+    rutas = []
+    for nombre, filas in (("2017_01.csv", ENERO), ("2017_02.csv", FEBRERO)):
+        rutas.append(os.path.join(entrada, nombre))
+        _exportacion(filas).to_csv(rutas[-1], index=False)
+
+    servicio = ServicioIngesta(entrada, limpios, enriq, incluir_existentes=True, procesos=1)
+    for ruta in rutas:
+        servicio.procesar_archivo(ruta)
+    assert "transaccion" not in servicio.estado
+    assert servicio.estado["archivos"]["2017_02.csv"]["facturas_reenviadas"] == 1
+
+    facturas, proveedores, maestro = _corrida_completa(rutas, str(tmp_path / "duplicados_completa"))
+
+    # Una factura por no_factura y las mismas filas de proveedores
+    facturas_lotes = pd.read_csv(os.path.join(limpios, "facturas.csv"), encoding="utf-8-sig")
+    assert sorted(facturas_lotes["no_factura"]) == sorted(facturas["no_factura"]) == [1, 2, 3, 4, 5]
+    columnas = ["no_factura", "nombre_proveedor", "vlr_presupuesto_ppto"]
+    for carpeta, nombre in ((limpios, "proveedores_por_factura"), (enriq, "proveedores_por_factura_enriquecido")):
+        prov_lotes = pd.read_csv(os.path.join(carpeta, f"{nombre}.csv"), encoding="utf-8-sig")
+        pd.testing.assert_frame_equal(_ordenar(prov_lotes, columnas), _ordenar(proveedores, columnas))
+
+    # El maestro (plano y particionado) recalcula la factura reenviada
+    columnas = ["no_factura", "n_proveedores", "suma_vlr_presupuesto_ppto", "proveedor_principal", "destino_ciudad"]
+    esperado = _ordenar(maestro.astype({"n_proveedores": int}), columnas)
+    maestro_plano = pd.read_csv(os.path.join(enriq, "dataset_maestro_facturas.csv"), encoding="utf-8-sig")
+    pd.testing.assert_frame_equal(_ordenar(maestro_plano, columnas), esperado)
+    particiones = pd.concat([pd.read_csv(os.path.join(raiz, "datos.csv"), encoding="utf-8-sig")
+                             for raiz, _, archivos in os.walk(os.path.join(enriq, "dataset_maestro_facturas"))
+                             if "datos.csv" in archivos])
+    pd.testing.assert_frame_equal(_ordenar(particiones, columnas), esperado)
+    assert maestro_plano.set_index("no_factura").loc[1, "proveedor_principal"] == "Hoteles Estelar"
+
+    # Cubo y sketches: la versión anterior de la factura 1 ya no cuenta
+    cubo_lotes = cubo_facturas.consultar_cubo(["proveedor_principal"], ruta=os.path.join(enriq, "cubo_facturas.parquet"))
+    cubo_esperado = cubo_facturas.consultar_cubo(["proveedor_principal"], cubo=cubo_facturas._cuboide_base(maestro))
+    pd.testing.assert_frame_equal(cubo_lotes.astype({"proveedor_principal": str}),
+                                  cubo_esperado.astype({"proveedor_principal": str}), check_dtype=False)
+    top_lotes = top_k_maestro.top_k("proveedor_principal", ruta=os.path.join(enriq, "top_k_maestro.json"))
+    top_esperado = top_k_maestro.top_k("proveedor_principal", sketches=top_k_maestro.actualizar_sketches(maestro, {}))
+    pd.testing.assert_series_equal(top_lotes["count"].sort_index(), top_esperado["count"].sort_index())
+    assert np.all(top_lotes["count_min"].sort_index() == top_esperado["count_min"].sort_index())
+
+    # Reprocesar el mismo archivo no añade nada
+    servicio.procesar_archivo(rutas[1])
+    assert len(pd.read_csv(os.path.join(enriq, "dataset_maestro_facturas.csv"), encoding="utf-8-sig")) == 5
+
+
+def _contenido(carpeta):
+    """{ruta relativa: bytes} de todos los archivos de la carpeta (sin el estado del servicio)."""
+    contenido = {}
+    for raiz, _, archivos in os.walk(carpeta):
+        for archivo in archivos:
+            ruta = os.path.join(raiz, archivo)
+            if not archivo.startswith(".ingesta_estado"):
+                with open(ruta, "rb") as f:
+                    contenido[os.path.relpath(ruta, carpeta)] = f.read()
+    return contenido
+
+
+def test_lote_fallido_con_reenviadas_se_deshace(tmp_path, monkeypatch):
+    entrada, limpios, enriq = (str(tmp_path / c) for c in ("datos_csv", "datos_limpios", "datos_enriquecidos"))
+    os.makedirs(entrada)
+    rutas = []
+    for nombre, filas in (("2017_01.csv", ENERO), ("2017_02.csv", FEBRERO)):
+        rutas.append(os.path.join(entrada, nombre))
+        _exportacion(filas).to_csv(rutas[-1], index=False)
+
+    servicio = ServicioIngesta(entrada, limpios, enriq, incluir_existentes=True, procesos=1)
+    servicio.procesar_archivo(rutas[0])
+    antes = _contenido(enriq), _contenido(limpios)
+
+    # El lote falla después de reescribir el maestro y anexar las tablas
+    def fallar(*args, **kwargs):
+        raise RuntimeError("fallo simulado")
+    monkeypatch.setattr(cubo_facturas, "agregar_lote", fallar)
+    servicio.cola.put((rutas[1], None))
+    servicio.detener.set()
+    servicio.trabajar()
+
+    assert "transaccion" not in servicio.estado
+    assert "error" in servicio.estado["archivos"]["2017_02.csv"]
+    assert (_contenido(enriq), _contenido(limpios)) == antes
+
+    # Al reintentar, la factura reenviada se recalcula una sola vez
+    monkeypatch.undo()
+    servicio.procesar_archivo(rutas[1])
+    maestro = pd.read_csv(os.path.join(enriq, "dataset_maestro_facturas.csv"), encoding="utf-8-sig")
+    assert sorted(maestro["no_factura"]) == [1, 2, 3, 4, 5]
+    assert maestro.set_index("no_factura").loc[1, "n_proveedores"] == 2
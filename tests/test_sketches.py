@@ -0,0 +1,140 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+from sketches import CountMin, FiltroBloom, SpaceSaving  # noqa: E402
+import top_k_maestro  # noqa: E402
+
+
+def _zipf(n, distintos=5000, semilla=0):
+    """Ítems con frecuencias muy sesgadas (pocos muy frecuentes, cola larga)."""
+    rng = np.random.default_rng(semilla)
+    return pd.Series(rng.zipf(1.3, n) % distintos).map(lambda v: f"item_{v}")
+
+
+def _lotes(valores, n_lotes):
+    return [valores.iloc[i::n_lotes] for i in range(n_lotes)]
+
+
+def _cotas_space_saving(sketch, reales):
+    """El conteo estimado no es menor al real y lo supera como mucho en su error."""
+    reales = reales.reindex(sketch.conteos.index, fill_value=0)
+    assert np.all(sketch.conteos >= reales)
+    assert np.all(sketch.conteos - sketch.errores <= reales)
+
+
+def test_space_saving_cotas_y_top():
+    valores = _zipf(20_000)
+    reales = valores.value_counts()
+    sketch = SpaceSaving(capacidad=200)
+    for lote in _lotes(valores, 7):
+        sketch.actualizar(lote)
+    assert sketch.n == len(valores) and len(sketch.conteos) == 200
+    _cotas_space_saving(sketch, reales)
+    # Todo ítem con más de n / capacidad apariciones está vigilado
+    assert set(reales[reales > len(valores) / 200].index) <= set(sketch.conteos.index)
+    assert list(sketch.top(5).index) == list(reales.head(5).index)
+
+    # Por debajo de la capacidad los conteos son exactos
+    pocos = valores.head(300).str[:6]
+    exacto = SpaceSaving(capacidad=100)
+    exacto.actualizar(pocos)
+    pd.testing.assert_series_equal(exacto.conteos.sort_index(), pocos.value_counts().sort_index(),
+                                   check_names=False)
+    assert exacto.errores.eq(0).all()
+
+
+def test_space_saving_combinar():
+    a_valores, b_valores = _zipf(10_000, semilla=1), _zipf(10_000, semilla=2)
+    a, b = SpaceSaving(capacidad=150), SpaceSaving(capacidad=150)
+    a.actualizar(a_valores)
+    b.actualizar(b_valores)
+    combinado = a.combinar(b)
+    reales = pd.concat([a_valores, b_valores]).value_counts()
+    assert combinado.n == 20_000 and len(combinado.conteos) <= 150
+    _cotas_space_saving(combinado, reales)
+    assert list(combinado.top(3).index) == list(reales.head(3).index)
+
+    # Sin llenar la capacidad combinar es exacto
+    c, d = SpaceSaving(10), SpaceSaving(10)
+    c.actualizar(['x', 'x', 'y'])
+    d.actualizar(['y', 'z', None])
+    assert c.combinar(d).conteos.to_dict() == {'x': 2, 'y': 2, 'z': 1}
+
+
+def test_space_saving_retirar_conteos():
+    sketch = SpaceSaving(capacidad=10)
+    sketch.actualizar(['a'] * 5 + ['b'] * 3 + ['c'])
+    sketch.retirar_conteos({'a': 2, 'c': 1})
+    assert sketch.conteos.to_dict() == {'a': 3, 'b': 3} and sketch.n == 6
+
+    valores = _zipf(5000, semilla=3)
+    lleno = SpaceSaving(capacidad=50)
+    lleno.actualizar(valores)
+    retirados = valores.head(1000).value_counts()
+    lleno.retirar_conteos(retirados)
+    _cotas_space_saving(lleno, valores.iloc[1000:].value_counts())
+    assert lleno.n == 4000
+
+
+def test_count_min_cota_y_combinar():
+    valores = _zipf(30_000)
+    reales = valores.value_counts()
+    ancho = 512
+    sketch = CountMin(ancho=ancho, profundidad=4)
+    for lote in _lotes(valores, 5):
+        sketch.actualizar(lote)
+    estimados = sketch.estimar(reales.index)
+    assert sketch.n == len(valores)
+    assert np.all(estimados >= reales)
+    # Cota e * n / ancho: con 4 filas falla con probabilidad ~ e^-4 por ítem
+    excede = (estimados - reales) > np.e * len(valores) / ancho
+    assert excede.mean() <= np.exp(-4)
+
+    # Combinar dos sketches es lo mismo que uno sobre todos los valores
+    a, b = CountMin(ancho=ancho), CountMin(ancho=ancho)
+    a.actualizar(valores.iloc[:12_000])
+    b.actualizar(valores.iloc[12_000:])
+    entero = CountMin(ancho=ancho)
+    entero.actualizar(valores)
+    np.testing.assert_array_equal(a.combinar(b).tabla, entero.tabla)
+    assert a.n == entero.n
+
+    # Retirar (conteos negativos) deshace lo añadido
+    a.actualizar_conteos(-valores.iloc[12_000:].value_counts())
+    solo_a = CountMin(ancho=ancho)
+    solo_a.actualizar(valores.iloc[:12_000])
+    np.testing.assert_array_equal(a.tabla, solo_a.tabla)
+
+
+def test_filtro_bloom_sin_falsos_negativos():
+    rng = np.random.default_rng(4)
+    hashes = rng.integers(0, 2 ** 63, 40_000, dtype=np.int64).astype(np.uint64)
+    filtro = FiltroBloom(capacidad=20_000, tasa_fp=0.01)
+    filtro.agregar(hashes[:20_000])
+    assert filtro.contiene(hashes[:20_000]).all()
+    assert filtro.contiene(hashes[20_000:]).mean() < 0.02
+
+    copia = FiltroBloom.desde_dict(filtro.a_dict())
+    np.testing.assert_array_equal(copia.contiene(hashes), filtro.contiene(hashes))
+
+
+def test_top_k_por_anios_combinados(tmp_path):
+    df = pd.DataFrame({
+        'anio_factura': [2017] * 6 + [2018] * 4,
+        'destino_ciudad': ['Miami', 'Miami', 'Lima', None, 'Lima', 'Lima', 'Miami', 'Miami', 'Miami', 'Cusco'],
+    })
+    ruta = str(tmp_path / "top_k.json")
+    top_k_maestro.reconstruir_sketches(df.iloc[:6], ruta, columnas=['destino_ciudad'])
+    top_k_maestro.agregar_lote(df.iloc[6:], ruta, columnas=['destino_ciudad'])
+
+    top = top_k_maestro.top_k('destino_ciudad', ruta=ruta)
+    assert top['count'].to_dict() == df['destino_ciudad'].value_counts().to_dict()
+    assert top['error_max'].eq(0).all() and (top['count_min'] >= top['count']).all()
+    solo_2018 = top_k_maestro.top_k('destino_ciudad', ruta=ruta, anios=[2018])
+    assert solo_2018['count'].to_dict() == {'Miami': 3, 'Cusco': 1}
@@ -0,0 +1,179 @@
+# top_k_maestro.py
+
+import argparse
+import json
+import os
+
+import pandas as pd
+
+from sketches import CountMin, SpaceSaving
+
+# -----------------------------------------------------------------------------
+# 1. DEFINICIONES
+# -----------------------------------------------------------------------------
+
+# Sketches persistidos junto al dataset maestro
+RUTA_SKETCHES = os.path.join("datos_enriquecidos", "top_k_maestro.json")
+
+COLUMNAS_TOP_K = [
+    "destino_ciudad",
+    "destino_pais",
+    "destino_continente",
+    "proveedor_principal",
+    "region_colombia",
+]
+
+CAPACIDAD = 1000
+ANCHO_COUNT_MIN = 2048
+
+
+# -----------------------------------------------------------------------------
+# 2. PERSISTENCIA
+# -----------------------------------------------------------------------------
+
+def cargar_sketches(ruta=RUTA_SKETCHES):
+    """
+    Lee los sketches persistidos. Estructura: {anio: {columna: {'space_saving':
+    SpaceSaving, 'count_min': CountMin}}}; los años permiten combinar solo
+    los periodos pedidos.
+    """
+    if not os.path.exists(ruta):
+        return {}
+    with open(ruta, encoding="utf-8") as f:
+        datos = json.load(f)
+    return {
+        anio: {
+            col: {
+                "space_saving": SpaceSaving.desde_dict(s["space_saving"]),
+                "count_min": CountMin.desde_dict(s["count_min"]),
+            }
+            for col, s in columnas.items()
+        }
+        for anio, columnas in datos.items()
+    }
+
+
+def guardar_sketches(sketches, ruta=RUTA_SKETCHES):
+    datos = {
+        anio: {col: {nombre: s.a_dict() for nombre, s in par.items()} for col, par in columnas.items()}
+        for anio, columnas in sketches.items()
+    }
+    os.makedirs(os.path.dirname(ruta) or ".", exist_ok=True)
+    ruta_tmp = ruta + ".tmp"
+    with open(ruta_tmp, "w", encoding="utf-8") as f:
+        json.dump(datos, f)
+    os.replace(ruta_tmp, ruta)
+
+
+# -----------------------------------------------------------------------------
+# 3. ACTUALIZACIÓN Y CONSULTA
+# -----------------------------------------------------------------------------
+
+def actualizar_sketches(df_lote, sketches, columnas=COLUMNAS_TOP_K, retirar=False):
+    """
+    Incorpora un lote de facturas (p. ej. un archivo nuevo) a los sketches, por
+    año de factura. Solo recorre el lote, nunca el histórico. Con 'retirar'
+    descuenta las filas en lugar de sumarlas (versiones anteriores de facturas
+    que se recalculan).
+    """
+    anios = df_lote["anio_factura"] if "anio_factura" in df_lote.columns else pd.Series("todos", index=df_lote.index)
+    anios = anios.astype("string").fillna("sin_anio")
+    for anio, sub in df_lote.groupby(anios, sort=False):
+        por_anio = sketches.setdefault(str(anio), {})
+        for col in columnas:
+            if col not in sub.columns:
+                continue
+            conteos = sub[col].dropna().astype(str).value_counts()
+            par = por_anio.setdefault(col, {
+                "space_saving": SpaceSaving(CAPACIDAD),
+                "count_min": CountMin(ANCHO_COUNT_MIN),
+            })
+            if retirar:
+                par["space_saving"].retirar_conteos(conteos)
+                par["count_min"].actualizar_conteos(-conteos)
+            else:
+                par["space_saving"].actualizar_conteos(conteos)
+                par["count_min"].actualizar_conteos(conteos)
+    return sketches
+
+
+def reconstruir_sketches(df_maestro, ruta=RUTA_SKETCHES, columnas=COLUMNAS_TOP_K):
+    """Recalcula los sketches desde cero a partir del maestro completo y los guarda."""
+    sketches = actualizar_sketches(df_maestro, {}, columnas)
+    guardar_sketches(sketches, ruta)
+    print(f"Sketches top-k guardados en: {ruta}")
+    return sketches
+
+
+def agregar_lote(df_lote, ruta=RUTA_SKETCHES, columnas=COLUMNAS_TOP_K, df_retirar=None):
+    """
+    Actualiza incrementalmente los sketches persistidos con un lote nuevo; las
+    filas de 'df_retirar' (las que el lote reemplaza) se descuentan antes.
+    """
+    sketches = cargar_sketches(ruta)
+    if df_retirar is not None and len(df_retirar):
+        sketches = actualizar_sketches(df_retirar, sketches, columnas, retirar=True)
+    sketches = actualizar_sketches(df_lote, sketches, columnas)
+    guardar_sketches(sketches, ruta)
+    return sketches
+
+
+def combinar_archivos(rutas, ruta_salida=RUTA_SKETCHES):
+    """Combina sketches de varios archivos (p. ej. calculados por separado) en uno."""
+    resultado = {}
+    for ruta in rutas:
+        for anio, columnas in cargar_sketches(ruta).items():
+            destino = resultado.setdefault(anio, {})
+            for col, par in columnas.items():
+                if col in destino:
+                    destino[col]["space_saving"].combinar(par["space_saving"])
+                    destino[col]["count_min"].combinar(par["count_min"])
+                else:
+                    destino[col] = par
+    guardar_sketches(resultado, ruta_salida)
+    return resultado
+
+
+def top_k(columna, k=10, anios=None, ruta=RUTA_SKETCHES, sketches=None):
+    """
+    Top-k aproximado de 'columna' (equivalente a value_counts().head(k)),
+    combinando los años pedidos (todos por defecto). Devuelve un DataFrame
+    con el conteo estimado, su cota de error (Space-Saving) y la estimación
+    independiente de Count-Min.
+    """
+    sketches = sketches if sketches is not None else cargar_sketches(ruta)
+    anios = [str(a) for a in anios] if anios is not None else list(sketches)
+    space_saving, count_min = SpaceSaving(CAPACIDAD), CountMin(ANCHO_COUNT_MIN)
+    for anio in anios:
+        par = sketches.get(anio, {}).get(columna)
+        if par is not None:
+            space_saving.combinar(par["space_saving"])
+            count_min.combinar(par["count_min"])
+
+    top = space_saving.top(k)
+    resultado = pd.DataFrame({
+        "count": top,
+        "error_max": space_saving.errores.reindex(top.index),
+        "count_min": count_min.estimar(top.index) if len(top) else pd.Series(dtype="int64"),
+    })
+    resultado.index.name = columna
+    return resultado
+
+
+# -----------------------------------------------------------------------------
+# 4. EJECUCIÓN PRINCIPAL
+# -----------------------------------------------------------------------------
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Top-k aproximado de destinos/proveedores desde los sketches.")
+    parser.add_argument("columna", nargs="?", default="destino_ciudad")
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--anio", action="append", help="Año(s) a combinar (por defecto todos).")
+    parser.add_argument("--ruta", default=RUTA_SKETCHES)
+    parser.add_argument("--reconstruir", help="CSV del maestro a partir del cual recalcular los sketches.")
+    args = parser.parse_args()
+
+    if args.reconstruir:
+        reconstruir_sketches(pd.read_csv(args.reconstruir, low_memory=False), args.ruta)
+    print(f"Top {args.k} de '{args.columna}':")
+    print(top_k(args.columna, k=args.k, anios=args.anio, ruta=args.ruta))